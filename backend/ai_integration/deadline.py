@@ -0,0 +1,44 @@
+"""
+Per-request time budgets for LLM work.
+
+A view creates a Deadline when the request starts and hands it to
+AIService(deadline=...). Every provider call then gets at most the time left
+(capped by AI_PROVIDER_TIMEOUT), waits in the rate limiter and single-flight
+are cut short, no new provider call is started once the budget is spent, and
+DeadlineExceeded is raised instead of answering after the client has given up.
+"""
+import time
+from typing import Optional
+
+from django.conf import settings
+
+from .exceptions import DeadlineExceeded
+
+
+class Deadline:
+    """A point in (monotonic) time by which a request must have answered."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded(f'request deadline of {self.seconds:g}s exceeded')
+
+    def timeout(self, limit: float) -> float:
+        """``limit`` shortened to the time left; raises DeadlineExceeded when none is."""
+        self.check()
+        return min(limit, self.remaining())
+
+
+def request_deadline() -> Optional[Deadline]:
+    """A Deadline of AI_REQUEST_DEADLINE seconds from now, or None when it is disabled (0)."""
+    seconds = getattr(settings, 'AI_REQUEST_DEADLINE', 0)
+    return Deadline(seconds) if seconds else None
@@ -0,0 +1,54 @@
+"""
+Typed errors raised by LLM provider calls.
+"""
+
+
+class ProviderError(Exception):
+    """A provider call failed."""
+
+    def __init__(self, provider: str, message: str = ''):
+        self.provider = provider
+        super().__init__(f"{provider}: {message}" if message else provider)
+
+
+class ProviderNotConfigured(ProviderError):
+    """The provider is missing an API key, model or URL."""
+
+
+class ProviderTimeout(ProviderError):
+    """The provider did not answer in time."""
+
+
+class ProviderRateLimited(ProviderError):
+    """The provider rejected the call because of rate limits or quota (HTTP 429)."""
+
+
+class ProviderUnavailable(ProviderError):
+    """The provider's circuit breaker is open, so the call was not attempted."""
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before an LLM answered."""
+
+
+def classify_provider_error(provider: str, exc: Exception) -> ProviderError:
+    """
+    Map an SDK or transport exception onto a typed ProviderError.
+
+    SDK exception classes are matched by name so that providers whose SDK is
+    not installed don't need to be imported.
+    """
+    if isinstance(exc, ProviderError):
+        return exc
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    status_code = getattr(exc, 'status_code', None) or getattr(getattr(exc, 'response', None), 'status_code', None)
+    message = str(exc)
+    if names & {'RateLimitError', 'ResourceExhausted', 'TooManyRequests'} or status_code == 429 \
+            or 'insufficient_quota' in message or 'quota' in message.lower():
+        error = ProviderRateLimited(provider, message)
+    elif names & {'Timeout', 'TimeoutError', 'APITimeoutError', 'TimeoutException', 'DeadlineExceeded'}:
+        error = ProviderTimeout(provider, message)
+    else:
+        error = ProviderError(provider, message)
+    error.__cause__ = exc
+    return error
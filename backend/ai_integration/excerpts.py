@@ -0,0 +1,157 @@
+"""
+Local excerpt extraction for questions about past conversations.
+
+Messages are split into short passages which are ranked against the question
+with BM25. The best passages are returned verbatim together with the
+character spans of the matched query terms, so excerpts are always real text
+and cost no LLM output tokens.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been before but by can could
+did do does for from had has have he her his how i if in into is it its just me
+my no not of on or our out over she so some than that the their them then there
+these they this those to too up us was we were what when where which while who
+why will with would you your
+""".split())
+
+SUFFIXES = ('ing', 'ed', 'es', 's')
+
+PASSAGE_CHARS = 280
+
+
+def normalize(token: str) -> str:
+    """Lowercase and strip a common English suffix (a very light stemmer)."""
+    token = token.lower()
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        normalize(token) for token in TOKEN_RE.findall(text)
+        if token.lower() not in STOPWORDS
+    ]
+
+
+def split_passages(text: str, max_chars: int = PASSAGE_CHARS) -> List[str]:
+    """Split a message into passages of whole sentences of about ``max_chars``."""
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+    passages, current = [], ''
+    for sentence in SENTENCE_RE.split(text):
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            passages.append(current)
+            current = sentence
+        else:
+            current = f'{current} {sentence}' if current else sentence
+    if current:
+        passages.append(current)
+    return passages
+
+
+class BM25:
+    """Okapi BM25 over a fixed list of tokenized documents."""
+
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(doc) for doc in documents]
+        self.lengths = [len(doc) for doc in documents]
+        self.avg_length = (sum(self.lengths) / len(documents)) if documents else 0.0
+        document_frequency = Counter(term for counts in self.term_counts for term in counts)
+        total = len(documents)
+        self.idf = {
+            term: math.log(1 + (total - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_frequency.items()
+        }
+
+    def scores(self, query: Iterable[str]) -> List[float]:
+        terms = [term for term in set(query) if term in self.idf]
+        results = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for term in terms:
+                freq = counts.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            results.append(score)
+        return results
+
+
+def highlight_spans(text: str, query_terms: Iterable[str]) -> List[Tuple[int, int]]:
+    """Character spans of ``text`` whose words match one of the query terms."""
+    terms = set(query_terms)
+    return [
+        (match.start(), match.end()) for match in TOKEN_RE.finditer(text)
+        if normalize(match.group()) in terms
+    ]
+
+
+def rank_passages(query: str, messages: Dict[int, List]) -> List[Dict]:
+    """
+    Score every passage of ``messages`` (conversation id -> messages) against
+    ``query``. Returns matching passages, best first.
+    """
+    query_terms = tokenize(query)
+    if not query_terms:
+        return []
+    passages = []
+    for conversation_id, conversation_messages in messages.items():
+        for message in conversation_messages:
+            for text in split_passages(message.content):
+                passages.append({
+                    'conversation_id': conversation_id,
+                    'message_id': message.id,
+                    'sender': message.sender,
+                    'excerpt': text,
+                })
+    if not passages:
+        return []
+    index = BM25([tokenize(passage['excerpt']) for passage in passages])
+    ranked = []
+    for passage, score in zip(passages, index.scores(query_terms)):
+        if score > 0:
+            passage['score'] = round(score, 3)
+            ranked.append(passage)
+    ranked.sort(key=lambda passage: passage['score'], reverse=True)
+    return ranked
+
+
+def extract_excerpts(query: str, messages: Dict[int, List], limit: int = 5,
+                     per_conversation: int = 2) -> List[Dict]:
+    """
+    The ``limit`` best passages for ``query``, at most ``per_conversation``
+    from one conversation, each with the spans of the matched terms.
+    """
+    query_terms = set(tokenize(query))
+    excerpts = []
+    taken = Counter()
+    for passage in rank_passages(query, messages):
+        if taken[passage['conversation_id']] >= per_conversation:
+            continue
+        taken[passage['conversation_id']] += 1
+        passage['highlights'] = [list(span) for span in highlight_spans(passage['excerpt'], query_terms)]
+        excerpts.append(passage)
+        if len(excerpts) >= limit:
+            break
+    return excerpts
+
+
+def rank_conversations(query: str, messages: Dict[int, List]) -> List[int]:
+    """Conversation ids ordered by their best passage score (matching ones only)."""
+    best = {}
+    for passage in rank_passages(query, messages):
+        best.setdefault(passage['conversation_id'], passage['score'])
+    return sorted(best, key=best.get, reverse=True)
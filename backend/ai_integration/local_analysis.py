@@ -0,0 +1,256 @@
+"""
+Local conversation analysis without an LLM.
+
+Key topics are RAKE candidate phrases (runs of content words between
+stopwords and punctuation) scored by the TF-IDF weight of their words, with
+sparse (per-message Counter) term weights and the IDF taken over all messages
+analysed together. At most MAX_MESSAGES messages of a conversation and
+MAX_PHRASES phrases of a message are looked at. Sentiment comes from a small lexicon with negation and
+intensifiers, summaries and action items are sentences taken from the text,
+and titles are the top key phrases of the first message.
+
+AIService uses it according to AI_LOCAL_ANALYSIS: as a fallback when no
+provider answers ("fallback"), or additionally as a first pass that computes
+titles, key topics and sentiment without an LLM call ("first").
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .excerpts import SENTENCE_RE, STOPWORDS
+
+WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?", re.UNICODE)
+PHRASE_BREAK_RE = re.compile(r"[.,;:!?()\[\]{}\"\n–—]|\s-\s")
+
+# Words that never start or continue a key phrase, on top of the BM25 stopwords.
+PHRASE_STOPWORDS = STOPWORDS | frozenset("""
+actually again almost already always another anything around back basically
+because being best better both came come couldn't does doesn't doing don't each
+either else even ever every everything few first get gets getting give go going
+good got great hello help hey hi i'd i'll i'm i've it's let let's like look lot
+lots make many may maybe might more most much must need needs new next now
+often ok okay one only other others own please pretty probably provides quite
+rather really right said same say see several should show since something
+sometimes sure take tell thank thanks that's thing things think though through
+thus today tomorrow try two under understand until use used using usually very
+want wants way well went whether yes yesterday yet you'd you'll you're you've
+""".split())
+
+MAX_PHRASE_WORDS = 3
+MIN_WORD_LENGTH = 3
+
+# Bounds on the work of one analysis: the first MAX_MESSAGES messages of each
+# conversation, the first MAX_PHRASES candidate phrases of each message.
+MAX_MESSAGES = 200
+MAX_PHRASES = 500
+
+POSITIVE_WORDS = frozenset("""
+amazing appreciate appreciated awesome beautiful benefit best better brilliant
+clear comfortable confident cool delighted easy effective enjoy enjoyed
+excellent excited fantastic fast fine fixed fun glad good grateful great happy
+helpful impressed improve improved interesting love loved lovely nice
+perfect pleased recommend resolved satisfied simple smooth solved success
+successful super thank thanks useful valuable welcome wonderful works
+""".split())
+
+NEGATIVE_WORDS = frozenset("""
+angry annoyed annoying anxious awful bad broke broken bug bugs complicated
+confused confusing crash crashed crashes difficult disappointed disappointing
+error errors fail failed failing fails failure frustrated frustrating hard hate
+horrible issue issues lost mess missing problem problems sad scared slow stuck
+terrible unfortunately unhappy upset useless worried worse worst wrong
+""".split())
+
+NEGATORS = frozenset("no not never neither nor none nothing without cannot".split())
+INTENSIFIERS = {'very': 1.5, 'really': 1.5, 'extremely': 2.0, 'so': 1.3, 'super': 1.5, 'totally': 1.5}
+
+# Compound scores beyond this threshold are positive or negative.
+SENTIMENT_THRESHOLD = 0.25
+
+ACTION_RE = re.compile(
+    r"\b(?:(?:i|we|you)(?:'ll| will| need to| should| must| have to| are going to)"
+    r"|let's|to-?do|action items?|next steps?|remember to|make sure|follow up|deadline)\b",
+    re.IGNORECASE
+)
+
+SUMMARY_SENTENCES = 2
+SUMMARY_CHARS = 500
+TITLE_WORDS = 5
+
+
+def words(text: str) -> List[str]:
+    return [word.lower() for word in WORD_RE.findall(text)]
+
+
+def candidate_phrases(text: str) -> List[Tuple[str, ...]]:
+    """RAKE candidates: runs of up to MAX_PHRASE_WORDS content words."""
+    phrases = []
+    for fragment in PHRASE_BREAK_RE.split(text):
+        current = []
+        for word in words(fragment):
+            if word in PHRASE_STOPWORDS or len(word) < MIN_WORD_LENGTH:
+                if current:
+                    phrases.append(tuple(current))
+                current = []
+                continue
+            current.append(word)
+            if len(current) == MAX_PHRASE_WORDS:
+                phrases.append(tuple(current))
+                current = []
+        if current:
+            phrases.append(tuple(current))
+    return phrases
+
+
+class KeywordExtractor:
+    """
+    RAKE phrases ranked by TF-IDF over a corpus of documents (one per
+    message). ``groups`` maps each document to the conversation it belongs
+    to; keywords are then extracted per group.
+    """
+
+    def __init__(self, documents: Sequence[str], groups: Optional[Sequence] = None):
+        self.phrases = [candidate_phrases(document)[:MAX_PHRASES] for document in documents]
+        self.groups = list(groups) if groups is not None else [None] * len(documents)
+        self.counts = [Counter(word for phrase in phrases for word in phrase) for phrases in self.phrases]
+        document_frequency = Counter(word for counts in self.counts for word in counts)
+        self.idf = {
+            word: math.log((1 + len(self.phrases)) / (1 + frequency)) + 1
+            for word, frequency in document_frequency.items()
+        }
+
+    def word_scores(self, group=None) -> Dict[str, float]:
+        """TF-IDF of each word in ``group``, weighted by its RAKE degree/frequency."""
+        tfidf = defaultdict(float)
+        frequency, degree = Counter(), Counter()
+        for row, g in enumerate(self.groups):
+            if g != group:
+                continue
+            length = sum(self.counts[row].values())
+            for word, count in self.counts[row].items():
+                tfidf[word] += count / length * self.idf[word]
+            for phrase in self.phrases[row]:
+                for word in phrase:
+                    frequency[word] += 1
+                    degree[word] += len(phrase)
+        return {word: tfidf[word] * degree[word] / frequency[word] for word in frequency}
+
+    def keywords(self, group=None, limit: int = 5) -> List[str]:
+        """The ``limit`` best phrases of ``group``, most relevant first."""
+        scores = self.word_scores(group)
+        ranked = {}
+        for row, g in enumerate(self.groups):
+            if g != group:
+                continue
+            for phrase in self.phrases[row]:
+                if phrase not in ranked:
+                    ranked[phrase] = sum(scores[word] for word in phrase)
+        chosen = []
+        for phrase in sorted(ranked, key=lambda p: (-ranked[p], p)):
+            if any(set(phrase) <= set(other) or set(other) <= set(phrase) for other in chosen):
+                continue
+            chosen.append(phrase)
+            if len(chosen) == limit:
+                break
+        return [' '.join(phrase) for phrase in chosen]
+
+
+def score_sentiment(texts: Sequence[str]) -> float:
+    """Lexicon sentiment of ``texts`` in [-1, 1]."""
+    total = 0.0
+    for text in texts:
+        tokens = words(text)
+        for i, token in enumerate(tokens):
+            value = 1.0 if token in POSITIVE_WORDS else -1.0 if token in NEGATIVE_WORDS else 0.0
+            if not value:
+                continue
+            previous = tokens[max(0, i - 3):i]
+            if previous and previous[-1] in INTENSIFIERS:
+                value *= INTENSIFIERS[previous[-1]]
+            if any(word in NEGATORS or word.endswith("n't") for word in previous):
+                value *= -0.5
+            total += value
+    return total / math.sqrt(total * total + 15)
+
+
+def sentiment_label(score: float) -> str:
+    if score >= SENTIMENT_THRESHOLD:
+        return 'positive'
+    if score <= -SENTIMENT_THRESHOLD:
+        return 'negative'
+    return 'neutral'
+
+
+def _sentences(messages: List[Dict]) -> List[str]:
+    return [
+        sentence.strip() for msg in messages
+        for sentence in SENTENCE_RE.split(msg['content']) if sentence.strip()
+    ]
+
+
+def extract_summary(messages: List[Dict], keywords: List[str]) -> str:
+    """The sentences mentioning the most key phrase words, in their original order."""
+    sentences = _sentences(messages)
+    if not sentences:
+        return 'No summary available.'
+    keyword_words = {word for keyword in keywords for word in keyword.split()}
+    scored = []
+    for index, sentence in enumerate(sentences):
+        hits = sum(1 for word in words(sentence) if word in keyword_words)
+        scored.append((hits / math.sqrt(len(words(sentence)) or 1), index))
+    best = sorted(index for _, index in sorted(scored, key=lambda s: (-s[0], s[1]))[:SUMMARY_SENTENCES])
+    summary = ' '.join(sentences[index] for index in best)
+    return summary if len(summary) <= SUMMARY_CHARS else summary[:SUMMARY_CHARS - 3].rstrip() + '...'
+
+
+def extract_action_items(messages: List[Dict], limit: int = 5) -> List[str]:
+    """Sentences that read like commitments or next steps."""
+    items = []
+    for sentence in _sentences(messages):
+        if ACTION_RE.search(sentence) and sentence not in items:
+            items.append(sentence)
+            if len(items) == limit:
+                break
+    return items
+
+
+def analyze_messages(conversations: List[Tuple[int, List[Dict]]], limit: int = 5) -> Dict[int, Dict]:
+    """
+    Analyse (conversation_id, messages) pairs; the IDF is computed over all
+    their messages together. Returns analyses keyed by conversation id, with
+    the same fields as AIService.analyze_conversation.
+    """
+    conversations = [(conversation_id, messages[:MAX_MESSAGES]) for conversation_id, messages in conversations]
+    documents, groups = [], []
+    for conversation_id, messages in conversations:
+        for msg in messages:
+            documents.append(msg['content'])
+            groups.append(conversation_id)
+    extractor = KeywordExtractor(documents, groups)
+
+    results = {}
+    for conversation_id, messages in conversations:
+        keywords = extractor.keywords(conversation_id, limit)
+        # The user's side carries the sentiment; assistant replies are polite by default.
+        user_texts = [msg['content'] for msg in messages if msg['sender'] == 'user']
+        results[conversation_id] = {
+            'summary': extract_summary(messages, keywords),
+            'key_topics': [keyword.capitalize() for keyword in keywords],
+            'sentiment': sentiment_label(score_sentiment(user_texts or [msg['content'] for msg in messages])),
+            'action_items': extract_action_items(messages),
+        }
+    return results
+
+
+def extractive_title(first_message: str) -> str:
+    """A title of at most TITLE_WORDS words made of the message's key phrases."""
+    title_words = []
+    for keyword in KeywordExtractor([first_message]).keywords(limit=3):
+        phrase = keyword.split()
+        if len(title_words) + len(phrase) > TITLE_WORDS:
+            break
+        title_words.extend(phrase)
+    if not title_words:
+        title_words = first_message.split()[:TITLE_WORDS]
+    return ' '.join(word.capitalize() for word in title_words) or 'New Conversation'
@@ -0,0 +1,19 @@
+"""
+Database models for AI integration.
+"""
+from django.db import models
+
+
+class LLMFlight(models.Model):
+    """
+    Lock row for an in-flight LLM call, keyed by its request fingerprint.
+    Lets concurrent identical calls in other processes wait for and share
+    the result of the first one (see singleflight.py).
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    result = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.key} ({'done' if self.completed_at else 'in flight'})"
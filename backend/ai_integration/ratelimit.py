@@ -0,0 +1,205 @@
+"""
+Outbound rate limiting for LLM providers.
+
+Each provider gets a limiter enforcing a maximum number of concurrent calls,
+requests per minute and tokens per minute. The limiter state lives in a small
+JSON file guarded by an exclusive file lock, so every worker process on the
+host shares the same budget. Callers that can't be admitted wait in a bounded
+FIFO queue for at most the configured queue timeout: only the caller at the
+head of the queue may take freed capacity, so no waiter is overtaken.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from chatportal import metrics
+from .exceptions import ProviderRateLimited
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+
+WINDOW = 60.0
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.5
+
+
+def estimate_tokens(messages: List[Dict], system_prompt: Optional[str], max_tokens: int) -> int:
+    """Rough token estimate (4 characters per token) of a prompt plus its completion."""
+    chars = len(system_prompt or '') + sum(len(msg.get('content', '')) for msg in messages)
+    return chars // 4 + max_tokens
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ProviderLimiter:
+    """Cross-process limiter for one provider."""
+
+    def __init__(self, provider: str, max_concurrent: int = 0, requests_per_minute: int = 0,
+                 tokens_per_minute: int = 0, queue_size: int = 32, queue_timeout: float = 10.0):
+        self.provider = provider
+        self.max_concurrent = max_concurrent
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        directory = getattr(settings, 'AI_RATE_LIMIT_DIR')
+        os.makedirs(directory, exist_ok=True)
+        self.state_path = os.path.join(directory, f'{provider}.json')
+        self.lock_path = os.path.join(directory, f'{provider}.lock')
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _locked_state(self):
+        """Yield the shared state dict while holding the lock; it is saved on exit, even on error."""
+        with self._thread_lock, open(self.lock_path, 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.state_path) as fh:
+                        state = json.load(fh)
+                except (OSError, ValueError):
+                    state = {}
+                state.setdefault('in_flight', [])
+                state.setdefault('waiting', [])
+                state.setdefault('requests', [])
+                state.setdefault('tokens', [])
+                state.setdefault('blocked_until', 0)
+                self._prune(state)
+                try:
+                    yield state
+                finally:
+                    tmp_path = f'{self.state_path}.tmp'
+                    with open(tmp_path, 'w') as fh:
+                        json.dump(state, fh)
+                    os.replace(tmp_path, self.state_path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _prune(self, state: Dict):
+        now = time.time()
+        state['requests'] = [ts for ts in state['requests'] if now - ts < WINDOW]
+        state['tokens'] = [entry for entry in state['tokens'] if now - entry[0] < WINDOW]
+        # Drop slots and waiters of processes that died without releasing them,
+        # and waiters that outlived their queue timeout without leaving.
+        state['in_flight'] = [slot for slot in state['in_flight'] if _pid_alive(slot[0])]
+        state['waiting'] = [
+            waiter for waiter in state['waiting']
+            if _pid_alive(waiter[0]) and (len(waiter) < 3 or waiter[2] > now)
+        ]
+
+    def _admit(self, state: Dict, tokens: int) -> float:
+        """Return 0 if a call may start now, otherwise seconds to wait before retrying."""
+        now = time.time()
+        if state['blocked_until'] > now:
+            return state['blocked_until'] - now
+        if self.max_concurrent and len(state['in_flight']) >= self.max_concurrent:
+            return POLL_INTERVAL
+        if self.requests_per_minute and len(state['requests']) >= self.requests_per_minute:
+            return state['requests'][0] + WINDOW - now
+        if self.tokens_per_minute:
+            used = sum(entry[1] for entry in state['tokens'])
+            # A single call larger than the whole budget is let through alone.
+            if used and used + tokens > self.tokens_per_minute:
+                return state['tokens'][0][0] + WINDOW - now
+        return 0
+
+    def acquire(self, tokens: int, timeout: Optional[float] = None) -> str:
+        """
+        Wait for capacity and reserve a slot. Returns a slot id for release().
+        Raises ProviderRateLimited when the queue is full or the wait times out
+        (after the queue timeout, or ``timeout`` seconds when that is shorter).
+        """
+        slot_id = uuid.uuid4().hex
+        start = time.monotonic()
+        wait_limit = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        deadline = start + wait_limit
+        queued = False
+        while True:
+            with self._locked_state() as state:
+                wait_for = self._admit(state, tokens)
+                if not wait_for and state['waiting'] and state['waiting'][0][1] != slot_id:
+                    # Callers queued earlier go first.
+                    wait_for = POLL_INTERVAL
+                if not wait_for:
+                    now = time.time()
+                    if queued:
+                        state['waiting'] = [w for w in state['waiting'] if w[1] != slot_id]
+                    state['in_flight'].append([os.getpid(), slot_id])
+                    state['requests'].append(now)
+                    state['tokens'].append([now, tokens])
+                    break
+                if not queued:
+                    if len(state['waiting']) >= self.queue_size:
+                        metrics.LLM_RATE_LIMITED.inc(provider=self.provider, reason='queue_full')
+                        raise ProviderRateLimited(self.provider, 'rate limit queue is full')
+                    # The expiry lets other callers skip a waiter that vanished without leaving.
+                    state['waiting'].append([os.getpid(), slot_id, time.time() + wait_limit + 1])
+                    queued = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    state['waiting'] = [w for w in state['waiting'] if w[1] != slot_id]
+                    metrics.LLM_RATE_LIMITED.inc(provider=self.provider, reason='queue_timeout')
+                    raise ProviderRateLimited(self.provider, 'timed out waiting for rate limit capacity')
+            time.sleep(max(POLL_INTERVAL, min(wait_for, remaining, MAX_POLL_INTERVAL)))
+        metrics.LLM_RATE_LIMIT_WAIT.observe(time.monotonic() - start, provider=self.provider)
+        return slot_id
+
+    def release(self, slot_id: str):
+        with self._locked_state() as state:
+            state['in_flight'] = [slot for slot in state['in_flight'] if slot[1] != slot_id]
+
+    def back_off(self, seconds: float):
+        """Pause admissions after the provider itself answered 429."""
+        with self._locked_state() as state:
+            state['blocked_until'] = max(state['blocked_until'], time.time() + seconds)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> Optional[ProviderLimiter]:
+    """Return the limiter configured for a provider in AI_RATE_LIMITS, or None."""
+    limits = getattr(settings, 'AI_RATE_LIMITS', {}).get(provider)
+    if not limits:
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            options = {
+                'queue_size': getattr(settings, 'AI_RATE_LIMIT_QUEUE_SIZE', 32),
+                'queue_timeout': getattr(settings, 'AI_RATE_LIMIT_QUEUE_TIMEOUT', 10.0),
+            }
+            options.update(limits)
+            limiter = ProviderLimiter(provider, **options)
+            _limiters[provider] = limiter
+        return limiter
+
+
+def retry_after_seconds(error: Exception, default: float = 1.0) -> float:
+    """Read a Retry-After hint from the SDK exception behind a 429, if any."""
+    response = getattr(error.__cause__, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after', default))
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,99 @@
+"""
+Circuit breakers and the hedging executor used by AIService.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from chatportal import metrics
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and calls
+    are rejected without touching the provider. Once ``reset_timeout`` seconds
+    have passed a single probe call is let through (half-open); its outcome
+    closes the circuit again or re-opens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, provider: str, failure_threshold: int, reset_timeout: float):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            # Open, or half-open with the probe still in flight.
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+        metrics.LLM_CIRCUIT_OPEN.set(0, provider=self.provider)
+
+    def record_inconclusive(self):
+        """
+        A call ended without saying anything about the provider's health (it
+        was cut short by the caller). A half-open probe is released so the
+        next call can probe again.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            is_open = self.state == self.OPEN
+        if is_open:
+            metrics.LLM_CIRCUIT_OPEN.set(1, provider=self.provider)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_hedge_executor = None
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                provider,
+                failure_threshold=getattr(settings, 'AI_CIRCUIT_FAILURE_THRESHOLD', 5),
+                reset_timeout=getattr(settings, 'AI_CIRCUIT_RESET_TIMEOUT', 30.0),
+            )
+            _breakers[provider] = breaker
+        return breaker
+
+
+def get_hedge_executor() -> ThreadPoolExecutor:
+    """Shared thread pool running hedged provider calls."""
+    global _hedge_executor
+    with _breakers_lock:
+        if _hedge_executor is None:
+            _hedge_executor = metrics.track_queue('hedge', ThreadPoolExecutor(
+                max_workers=getattr(settings, 'AI_HEDGE_MAX_WORKERS', 16),
+                thread_name_prefix='llm-hedge',
+            ))
+        return _hedge_executor
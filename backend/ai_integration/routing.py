@@ -0,0 +1,68 @@
+"""
+Task-aware routing of LLM calls.
+
+Each call made by AIService names its task. The task's route decides which
+providers are tried (in failover order), which model each provider uses, and
+the max_tokens and temperature of the request. Routes start from
+DEFAULT_ROUTES and the global provider chain and models, and can be
+overridden per task with AI_TASK_ROUTES, e.g.::
+
+    {"title": {"provider": "lm_studio", "model": "qwen2.5-0.5b-instruct", "max_tokens": 30},
+     "analysis": {"models": {"openai": "gpt-4o-mini"}, "temperature": 0}}
+
+``provider`` puts one provider first (the rest of the chain stays as
+fallback) and ``model`` sets its model; ``providers`` replaces the whole
+chain and ``models`` maps providers to models.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+TASKS = ('chat', 'title', 'suggestions', 'analysis', 'query')
+
+DEFAULT_ROUTES = {
+    'chat': {'max_tokens': 1000, 'temperature': 0.7},
+    'title': {'max_tokens': 60, 'temperature': 0.3},
+    'suggestions': {'max_tokens': 300, 'temperature': 0.7},
+    'analysis': {'max_tokens': 1000, 'temperature': 0.3},
+    'query': {'max_tokens': 1000, 'temperature': 0.3},
+}
+
+
+@dataclass(frozen=True)
+class Route:
+    """Providers, models and generation parameters for one task."""
+    task: str
+    providers: Tuple[str, ...]
+    models: Tuple[Tuple[str, str], ...]
+    max_tokens: int
+    temperature: float
+
+    def model(self, provider: str) -> Optional[str]:
+        return dict(self.models).get(provider)
+
+
+def resolve_route(task: str, provider_chain: List[str], default_models: Dict[str, str]) -> Route:
+    """Build the route of ``task`` from the defaults and AI_TASK_ROUTES."""
+    if task not in DEFAULT_ROUTES:
+        raise ValueError(f'Unknown LLM task: {task}')
+    config = dict(DEFAULT_ROUTES[task])
+    config.update(getattr(settings, 'AI_TASK_ROUTES', {}).get(task, {}))
+
+    providers = list(config.get('providers') or provider_chain)
+    models = dict(default_models)
+    models.update(config.get('models', {}))
+    provider = config.get('provider')
+    if provider:
+        providers = [provider] + [p for p in providers if p != provider]
+        if config.get('model'):
+            models[provider] = config['model']
+
+    return Route(
+        task=task,
+        providers=tuple(providers),
+        models=tuple(sorted(models.items())),
+        max_tokens=int(config['max_tokens']),
+        temperature=float(config['temperature']),
+    )
@@ -3,198 +3,406 @@ AI Integration Service for handling LLM interactions.
 Supports OpenAI, Anthropic Claude, Google Gemini, and LM Studio.
 """
 import os
+import functools
 import json
-from typing import List, Dict, Optional
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, TimeoutError as FutureTimeoutError, wait
+from typing import Callable, List, Dict, Optional
 from django.conf import settings
+from chatportal import metrics
 from conversations.models import Conversation, Message
+from .excerpts import extract_excerpts, rank_conversations
+from .local_analysis import analyze_messages, extractive_title
+from .deadline import Deadline
+from .exceptions import (
+    DeadlineExceeded,
+    ProviderError,
+    ProviderNotConfigured,
+    ProviderRateLimited,
+    ProviderTimeout,
+    ProviderUnavailable,
+    classify_provider_error,
+)
+from .ratelimit import estimate_tokens, get_limiter, retry_after_seconds
+from .resilience import get_circuit_breaker, get_hedge_executor
+from .routing import Route, resolve_route
+from .singleflight import fingerprint, single_flight
 import requests
 
+logger = logging.getLogger(__name__)
+
 
 class AIService:
     """
     Service class for AI-powered chat and conversation analysis.
     """
+    DEFAULT_MODELS = {
+        'openai': 'gpt-3.5-turbo',
+        'anthropic': 'claude-3-sonnet-20240229',
+        'google': 'gemini-pro',
+    }
+    # Prompt description and JSON example of each analysis field.
+    ANALYSIS_FIELDS = {
+        'summary': ('A brief summary of the conversation (2-3 sentences)', '"..."'),
+        'key_topics': ('List of main topics discussed (array of strings)', '["topic1", "topic2"]'),
+        'sentiment': ('Overall sentiment (positive, neutral, or negative)', '"positive/neutral/negative"'),
+        'action_items': ('List of any action items or decisions made (array of strings)', '["item1", "item2"]'),
+    }
+    # Analysis fields computed locally when AI_LOCAL_ANALYSIS is "first".
+    LOCAL_ANALYSIS_FIELDS = ('key_topics', 'sentiment')
     
-    def __init__(self):
+    def __init__(self, deadline: Optional[Deadline] = None):
+        # Time budget of the request this service works for (None: unbounded).
+        self.deadline = deadline
         self.provider = getattr(settings, 'AI_PROVIDER', 'openai')
+        self.provider_chain = list(getattr(settings, 'AI_PROVIDER_CHAIN', None) or [self.provider])
+        self.timeout = getattr(settings, 'AI_PROVIDER_TIMEOUT', 30.0)
+        self.hedge_after = getattr(settings, 'AI_HEDGE_AFTER', 0)
+        self.local_analysis = getattr(settings, 'AI_LOCAL_ANALYSIS', 'fallback')
         self.openai_key = getattr(settings, 'OPENAI_API_KEY', '')
         self.anthropic_key = getattr(settings, 'ANTHROPIC_API_KEY', '')
         self.google_key = getattr(settings, 'GOOGLE_API_KEY', '')
         self.lm_studio_url = getattr(settings, 'LM_STUDIO_URL', 'http://localhost:1234/v1')
         self.lm_studio_model = getattr(settings, 'LM_STUDIO_MODEL', 'local-model')
     
-    def _get_conversation_context(self, conversation_id: int, max_messages: int = 10) -> List[Dict]:
+    def _get_conversation_context(self, conversation_id: int, max_messages: int = None) -> List[Dict]:
         """
-        Retrieve recent messages from a conversation for context.
+        Retrieve the most recent messages of a conversation for context.
+        The views pass the (cached) history to chat() instead.
         """
+        if max_messages is None:
+            max_messages = settings.CONVERSATION_CONTEXT_MESSAGES
         conversation = Conversation.objects.get(id=conversation_id)
-        messages = conversation.messages.all()[:max_messages]
+        if conversation.is_archived:
+            messages = list(conversation.message_history)[-max_messages:] if max_messages else []
+        else:
+            messages = reversed(
+                Message.objects.of_conversation(conversation).order_by('-timestamp', '-id')[:max_messages]
+            )
+        return [
+            {'role': 'user' if msg.sender == 'user' else 'assistant', 'content': msg.content}
+            for msg in messages
+        ]
+    
+    def _call_openai(self, messages: List[Dict], system_prompt: str, route: Route) -> str:
+        """Call OpenAI API."""
+        import openai
+        import httpx
+        
+        # Check if API key is set
+        if not self.openai_key:
+            raise ProviderNotConfigured('openai', 'Please set OPENAI_API_KEY in your .env file.')
+        
+        # Create httpx client without proxies to avoid compatibility issues
+        http_client = httpx.Client(timeout=self._provider_timeout())
+        
+        # Initialize OpenAI client with explicit http_client. Retries are left
+        # to the failover chain so a failing call never costs several timeouts.
+        client = openai.OpenAI(
+            api_key=self.openai_key,
+            http_client=http_client,
+            max_retries=0
+        )
+        
+        if system_prompt:
+            messages = [{'role': 'system', 'content': system_prompt}] + messages
+        
+        response = client.chat.completions.create(
+            model=route.model('openai'),
+            messages=messages,
+            temperature=route.temperature,
+            max_tokens=route.max_tokens
+        )
+        return response.choices[0].message.content
+    
+    def _call_anthropic(self, messages: List[Dict], system_prompt: str, route: Route) -> str:
+        """Call Anthropic Claude API."""
+        import anthropic
+        
+        if not self.anthropic_key:
+            raise ProviderNotConfigured('anthropic', 'Please set ANTHROPIC_API_KEY in your .env file.')
+        
+        client = anthropic.Anthropic(
+            api_key=self.anthropic_key,
+            timeout=self._provider_timeout(),
+            max_retries=0
+        )
         
-        context = []
+        # Convert messages format for Claude
+        claude_messages = []
         for msg in messages:
-            role = 'user' if msg.sender == 'user' else 'assistant'
-            context.append({
-                'role': role,
-                'content': msg.content
-            })
-        return context
+            if msg['role'] != 'system':
+                claude_messages.append(msg)
+        
+        response = client.messages.create(
+            model=route.model('anthropic'),
+            max_tokens=route.max_tokens,
+            temperature=route.temperature,
+            system=system_prompt or "You are a helpful AI assistant.",
+            messages=claude_messages
+        )
+        return response.content[0].text
     
-    def _call_openai(self, messages: List[Dict], system_prompt: str = None) -> str:
-        """Call OpenAI API."""
-        try:
-            import openai
-            import httpx
-            
-            # Check if API key is set
-            if not self.openai_key:
-                return "OpenAI API key is not configured. Please set OPENAI_API_KEY in your .env file."
-            
-            # Create httpx client without proxies to avoid compatibility issues
-            http_client = httpx.Client(timeout=30.0)
-            
-            # Initialize OpenAI client with explicit http_client
-            client = openai.OpenAI(
-                api_key=self.openai_key,
-                http_client=http_client
-            )
-            
-            if system_prompt:
-                messages = [{'role': 'system', 'content': system_prompt}] + messages
-            
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1000
+    def _call_google(self, messages: List[Dict], system_prompt: str, route: Route) -> str:
+        """Call Google Gemini API."""
+        import google.generativeai as genai
+        
+        if not self.google_key:
+            raise ProviderNotConfigured('google', 'Please set GOOGLE_API_KEY in your .env file.')
+        
+        genai.configure(api_key=self.google_key)
+        
+        model = genai.GenerativeModel(
+            route.model('google'),
+            generation_config={'max_output_tokens': route.max_tokens, 'temperature': route.temperature}
+        )
+        
+        # Combine system prompt and messages
+        prompt_parts = []
+        if system_prompt:
+            prompt_parts.append(system_prompt)
+        
+        for msg in messages:
+            if msg['role'] == 'user':
+                prompt_parts.append(f"User: {msg['content']}")
+            elif msg['role'] == 'assistant':
+                prompt_parts.append(f"Assistant: {msg['content']}")
+        
+        prompt = "\n".join(prompt_parts)
+        response = model.generate_content(prompt)
+        return response.text
+    
+    def _call_lm_studio(self, messages: List[Dict], system_prompt: str, route: Route) -> str:
+        """Call LM Studio local API."""
+        model_id = route.model('lm_studio') or 'local-model'
+        if model_id == 'local-model':
+            raise ProviderNotConfigured(
+                'lm_studio',
+                "No model ID is configured. Please set LM_STUDIO_MODEL in your .env file "
+                "(e.g., openai/gpt-oss-20b) to match the model loaded in LM Studio."
             )
-            return response.choices[0].message.content
-        except Exception as e:
-            # Provide more helpful error message
-            error_msg = str(e)
-            if not self.openai_key:
-                return "Error calling OpenAI: API key is not configured. Please set OPENAI_API_KEY in your .env file."
-            # Check for specific error types
-            if "quota" in error_msg.lower() or "429" in error_msg or "insufficient_quota" in error_msg:
-                return "Error calling OpenAI: You have exceeded your API quota. Please check your OpenAI billing and plan. Consider using LM Studio for local testing or switch to another provider."
-            return f"Error calling OpenAI: {error_msg}"
+        
+        if system_prompt:
+            messages = [{'role': 'system', 'content': system_prompt}] + messages
+        
+        response = requests.post(
+            f"{self.lm_studio_url}/chat/completions",
+            json={
+                'model': model_id,
+                'messages': messages,
+                'temperature': route.temperature,
+                'max_tokens': route.max_tokens
+            },
+            timeout=self._provider_timeout()
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data['choices'][0]['message']['content']
     
-    def _call_anthropic(self, messages: List[Dict], system_prompt: str = None) -> str:
-        """Call Anthropic Claude API."""
+    PROVIDER_CALLS = {
+        'openai': _call_openai,
+        'anthropic': _call_anthropic,
+        'google': _call_google,
+        'lm_studio': _call_lm_studio,
+    }
+    
+    def _provider_timeout(self) -> float:
+        """Timeout of a provider call: AI_PROVIDER_TIMEOUT, cut to what is left of the deadline."""
+        return self.deadline.timeout(self.timeout) if self.deadline is not None else self.timeout
+    
+    def _route(self, task: str) -> Route:
+        """Providers, models and generation parameters for a task."""
+        return resolve_route(
+            task, self.provider_chain, {**self.DEFAULT_MODELS, 'lm_studio': self.lm_studio_model}
+        )
+    
+    def _get_model(self, provider: str, route: Route = None) -> str:
+        """Return the model name used for a provider (on a task's route)."""
+        if route is not None:
+            return route.model(provider) or ('local-model' if provider == 'lm_studio' else 'none')
+        if provider == 'lm_studio':
+            return self.lm_studio_model or 'local-model'
+        return self.DEFAULT_MODELS.get(provider, 'none')
+    
+    def _is_configured(self, provider: str, route: Route = None) -> bool:
+        """Whether a provider has the credentials/model it needs."""
+        if provider == 'openai':
+            return bool(self.openai_key)
+        if provider == 'anthropic':
+            return bool(self.anthropic_key)
+        if provider == 'google':
+            return bool(self.google_key)
+        if provider == 'lm_studio':
+            model = self._get_model(provider, route)
+            return bool(model) and model != 'local-model'
+        return False
+    
+    def _timed_call(self, provider: str, messages: List[Dict], system_prompt: str, route: Route) -> str:
+        """Invoke a provider call while recording latency, errors and in-flight calls."""
+        model = self._get_model(provider, route)
+        metrics.LLM_IN_FLIGHT.inc(provider=provider)
+        start = time.perf_counter()
         try:
-            import anthropic
-            client = anthropic.Anthropic(api_key=self.anthropic_key)
-            
-            # Convert messages format for Claude
-            claude_messages = []
-            for msg in messages:
-                if msg['role'] != 'system':
-                    claude_messages.append(msg)
-            
-            response = client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=1000,
-                system=system_prompt or "You are a helpful AI assistant.",
-                messages=claude_messages
-            )
-            return response.content[0].text
+            return self.PROVIDER_CALLS[provider](self, messages, system_prompt, route)
         except Exception as e:
-            return f"Error calling Anthropic: {str(e)}"
+            metrics.LLM_ERRORS.inc(provider=provider, model=model)
+            raise classify_provider_error(provider, e) from e
+        finally:
+            metrics.LLM_IN_FLIGHT.dec(provider=provider)
+            metrics.LLM_REQUEST_DURATION.observe(
+                time.perf_counter() - start, provider=provider, model=model
+            )
     
-    def _call_google(self, messages: List[Dict], system_prompt: str = None) -> str:
-        """Call Google Gemini API."""
+    def _call_provider(self, provider: str, messages: List[Dict], system_prompt: str, route: Route) -> str:
+        """
+        Call a single provider through its rate limiter and circuit breaker.
+        Raises a ProviderError subclass on failure.
+        """
+        if self.deadline is not None:
+            self.deadline.check()
+        limiter = get_limiter(provider)
+        slot = limiter.acquire(
+            estimate_tokens(messages, system_prompt, route.max_tokens),
+            timeout=self.deadline.remaining() if self.deadline is not None else None
+        ) if limiter else None
         try:
-            import google.generativeai as genai
-            genai.configure(api_key=self.google_key)
-            
-            model = genai.GenerativeModel('gemini-pro')
-            
-            # Combine system prompt and messages
-            prompt_parts = []
-            if system_prompt:
-                prompt_parts.append(system_prompt)
-            
-            for msg in messages:
-                if msg['role'] == 'user':
-                    prompt_parts.append(f"User: {msg['content']}")
-                elif msg['role'] == 'assistant':
-                    prompt_parts.append(f"Assistant: {msg['content']}")
-            
-            prompt = "\n".join(prompt_parts)
-            response = model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"Error calling Google Gemini: {str(e)}"
+            breaker = get_circuit_breaker(provider)
+            if not breaker.allow_request():
+                raise ProviderUnavailable(provider, 'circuit breaker is open')
+            try:
+                result = self._timed_call(provider, messages, system_prompt, route)
+            except ProviderNotConfigured:
+                # A configuration problem says nothing about the provider's
+                # health: leave the breaker as it was (releasing a probe).
+                breaker.record_inconclusive()
+                raise
+            except ProviderTimeout:
+                if self.deadline is not None and self.deadline.expired():
+                    # Cut short by the request's deadline, not the provider's fault.
+                    breaker.record_inconclusive()
+                else:
+                    breaker.record_failure()
+                raise
+            except ProviderError as e:
+                breaker.record_failure()
+                if limiter and isinstance(e, ProviderRateLimited):
+                    limiter.back_off(retry_after_seconds(e))
+                raise
+            breaker.record_success()
+            return result
+        finally:
+            if slot:
+                limiter.release(slot)
     
-    def _call_lm_studio(self, messages: List[Dict], system_prompt: str = None) -> str:
-        """Call LM Studio local API."""
+    def _provider_candidates(self, route: Route) -> List[str]:
+        """Configured providers of a route's failover chain, in order."""
+        candidates = []
+        for provider in route.providers:
+            if provider in self.PROVIDER_CALLS and provider not in candidates and self._is_configured(provider, route):
+                candidates.append(provider)
+        return candidates
+    
+    def _call_chain(self, providers: List[str], messages: List[Dict], system_prompt: str, route: Route) -> str:
+        """Try providers one after another until one succeeds."""
+        last_error = None
+        for provider in providers:
+            try:
+                return self._call_provider(provider, messages, system_prompt, route)
+            except ProviderError as e:
+                logger.warning("LLM provider failed: %s", e)
+                last_error = e
+        raise last_error
+    
+    def _call_chain_hedged(self, providers: List[str], messages: List[Dict], system_prompt: str, route: Route) -> str:
+        """
+        Like _call_chain, but when a call has not answered within hedge_after
+        seconds the next provider is started in parallel (at most two calls
+        at a time) and the first successful answer wins. A losing call is
+        abandoned and finishes on its own within the provider timeout.
+        """
+        executor = get_hedge_executor()
+        queue = list(providers)
+        pending = {}
+        last_error = None
+        
+        def launch():
+            provider = queue.pop(0)
+            pending[executor.submit(self._call_provider, provider, messages, system_prompt, route)] = provider
+        
+        launch()
+        while pending:
+            can_hedge = bool(queue) and len(pending) < 2
+            done, _ = wait(pending, timeout=self.hedge_after if can_hedge else None, return_when=FIRST_COMPLETED)
+            if not done:
+                launch()
+                continue
+            for future in done:
+                pending.pop(future)
+                try:
+                    return future.result()
+                except ProviderError as e:
+                    logger.warning("LLM provider failed: %s", e)
+                    last_error = e
+            if queue and len(pending) < 2:
+                launch()
+        raise last_error
+    
+    def _call_llm(self, messages: List[Dict], system_prompt: str = None, task: str = 'chat',
+                  fallback: Callable[[], str] = None) -> str:
+        """
+        Unified method to call the LLM providers routed for ``task`` (see
+        ai_integration.routing). ``fallback`` produces the answer when no
+        provider does; the default is a canned response.
+        Identical concurrent calls, in this or other worker processes, are
+        coalesced into one provider call whose result they share.
+        """
+        route = self._route(task)
+        if not getattr(settings, 'AI_SINGLE_FLIGHT', True):
+            return self._call_providers(messages, system_prompt, route, fallback)
+        
+        key = fingerprint(
+            route.providers, route.models, route.max_tokens, route.temperature,
+            system_prompt, messages
+        )
         try:
-            if system_prompt:
-                messages = [{'role': 'system', 'content': system_prompt}] + messages
-            
-            model_id = self.lm_studio_model or 'local-model'
-            if model_id == 'local-model':
-                # Provide warning message to help configure correct model
-                return (
-                    "LM Studio is running, but no model ID is configured. "
-                    "Please set LM_STUDIO_MODEL in your .env file (e.g., openai/gpt-oss-20b) "
-                    "or update settings.LM_STUDIO_MODEL to match the model loaded in LM Studio."
-                )
-            
-            response = requests.post(
-                f"{self.lm_studio_url}/chat/completions",
-                json={
-                    'model': model_id,
-                    'messages': messages,
-                    'temperature': 0.7,
-                    'max_tokens': 1000
-                },
-                timeout=30
+            result, shared = single_flight.do(
+                key, lambda: self._call_providers(messages, system_prompt, route, fallback),
+                timeout=self.deadline.remaining() if self.deadline is not None else None
             )
-            response.raise_for_status()
-            data = response.json()
-            return data['choices'][0]['message']['content']
-        except Exception as e:
-            return f"Error calling LM Studio: {str(e)}"
+        except FutureTimeoutError:
+            raise DeadlineExceeded('request deadline exceeded while waiting for an identical call')
+        if shared:
+            provider = route.providers[0]
+            metrics.LLM_CACHE_HITS.inc(provider=provider, model=self._get_model(provider, route))
+        return result
     
-    def _call_llm(self, messages: List[Dict], system_prompt: str = None) -> str:
+    def _call_providers(self, messages: List[Dict], system_prompt: str, route: Route,
+                        fallback: Callable[[], str] = None) -> str:
         """
-        Unified method to call the configured LLM provider.
+        Walk the route's failover chain and fall back when every provider
+        fails or none is configured.
         """
+        providers = self._provider_candidates(route)
+        if not providers:
+            return self._get_fallback_response(messages, fallback)
         try:
-            if self.provider == 'openai' and self.openai_key:
-                result = self._call_openai(messages, system_prompt)
-                # Check if it's an error message and try fallback
-                if result.startswith("Error calling OpenAI"):
-                    # If quota exceeded or other error, try fallback
-                    if "quota" in result.lower() or "429" in result:
-                        return self._get_fallback_response(messages)
-                    return result
-                return result
-            elif self.provider == 'anthropic' and self.anthropic_key:
-                result = self._call_anthropic(messages, system_prompt)
-                if result.startswith("Error calling Anthropic"):
-                    return self._get_fallback_response(messages)
-                return result
-            elif self.provider == 'google' and self.google_key:
-                result = self._call_google(messages, system_prompt)
-                if result.startswith("Error calling Google"):
-                    return self._get_fallback_response(messages)
-                return result
-            elif self.provider == 'lm_studio':
-                result = self._call_lm_studio(messages, system_prompt)
-                if result.startswith("Error calling LM Studio"):
-                    return self._get_fallback_response(messages)
-                return result
-            else:
-                # Fallback to a simple response if no provider is configured
-                return self._get_fallback_response(messages)
-        except Exception as e:
-            return self._get_fallback_response(messages)
-    
-    def _get_fallback_response(self, messages: List[Dict]) -> str:
+            if self.hedge_after and len(providers) > 1:
+                return self._call_chain_hedged(providers, messages, system_prompt, route)
+            return self._call_chain(providers, messages, system_prompt, route)
+        except ProviderError as e:
+            if self.deadline is not None and self.deadline.expired():
+                raise DeadlineExceeded(f'request deadline exceeded: {e}') from e
+            return self._get_fallback_response(messages, fallback)
+
+    def _get_fallback_response(self, messages: List[Dict], fallback: Callable[[], str] = None) -> str:
         """
         Generate a fallback response when AI providers are unavailable.
         """
+        metrics.LLM_FALLBACKS.inc(provider=self.provider, model=self._get_model(self.provider))
+        if fallback is not None:
+            return fallback()
+        
         # Get the last user message
         last_user_message = None
         for msg in reversed(messages):
@@ -207,13 +415,17 @@ class AIService:
         
         return f"I understand you said: '{last_user_message}'. However, I'm currently unable to connect to the AI service. Please check your API configuration in the backend/.env file. You can use LM Studio for local testing, or configure OpenAI, Anthropic, or Google Gemini API keys."
     
-    def chat(self, conversation_id: int, user_message: str) -> str:
+    def chat(self, conversation_id: int, user_message: str, history: Optional[List[Dict]] = None) -> str:
         """
         Generate AI response for a user message in a conversation.
-        Maintains conversation context.
+        Maintains conversation context; ``history`` (role/content dicts), when
+        given, is used instead of loading it from the database.
         """
         # Get conversation context
-        context = self._get_conversation_context(conversation_id, max_messages=10)
+        if history is not None:
+            context = list(history)
+        else:
+            context = self._get_conversation_context(conversation_id)
         
         # Add current user message
         context.append({
@@ -223,12 +435,14 @@ class AIService:
         
         system_prompt = "You are a helpful, friendly, and knowledgeable AI assistant. Provide clear, concise, and helpful responses."
         
-        return self._call_llm(context, system_prompt)
+        return self._call_llm(context, system_prompt, task='chat')
     
     def generate_title(self, first_message: str) -> str:
         """
         Generate a title for a conversation based on the first message.
         """
+        if self.local_analysis == 'first':
+            return extractive_title(first_message)
         prompt = f"Generate a short, descriptive title (max 5 words) for a conversation that starts with: '{first_message[:100]}'"
         
         messages = [{
@@ -236,9 +450,84 @@ class AIService:
             'content': prompt
         }]
         
-        title = self._call_llm(messages, "You are a title generator. Return only the title, no explanation.")
+        title = self._call_llm(
+            messages, "You are a title generator. Return only the title, no explanation.", task='title',
+            fallback=self._local_fallback(lambda: extractive_title(first_message))
+        )
         return title.strip().strip('"').strip("'")
     
+    @staticmethod
+    def _clean_json_response(response: str) -> str:
+        """Strip whitespace and markdown code fences around a JSON answer."""
+        response = response.strip()
+        if response.startswith('```'):
+            response = response.split('```')[1]
+            if response.startswith('json'):
+                response = response[4:]
+        return response.strip()
+    
+    def _local_fallback(self, produce: Callable[[], str]) -> Optional[Callable[[], str]]:
+        """``produce`` as the no-provider fallback, unless AI_LOCAL_ANALYSIS is "off"."""
+        return None if self.local_analysis == 'off' else produce
+    
+    def _llm_analysis_fields(self) -> List[str]:
+        """Analysis fields asked of the LLM; the rest are computed locally."""
+        if self.local_analysis == 'first':
+            return [field for field in self.ANALYSIS_FIELDS if field not in self.LOCAL_ANALYSIS_FIELDS]
+        return list(self.ANALYSIS_FIELDS)
+    
+    def _analysis_prompt_parts(self, indent: str) -> tuple:
+        """The numbered field list and the JSON example of an analysis prompt."""
+        fields = self._llm_analysis_fields()
+        instructions = "\n".join(
+            f"{number}. {field}: {self.ANALYSIS_FIELDS[field][0]}"
+            for number, field in enumerate(fields, 1)
+        )
+        example = ",\n".join(f'{indent}"{field}": {self.ANALYSIS_FIELDS[field][1]}' for field in fields)
+        return instructions, example
+    
+    @staticmethod
+    def _local_analyses(conversations: List[tuple]) -> Dict[object, Callable[[], Dict]]:
+        """
+        Functions returning the local analysis of each of ``conversations``,
+        by id. analyze_messages runs for all of them at the first call only:
+        the "fallback" mode needs it only when no provider answers.
+        """
+        analyses = functools.lru_cache(maxsize=None)(lambda: analyze_messages(conversations))
+        
+        def local(conversation_id):
+            return lambda: analyses()[conversation_id]
+        return {conversation_id: local(conversation_id) for conversation_id, _ in conversations}
+    
+    def _with_local_fields(self, analysis: Dict, local: Callable[[], Dict]) -> Dict:
+        """Fill in the fields computed locally in "first" mode."""
+        if self.local_analysis == 'first':
+            analysis.update({field: local()[field] for field in self.LOCAL_ANALYSIS_FIELDS})
+        return analysis
+    
+    def _analysis_fallback(self, local: Callable[[], Dict]) -> Dict:
+        """
+        The analysis answered when no provider does: the local analysis, or an
+        empty one when AI_LOCAL_ANALYSIS is "off". It is marked ``fallback``
+        so callers can tell it from a real analysis.
+        """
+        if self.local_analysis == 'off':
+            return {
+                'summary': 'No summary available.', 'key_topics': [], 'sentiment': 'neutral', 'action_items': [],
+                'fallback': True,
+            }
+        return {**local(), 'fallback': True}
+    
+    def _parse_analysis(self, analysis: Dict, local: Callable[[], Dict]) -> Dict:
+        """An analysis dict from a (JSON) answer, with ``fallback`` telling whether it came from the fallback."""
+        return self._with_local_fields({
+            'summary': analysis.get('summary', ''),
+            'key_topics': analysis.get('key_topics', []),
+            'sentiment': analysis.get('sentiment', 'neutral'),
+            'action_items': analysis.get('action_items', []),
+            'fallback': analysis.get('fallback') is True,
+        }, local)
+    
     def analyze_conversation(self, messages: List[Dict]) -> Dict:
         """
         Analyze a conversation and extract:
@@ -246,27 +535,24 @@ class AIService:
         - Key topics
         - Sentiment
         - Action items
+        ``fallback`` is True when no provider answered.
         """
+        local = self._local_analyses([(None, messages)])[None]
         conversation_text = "\n".join([
             f"{msg['sender'].upper()}: {msg['content']}"
             for msg in messages
         ])
+        instructions, example = self._analysis_prompt_parts('    ')
         
         analysis_prompt = f"""Analyze the following conversation and provide a JSON response with:
-1. summary: A brief summary of the conversation (2-3 sentences)
-2. key_topics: List of main topics discussed (array of strings)
-3. sentiment: Overall sentiment (positive, neutral, or negative)
-4. action_items: List of any action items or decisions made (array of strings)
+{instructions}
 
 Conversation:
 {conversation_text}
 
 Return only valid JSON in this format:
 {{
-    "summary": "...",
-    "key_topics": ["topic1", "topic2"],
-    "sentiment": "positive/neutral/negative",
-    "action_items": ["item1", "item2"]
+{example}
 }}"""
         
         messages_list = [{
@@ -276,34 +562,85 @@ Return only valid JSON in this format:
         
         response = self._call_llm(
             messages_list,
-            "You are a conversation analyst. Return only valid JSON, no additional text."
+            "You are a conversation analyst. Return only valid JSON, no additional text.",
+            task='analysis',
+            fallback=lambda: json.dumps(self._analysis_fallback(local))
         )
         
         # Try to parse JSON response
         try:
             # Clean response (remove markdown code blocks if present)
-            response = response.strip()
-            if response.startswith('```'):
-                response = response.split('```')[1]
-                if response.startswith('json'):
-                    response = response[4:]
-            response = response.strip()
+            response = self._clean_json_response(response)
             
             analysis = json.loads(response)
-            return {
-                'summary': analysis.get('summary', ''),
-                'key_topics': analysis.get('key_topics', []),
-                'sentiment': analysis.get('sentiment', 'neutral'),
-                'action_items': analysis.get('action_items', [])
-            }
+            if not isinstance(analysis, dict):
+                raise json.JSONDecodeError('not an object', response, 0)
+            return self._parse_analysis(analysis, local)
         except json.JSONDecodeError:
             # Fallback if JSON parsing fails
-            return {
+            return self._parse_analysis({
                 'summary': response[:500] if response else 'No summary available.',
-                'key_topics': [],
-                'sentiment': 'neutral',
-                'action_items': []
-            }
+            }, local)
+    
+    def analyze_conversations(self, conversations: List[tuple]) -> Dict[int, Dict]:
+        """
+        Analyze several short conversations with a single prompt.
+        Takes (conversation_id, messages) pairs and returns analyses keyed by
+        conversation id (see analyze_conversation); conversations missing
+        from the model's answer are analyzed one by one.
+        """
+        if len(conversations) == 1:
+            conversation_id, messages = conversations[0]
+            return {conversation_id: self.analyze_conversation(messages)}
+        
+        local = self._local_analyses(conversations)
+        sections = []
+        for conversation_id, messages in conversations:
+            conversation_text = "\n".join([
+                f"{msg['sender'].upper()}: {msg['content']}"
+                for msg in messages
+            ])
+            sections.append(f"Conversation ID: {conversation_id}\n{conversation_text}")
+        all_conversations = "\n\n---\n\n".join(sections)
+        instructions, example = self._analysis_prompt_parts('        ')
+        
+        analysis_prompt = f"""Analyze each of the following conversations separately and provide for each:
+{instructions}
+
+Conversations:
+{all_conversations}
+
+Return only valid JSON mapping each conversation ID to its analysis:
+{{
+    "<conversation id>": {{
+{example}
+    }}
+}}"""
+        
+        response = self._call_llm(
+            [{'role': 'user', 'content': analysis_prompt}],
+            "You are a conversation analyst. Return only valid JSON, no additional text.",
+            task='analysis',
+            fallback=lambda: json.dumps({
+                str(conversation_id): self._analysis_fallback(analysis) for conversation_id, analysis in local.items()
+            })
+        )
+        
+        try:
+            parsed = json.loads(self._clean_json_response(response))
+        except json.JSONDecodeError:
+            parsed = {}
+        if not isinstance(parsed, dict):
+            parsed = {}
+        
+        results = {}
+        for conversation_id, messages in conversations:
+            analysis = parsed.get(str(conversation_id))
+            if isinstance(analysis, dict):
+                results[conversation_id] = self._parse_analysis(analysis, local[conversation_id])
+            else:
+                results[conversation_id] = self.analyze_conversation(messages)
+        return results
     
     def query_past_conversations(
         self,
@@ -320,10 +657,13 @@ Return only valid JSON in this format:
                 'excerpts': []
             }
         
+        # Excerpts are ranked locally (BM25) instead of being generated.
+        candidate_messages = {conv.id: list(conv.message_history) for conv in conversations}
+        
         # Prepare conversation summaries for context
         conversation_contexts = []
         for conv in conversations:
-            messages = conv.messages.all()
+            messages = candidate_messages[conv.id]
             messages_text = "\n".join([
                 f"{msg.sender}: {msg.content}"
                 for msg in messages[:20]  # Limit to first 20 messages
@@ -352,19 +692,13 @@ Return only valid JSON in this format:
 Past Conversations:
 {all_contexts}
 
-Provide:
-1. A direct answer to the question
-2. Relevant excerpts from conversations that support your answer
-3. Reference conversation IDs when mentioning specific conversations
+Provide a direct answer to the question and the IDs of the conversations it
+draws on. Do not quote the conversations.
 
 Format your response as JSON:
 {{
     "answer": "Your answer here",
-    "relevant_conversation_ids": [1, 2],
-    "excerpts": [
-        {{"conversation_id": 1, "excerpt": "relevant text"}},
-        {{"conversation_id": 2, "excerpt": "relevant text"}}
-    ]
+    "relevant_conversation_ids": [1, 2]
 }}"""
         
         messages_list = [{
@@ -374,52 +708,49 @@ Format your response as JSON:
         
         response = self._call_llm(
             messages_list,
-            "You are a conversation intelligence assistant. Analyze past conversations and answer questions about them. Return only valid JSON."
+            "You are a conversation intelligence assistant. Analyze past conversations and answer questions about them. Return only valid JSON.",
+            task='query'
         )
         
         # Parse response
         try:
-            response = response.strip()
-            if response.startswith('```'):
-                response = response.split('```')[1]
-                if response.startswith('json'):
-                    response = response[4:]
-            response = response.strip()
+            response = self._clean_json_response(response)
             
             result = json.loads(response)
-            
-            # Get full conversation details for relevant IDs
-            relevant_conversations = []
-            for conv_id in result.get('relevant_conversation_ids', []):
+            answer = result.get('answer', 'Unable to generate answer.')
+            relevant_ids = []
+            for conv_id in result.get('relevant_conversation_ids') or []:
+                # Models sometimes return ids as strings.
                 try:
-                    conv = Conversation.objects.get(id=conv_id)
-                    relevant_conversations.append({
-                        'id': conv.id,
-                        'title': conv.title or 'Untitled',
-                        'start_timestamp': conv.start_timestamp.isoformat(),
-                        'summary': conv.summary
-                    })
-                except Conversation.DoesNotExist:
+                    conv_id = int(conv_id)
+                except (TypeError, ValueError):
                     continue
-            
-            return {
-                'answer': result.get('answer', 'Unable to generate answer.'),
-                'relevant_conversations': relevant_conversations,
-                'excerpts': result.get('excerpts', [])
-            }
-        except json.JSONDecodeError:
+                if conv_id in candidate_messages:
+                    relevant_ids.append(conv_id)
+        except (json.JSONDecodeError, AttributeError, TypeError):
             # Fallback response
-            return {
-                'answer': response[:1000] if response else 'Unable to process query.',
-                'relevant_conversations': [
-                    {
-                        'id': conv.id,
-                        'title': conv.title or 'Untitled',
-                        'start_timestamp': conv.start_timestamp.isoformat(),
-                        'summary': conv.summary
-                    }
-                    for conv in conversations[:3]
-                ],
-                'excerpts': []
+            answer = response[:1000] if response else 'Unable to process query.'
+            relevant_ids = rank_conversations(query, candidate_messages)[:3] or [conv.id for conv in conversations[:3]]
+        
+        # The candidates are already loaded; no need to fetch them again.
+        found = {conv.id: conv for conv in conversations}
+        relevant_conversations = [
+            {
+                'id': found[conv_id].id,
+                'title': found[conv_id].title or 'Untitled',
+                'start_timestamp': found[conv_id].start_timestamp.isoformat(),
+                'summary': found[conv_id].summary
             }
+            for conv_id in dict.fromkeys(relevant_ids)
+        ]
+        
+        excerpt_scope = {
+            conv['id']: candidate_messages[conv['id']] for conv in relevant_conversations
+        } or candidate_messages
+        
+        return {
+            'answer': answer,
+            'relevant_conversations': relevant_conversations,
+            'excerpts': extract_excerpts(query, excerpt_scope)
+        }
 
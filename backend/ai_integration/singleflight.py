@@ -0,0 +1,123 @@
+"""
+Single-flight coalescing of identical LLM calls.
+
+Concurrent calls with the same fingerprint share the result of one provider
+call. Within a process followers wait on the leader's future and never touch
+the database. Only the leader of a process goes on to the LLMFlight lock
+table (unless AI_SINGLE_FLIGHT_ACROSS_PROCESSES is off): the leader across
+processes holds its row and the other processes' leaders poll it for the
+result. A row left behind by a leader that died is taken over by the next
+caller that reads it once it is older than AI_SINGLE_FLIGHT_TIMEOUT.
+"""
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import LLMFlight
+
+POLL_INTERVAL = 0.1
+
+
+def fingerprint(*parts) -> str:
+    """Stable hash of the JSON-serializable parts of a request."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its result."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._next_cleanup = 0.0
+
+    def do(self, key: str, fn: Callable[[], str], timeout: Optional[float] = None) -> Tuple[str, bool]:
+        """
+        Return (result, shared). ``shared`` is True when the result came from
+        a call made on behalf of another request. A follower waits at most
+        ``timeout`` seconds for the leader within the process
+        (concurrent.futures.TimeoutError) and across processes (then it
+        calls ``fn`` itself).
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            return future.result(timeout), True
+        try:
+            if getattr(settings, 'AI_SINGLE_FLIGHT_ACROSS_PROCESSES', True):
+                result, shared = self._do_across_processes(key, fn, timeout)
+            else:
+                result, shared = fn(), False
+            future.set_result(result)
+            return result, shared
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _do_across_processes(self, key: str, fn: Callable[[], str], timeout: Optional[float]) -> Tuple[str, bool]:
+        # Must not run inside a transaction, or other processes can't see the lock row.
+        wait_timeout = getattr(settings, 'AI_SINGLE_FLIGHT_TIMEOUT', 60.0)
+        linger = timedelta(seconds=getattr(settings, 'AI_SINGLE_FLIGHT_LINGER', 5.0))
+        deadline = time.monotonic() + (wait_timeout if timeout is None else min(timeout, wait_timeout))
+        while True:
+            try:
+                with transaction.atomic():
+                    claimed = LLMFlight.objects.create(key=key)
+                break
+            except IntegrityError:
+                pass
+            flight = LLMFlight.objects.filter(key=key).values('result', 'created_at', 'completed_at').first()
+            if flight is None:
+                continue
+            now = timezone.now()
+            if flight['completed_at'] is not None:
+                if now - flight['completed_at'] <= linger:
+                    return flight['result'], True
+                LLMFlight.objects.filter(key=key, created_at=flight['created_at']).delete()
+                continue
+            if now - flight['created_at'] > timedelta(seconds=wait_timeout):
+                # The leader died (or hung) without finishing: take its place.
+                LLMFlight.objects.filter(key=key, created_at=flight['created_at']).delete()
+                continue
+            if time.monotonic() >= deadline:
+                # The leader is too slow; don't wait any longer.
+                return fn(), False
+            time.sleep(POLL_INTERVAL)
+
+        # Our row may have been taken over meanwhile; only ever touch our own.
+        own_row = LLMFlight.objects.filter(key=key, created_at=claimed.created_at)
+        try:
+            result = fn()
+        except BaseException:
+            own_row.delete()
+            raise
+        own_row.update(result=result, completed_at=timezone.now())
+        self._cleanup(wait_timeout)
+        return result, False
+
+    def _cleanup(self, wait_timeout: float):
+        """Delete rows of keys that were not called again, at most once per wait_timeout."""
+        now = time.monotonic()
+        if now < self._next_cleanup:
+            return
+        self._next_cleanup = now + wait_timeout
+        LLMFlight.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=wait_timeout)).delete()
+
+
+single_flight = SingleFlight()
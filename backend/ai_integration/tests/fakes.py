@@ -0,0 +1,61 @@
+"""Scripted LLM providers for AIService tests."""
+import threading
+import time
+from unittest import mock
+
+from django.test import override_settings
+
+from ai_integration import resilience
+from ai_integration.services import AIService
+
+
+class FakeProviders:
+    """
+    Replace AIService's provider calls with scripted ones. ``script`` maps a
+    provider name to a callable taking the messages, or to an exception to
+    raise; calls are recorded in ``calls`` and their routes in ``routes``.
+    """
+
+    def __init__(self, testcase, script, **settings):
+        self.script = script
+        self.calls = []
+        self.routes = []
+        self._lock = threading.Lock()
+        calls = {name: self._caller(name) for name in script}
+        options = {
+            'AI_PROVIDER': list(script)[0],
+            'AI_PROVIDER_CHAIN': list(script),
+            'AI_SINGLE_FLIGHT': False,
+            'AI_RATE_LIMITS': {},
+            'AI_HEDGE_AFTER': 0,
+            'AI_TASK_ROUTES': {},
+        }
+        options.update(settings)
+        overridden = override_settings(**options)
+        overridden.enable()
+        testcase.addCleanup(overridden.disable)
+        for patcher in (
+            mock.patch.dict(AIService.PROVIDER_CALLS, calls),
+            mock.patch.object(AIService, '_is_configured', lambda service, provider, route=None: True),
+            mock.patch.dict(resilience._breakers, clear=True),
+        ):
+            patcher.start()
+            testcase.addCleanup(patcher.stop)
+
+    def _caller(self, name):
+        def call(service, messages, system_prompt, route):
+            with self._lock:
+                self.calls.append(name)
+                self.routes.append(route)
+            action = self.script[name]
+            if isinstance(action, BaseException) or (isinstance(action, type) and issubclass(action, BaseException)):
+                raise action
+            return action(messages)
+        return call
+
+
+def slow(answer, seconds):
+    def call(messages):
+        time.sleep(seconds)
+        return answer
+    return call
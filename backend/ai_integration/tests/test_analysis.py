@@ -0,0 +1,68 @@
+import json
+
+from django.test import SimpleTestCase
+
+from ai_integration.services import AIService
+from .fakes import FakeProviders
+
+MESSAGES = [
+    {'sender': 'user', 'content': 'The deployment pipeline keeps failing on the database migration step.'},
+    {'sender': 'ai', 'content': 'You should run the migration locally first and check the logs.'},
+]
+
+
+def answer(payload):
+    return lambda messages: json.dumps(payload)
+
+
+class AnalysisFallbackTests(SimpleTestCase):
+    def test_provider_analysis_is_not_fallback(self):
+        FakeProviders(self, {'p': answer({
+            'summary': 'Migration failures.', 'key_topics': ['Migrations'],
+            'sentiment': 'negative', 'action_items': ['Run it locally'],
+        })})
+        analysis = AIService().analyze_conversation(MESSAGES)
+        self.assertEqual(analysis['summary'], 'Migration failures.')
+        self.assertFalse(analysis['fallback'])
+
+    def test_unparseable_answer_is_not_fallback(self):
+        FakeProviders(self, {'p': lambda messages: 'Just prose.'})
+        analysis = AIService().analyze_conversation(MESSAGES)
+        self.assertEqual(analysis['summary'], 'Just prose.')
+        self.assertFalse(analysis['fallback'])
+
+    def test_local_fallback_is_marked(self):
+        FakeProviders(self, {'p': RuntimeError('down')})
+        analysis = AIService().analyze_conversation(MESSAGES)
+        self.assertTrue(analysis['fallback'])
+        self.assertTrue(analysis['key_topics'])
+
+    def test_canned_fallback_is_marked_and_empty(self):
+        FakeProviders(self, {'p': RuntimeError('down')}, AI_LOCAL_ANALYSIS='off')
+        analysis = AIService().analyze_conversation(MESSAGES)
+        self.assertTrue(analysis['fallback'])
+        self.assertEqual(analysis['summary'], 'No summary available.')
+        self.assertEqual(analysis['key_topics'], [])
+
+    def test_packed_fallback_is_marked_per_conversation(self):
+        FakeProviders(self, {'p': RuntimeError('down')})
+        results = AIService().analyze_conversations([(1, MESSAGES), (2, MESSAGES)])
+        self.assertEqual(set(results), {1, 2})
+        self.assertTrue(all(result['fallback'] for result in results.values()))
+
+    def test_packed_answer(self):
+        FakeProviders(self, {'p': answer({
+            '1': {'summary': 'One.', 'key_topics': [], 'sentiment': 'neutral', 'action_items': []},
+            '2': {'summary': 'Two.', 'key_topics': [], 'sentiment': 'neutral', 'action_items': []},
+        })})
+        results = AIService().analyze_conversations([(1, MESSAGES), (2, MESSAGES)])
+        self.assertEqual(results[1]['summary'], 'One.')
+        self.assertEqual(results[2]['summary'], 'Two.')
+        self.assertFalse(results[1]['fallback'])
+
+    def test_local_first_mode_keeps_local_topics(self):
+        FakeProviders(self, {'p': answer({'summary': 'Short.', 'action_items': []})}, AI_LOCAL_ANALYSIS='first')
+        analysis = AIService().analyze_conversation(MESSAGES)
+        self.assertEqual(analysis['summary'], 'Short.')
+        self.assertEqual(analysis['sentiment'], 'negative')
+        self.assertTrue(analysis['key_topics'])
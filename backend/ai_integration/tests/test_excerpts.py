@@ -0,0 +1,115 @@
+import json
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, TestCase
+
+from ai_integration import excerpts
+from ai_integration.services import AIService
+from conversations.models import Conversation, Message
+from .fakes import FakeProviders
+
+
+def message(id, content, sender='user'):
+    return SimpleNamespace(id=id, content=content, sender=sender)
+
+
+MESSAGES = {
+    1: [
+        message(11, 'Our deployment pipeline fails when the database migration runs.'),
+        message(12, 'Roll back the migration and deploy again.', 'ai'),
+    ],
+    2: [
+        message(21, 'What should we cook for dinner tonight?'),
+        message(22, 'Pasta with tomatoes is quick.', 'ai'),
+    ],
+}
+
+
+class TokenizeTests(SimpleTestCase):
+    def test_stopwords_are_dropped_and_suffixes_stripped(self):
+        self.assertEqual(excerpts.tokenize('What are the failing deployments?'), ['fail', 'deployment'])
+
+    def test_short_messages_are_one_passage(self):
+        self.assertEqual(excerpts.split_passages('  Hello there.  '), ['Hello there.'])
+        self.assertEqual(excerpts.split_passages(''), [])
+
+    def test_long_messages_split_on_sentences(self):
+        text = ' '.join(f'Sentence number {i} is here.' for i in range(30))
+        passages = excerpts.split_passages(text, max_chars=100)
+        self.assertGreater(len(passages), 1)
+        self.assertTrue(all(len(passage) <= 100 for passage in passages))
+        self.assertEqual(' '.join(passages), text)
+
+
+class BM25Tests(SimpleTestCase):
+    def test_rarer_terms_weigh_more(self):
+        index = excerpts.BM25([['cat', 'dog'], ['cat', 'fish'], ['cat', 'bird']])
+        scores = index.scores(['cat', 'fish'])
+        self.assertEqual(scores.index(max(scores)), 1)
+        self.assertGreater(index.idf['fish'], index.idf['cat'])
+
+    def test_unknown_terms_score_zero(self):
+        self.assertEqual(excerpts.BM25([['cat']]).scores(['dog']), [0.0])
+        self.assertEqual(excerpts.BM25([]).scores(['dog']), [])
+
+    def test_shorter_documents_score_higher(self):
+        index = excerpts.BM25([['migration'], ['migration', 'a', 'b', 'c', 'd', 'e']])
+        short, long = index.scores(['migration'])
+        self.assertGreater(short, long)
+
+
+class ExcerptTests(SimpleTestCase):
+    def test_excerpts_are_verbatim_with_highlights(self):
+        results = excerpts.extract_excerpts('Why did the migration fail?', MESSAGES)
+        self.assertEqual([r['message_id'] for r in results], [11, 12])
+        first = results[0]
+        self.assertEqual(first['excerpt'], MESSAGES[1][0].content)
+        highlighted = [first['excerpt'][start:end] for start, end in first['highlights']]
+        self.assertEqual(highlighted, ['fails', 'migration'])
+
+    def test_limits_per_conversation(self):
+        results = excerpts.extract_excerpts('migration', MESSAGES, per_conversation=1)
+        self.assertEqual(len(results), 1)
+
+    def test_no_match(self):
+        self.assertEqual(excerpts.extract_excerpts('kubernetes', MESSAGES), [])
+        self.assertEqual(excerpts.extract_excerpts('the and of', MESSAGES), [])
+
+    def test_rank_conversations(self):
+        self.assertEqual(excerpts.rank_conversations('pasta dinner', MESSAGES), [2])
+
+
+class QueryPastConversationsTests(TestCase):
+    def setUp(self):
+        self.conversations = []
+        for texts in (['The migration broke the deploy.', 'Roll it back.'], ['Any dinner ideas?', 'Pasta.']):
+            conversation = Conversation.objects.create(title=texts[0], status='ended')
+            for text in texts:
+                Message.objects.create_and_count(conversation=conversation, sender='user', content=text)
+            self.conversations.append(conversation)
+
+    def query(self, reply, question='What broke the deploy?'):
+        FakeProviders(self, {'p': lambda messages: reply})
+        conversations = list(Conversation.objects.filter(pk__in=[c.pk for c in self.conversations]).order_by('pk'))
+        with self.assertNumQueries(len(conversations)):
+            return AIService().query_past_conversations(question, conversations)
+
+    def test_ids_as_strings_are_accepted(self):
+        first, second = self.conversations
+        result = self.query(json.dumps({
+            'answer': 'A migration.', 'relevant_conversation_ids': [str(first.pk), 'x', None, 999999],
+        }))
+        self.assertEqual(result['answer'], 'A migration.')
+        self.assertEqual([conv['id'] for conv in result['relevant_conversations']], [first.pk])
+        self.assertEqual({excerpt['conversation_id'] for excerpt in result['excerpts']}, {first.pk})
+
+    def test_duplicate_ids_are_listed_once(self):
+        first, _ = self.conversations
+        result = self.query(json.dumps({'answer': 'A.', 'relevant_conversation_ids': [first.pk, first.pk]}))
+        self.assertEqual(len(result['relevant_conversations']), 1)
+
+    def test_unparseable_answer_ranks_locally(self):
+        result = self.query('Not JSON at all', question='dinner pasta')
+        self.assertEqual(result['answer'], 'Not JSON at all')
+        self.assertEqual([conv['id'] for conv in result['relevant_conversations']], [self.conversations[1].pk])
+        self.assertEqual(result['excerpts'][0]['excerpt'], 'Pasta.')
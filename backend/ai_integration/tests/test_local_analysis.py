@@ -0,0 +1,176 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ai_integration import local_analysis
+from ai_integration.services import AIService
+from .fakes import FakeProviders
+
+
+def conversation(*texts):
+    return [{'sender': 'user' if i % 2 == 0 else 'ai', 'content': text} for i, text in enumerate(texts)]
+
+
+class CandidatePhraseTests(SimpleTestCase):
+    def test_phrases_break_on_stopwords_and_punctuation(self):
+        self.assertEqual(
+            local_analysis.candidate_phrases('The database migration failed, then the deploy script hung.'),
+            [('database', 'migration', 'failed'), ('deploy', 'script', 'hung')]
+        )
+
+    def test_phrases_are_capped(self):
+        phrases = local_analysis.candidate_phrases('alpha bravo charlie delta echo')
+        self.assertEqual(phrases, [('alpha', 'bravo', 'charlie'), ('delta', 'echo')])
+
+
+class KeywordExtractorTests(SimpleTestCase):
+    def test_words_shared_by_every_document_weigh_less(self):
+        extractor = local_analysis.KeywordExtractor(
+            ['python, error', 'python, kubernetes', 'python, error'], groups=[1, 2, 1]
+        )
+        self.assertEqual(extractor.keywords(2, limit=1), ['kubernetes'])
+        self.assertEqual(extractor.keywords(1, limit=1), ['error'])
+
+    def test_keywords_do_not_repeat_a_phrase(self):
+        extractor = local_analysis.KeywordExtractor(['database migration', 'migration', 'database'])
+        self.assertEqual(extractor.keywords(), ['database migration'])
+
+    def test_phrases_of_a_message_are_capped(self):
+        text = ', '.join(f'topic{chr(97 + i // 26)}{chr(97 + i % 26)}' for i in range(local_analysis.MAX_PHRASES + 5))
+        extractor = local_analysis.KeywordExtractor([text])
+        self.assertEqual(len(extractor.phrases[0]), local_analysis.MAX_PHRASES)
+
+    def test_empty_corpus(self):
+        self.assertEqual(local_analysis.KeywordExtractor([]).keywords(), [])
+        self.assertEqual(local_analysis.KeywordExtractor(['the and of']).keywords(), [])
+
+
+class SentimentTests(SimpleTestCase):
+    def label(self, *texts):
+        return local_analysis.sentiment_label(local_analysis.score_sentiment(texts))
+
+    def test_lexicon(self):
+        self.assertEqual(self.label('This is great, thanks, it works perfectly and I love it'), 'positive')
+        self.assertEqual(self.label('The build is broken and the tests keep failing with errors'), 'negative')
+        self.assertEqual(self.label('The meeting is on Tuesday'), 'neutral')
+
+    def test_negation_flips_and_dampens(self):
+        self.assertLess(local_analysis.score_sentiment(['not good']), 0)
+        self.assertGreater(local_analysis.score_sentiment(["it doesn't crash"]), 0)
+        self.assertLess(
+            abs(local_analysis.score_sentiment(['not good'])), abs(local_analysis.score_sentiment(['good']))
+        )
+
+    def test_intensifiers(self):
+        self.assertGreater(local_analysis.score_sentiment(['very good']), local_analysis.score_sentiment(['good']))
+
+    def test_score_is_bounded(self):
+        self.assertLess(local_analysis.score_sentiment(['great ' * 200]), 1)
+
+
+class AnalyzeMessagesTests(SimpleTestCase):
+    def test_fields(self):
+        messages = conversation(
+            'Our deployment pipeline fails on the database migration. It is frustrating.',
+            "You should roll back the database migration. I'll write the fix tomorrow.",
+        )
+        analysis = local_analysis.analyze_messages([(7, messages)])[7]
+        self.assertEqual(set(analysis), {'summary', 'key_topics', 'sentiment', 'action_items'})
+        self.assertIn('Database migration', analysis['key_topics'])
+        self.assertEqual(analysis['sentiment'], 'negative')
+        self.assertEqual(
+            analysis['action_items'], ['You should roll back the database migration.', "I'll write the fix tomorrow."]
+        )
+        self.assertIn('database migration', analysis['summary'])
+
+    def test_sentiment_comes_from_the_user(self):
+        messages = conversation('The upload is broken again.', 'Great question, happy to help, thanks!')
+        self.assertEqual(local_analysis.analyze_messages([(1, messages)])[1]['sentiment'], 'negative')
+
+    def test_conversations_are_analysed_separately(self):
+        results = local_analysis.analyze_messages([
+            (1, conversation('Kubernetes pods restart constantly.')),
+            (2, conversation('Pasta recipes for dinner.')),
+        ])
+        self.assertIn('Kubernetes pods', ' '.join(results[1]['key_topics']))
+        self.assertNotIn('Kubernetes pods', ' '.join(results[2]['key_topics']))
+
+    def test_only_the_first_messages_are_analysed(self):
+        messages = conversation('Kubernetes pods keep restarting.', 'Database migration failed.')
+        with mock.patch.object(local_analysis, 'MAX_MESSAGES', 1):
+            analysis = local_analysis.analyze_messages([(1, messages)])[1]
+        self.assertNotIn('Database', ' '.join(analysis['key_topics']))
+        self.assertNotIn('Database', analysis['summary'])
+
+    def test_empty_conversation(self):
+        analysis = local_analysis.analyze_messages([(1, [])])[1]
+        self.assertEqual(analysis['summary'], 'No summary available.')
+        self.assertEqual(analysis['key_topics'], [])
+        self.assertEqual(analysis['sentiment'], 'neutral')
+
+    def test_summary_is_capped(self):
+        sentence = 'Database migration ' + 'detail ' * 200 + 'matters.'
+        summary = local_analysis.extract_summary(conversation(sentence), ['database migration'])
+        self.assertEqual(len(summary), local_analysis.SUMMARY_CHARS)
+        self.assertTrue(summary.endswith('...'))
+
+
+class ExtractiveTitleTests(SimpleTestCase):
+    def test_title_from_key_phrases(self):
+        title = local_analysis.extractive_title('How do I fix the database migration that keeps failing?')
+        self.assertIn('Database Migration', title)
+        self.assertLessEqual(len(title.split()), local_analysis.TITLE_WORDS)
+
+    def test_title_without_key_phrases(self):
+        self.assertEqual(local_analysis.extractive_title('Hi, how are you?'), 'Hi, How Are You?')
+        self.assertEqual(local_analysis.extractive_title(''), 'New Conversation')
+
+
+class LocalAnalysisModeTests(SimpleTestCase):
+    FIRST_MESSAGE = 'How do I fix the database migration that keeps failing?'
+
+    def test_first_mode_skips_the_provider_for_titles(self):
+        providers = FakeProviders(self, {'p': lambda messages: 'LLM Title'}, AI_LOCAL_ANALYSIS='first')
+        self.assertEqual(AIService().generate_title(self.FIRST_MESSAGE), local_analysis.extractive_title(self.FIRST_MESSAGE))
+        self.assertEqual(providers.calls, [])
+
+    def test_first_mode_asks_the_provider_only_for_the_other_fields(self):
+        prompts = []
+
+        def reply(messages):
+            prompts.append(messages[-1]['content'])
+            return '{"summary": "S.", "action_items": []}'
+
+        FakeProviders(self, {'p': reply}, AI_LOCAL_ANALYSIS='first')
+        AIService().analyze_conversation(conversation(self.FIRST_MESSAGE))
+        self.assertIn('summary', prompts[0])
+        self.assertNotIn('key_topics', prompts[0])
+        self.assertNotIn('sentiment', prompts[0])
+
+    def test_fallback_mode_uses_the_provider_then_the_local_title(self):
+        providers = FakeProviders(self, {'p': lambda messages: '"LLM Title"'})
+        self.assertEqual(AIService().generate_title(self.FIRST_MESSAGE), 'LLM Title')
+        providers.script['p'] = RuntimeError('down')
+        self.assertEqual(AIService().generate_title(self.FIRST_MESSAGE), local_analysis.extractive_title(self.FIRST_MESSAGE))
+
+    def test_fallback_mode_analyzes_locally_only_without_a_provider(self):
+        messages = conversation(self.FIRST_MESSAGE, 'Run the migration again.')
+        FakeProviders(self, {'p': lambda messages: '{"summary": "S.", "key_topics": [], "sentiment": "neutral"}'})
+        with mock.patch('ai_integration.services.analyze_messages') as analyze_messages:
+            self.assertEqual(AIService().analyze_conversation(messages)['summary'], 'S.')
+            AIService().analyze_conversations([(1, messages), (2, messages)])
+        analyze_messages.assert_not_called()
+
+    def test_packed_fallback_analyzes_locally_once(self):
+        messages = conversation(self.FIRST_MESSAGE, 'Run the migration again.')
+        FakeProviders(self, {'p': RuntimeError('down')})
+        with mock.patch('ai_integration.services.analyze_messages', wraps=local_analysis.analyze_messages) as analyze:
+            results = AIService().analyze_conversations([(1, messages), (2, messages)])
+        self.assertTrue(results[1]['fallback'])
+        self.assertEqual(results[1]['key_topics'], results[2]['key_topics'])
+        analyze.assert_called_once()
+
+    def test_off_mode_uses_the_canned_fallback(self):
+        FakeProviders(self, {'p': RuntimeError('down')}, AI_LOCAL_ANALYSIS='off')
+        title = AIService().generate_title(self.FIRST_MESSAGE)
+        self.assertNotEqual(title, local_analysis.extractive_title(self.FIRST_MESSAGE))
@@ -0,0 +1,116 @@
+import json
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from ai_integration.exceptions import ProviderRateLimited
+from ai_integration.ratelimit import ProviderLimiter, estimate_tokens
+
+
+class ProviderLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(AI_RATE_LIMIT_DIR=self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def limiter(self, **options):
+        return ProviderLimiter('test', **options)
+
+    def state(self, limiter):
+        with open(limiter.state_path) as fh:
+            return json.load(fh)
+
+    def wait_for_waiters(self, limiter, count):
+        for _ in range(200):
+            if len(self.state(limiter)['waiting']) >= count:
+                return
+            time.sleep(0.01)
+        self.fail(f'expected {count} waiters')
+
+    def test_concurrency_cap_times_out(self):
+        limiter = self.limiter(max_concurrent=1, queue_timeout=0.1)
+        slot = limiter.acquire(10)
+        with self.assertRaisesMessage(ProviderRateLimited, 'timed out'):
+            limiter.acquire(10)
+        limiter.release(slot)
+        limiter.release(limiter.acquire(10))
+        self.assertEqual(self.state(limiter)['waiting'], [])
+
+    def test_caller_timeout_shortens_the_wait(self):
+        limiter = self.limiter(max_concurrent=1, queue_timeout=10)
+        limiter.acquire(10)
+        start = time.monotonic()
+        with self.assertRaises(ProviderRateLimited):
+            limiter.acquire(10, timeout=0.1)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_full_queue_rejects_at_once(self):
+        limiter = self.limiter(max_concurrent=1, queue_size=0, queue_timeout=5)
+        limiter.acquire(10)
+        with self.assertRaisesMessage(ProviderRateLimited, 'queue is full'):
+            limiter.acquire(10)
+
+    def test_requests_per_minute(self):
+        limiter = self.limiter(requests_per_minute=2, queue_timeout=0.1)
+        limiter.release(limiter.acquire(10))
+        limiter.release(limiter.acquire(10))
+        with self.assertRaises(ProviderRateLimited):
+            limiter.acquire(10)
+
+    def test_tokens_per_minute_lets_oversized_call_through_alone(self):
+        limiter = self.limiter(tokens_per_minute=100, queue_timeout=0.1)
+        limiter.release(limiter.acquire(500))
+        with self.assertRaises(ProviderRateLimited):
+            limiter.acquire(1)
+
+    def test_back_off_blocks_admissions(self):
+        limiter = self.limiter(queue_timeout=0.1)
+        limiter.back_off(5)
+        with self.assertRaises(ProviderRateLimited):
+            limiter.acquire(1)
+
+    def test_waiters_are_admitted_in_arrival_order(self):
+        limiter = self.limiter(max_concurrent=1, queue_timeout=5)
+        held = limiter.acquire(1)
+        admitted = []
+
+        def waiter(name):
+            slot = limiter.acquire(1)
+            admitted.append(name)
+            limiter.release(slot)
+
+        threads = []
+        for number, name in enumerate('abcd', 1):
+            thread = threading.Thread(target=waiter, args=(name,))
+            thread.start()
+            threads.append(thread)
+            self.wait_for_waiters(limiter, number)
+        limiter.release(held)
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(admitted, list('abcd'))
+
+    def test_new_caller_queues_behind_waiters(self):
+        limiter = self.limiter(max_concurrent=1, queue_timeout=0.2)
+        limiter.acquire(1)
+        with limiter._locked_state() as state:
+            state['in_flight'] = []
+            state['waiting'].append([1, 'earlier', time.time() + 60])
+        with self.assertRaises(ProviderRateLimited):
+            limiter.acquire(1)
+
+    def test_expired_and_dead_waiters_are_dropped(self):
+        limiter = self.limiter(max_concurrent=1, queue_timeout=0.5)
+        with limiter._locked_state() as state:
+            state['waiting'].append([1, 'expired', time.time() - 1])
+            state['waiting'].append([2 ** 22 + 1, 'dead', time.time() + 60])
+        limiter.release(limiter.acquire(1))
+        self.assertEqual(self.state(limiter)['waiting'], [])
+
+    def test_estimate_tokens(self):
+        messages = [{'role': 'user', 'content': 'x' * 400}]
+        self.assertEqual(estimate_tokens(messages, 'y' * 40, 100), 210)
@@ -0,0 +1,135 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ai_integration import resilience
+from ai_integration.exceptions import ProviderNotConfigured
+from ai_integration.resilience import CircuitBreaker
+from ai_integration.services import AIService
+from .fakes import FakeProviders, slow
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('ai_integration.resilience.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=30)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_lets_one_probe_through(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_probe_success_closes(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 30
+        self.breaker.allow_request()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_probe_failure_reopens(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 30
+        self.breaker.allow_request()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.now += 29
+        self.assertFalse(self.breaker.allow_request())
+        self.now += 1
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_inconclusive_probe_releases_half_open(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 30
+        self.breaker.allow_request()
+        self.breaker.record_inconclusive()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertTrue(self.breaker.allow_request())
+
+
+class FailoverTests(SimpleTestCase):
+    def test_falls_over_to_next_provider(self):
+        fake = FakeProviders(self, {'first': RuntimeError('boom'), 'second': lambda messages: 'answer'})
+        self.assertEqual(AIService()._call_llm([{'role': 'user', 'content': 'hi'}]), 'answer')
+        self.assertEqual(fake.calls, ['first', 'second'])
+
+    def test_open_circuit_skips_provider(self):
+        fake = FakeProviders(
+            self, {'first': RuntimeError('boom'), 'second': lambda messages: 'answer'},
+            AI_CIRCUIT_FAILURE_THRESHOLD=2,
+        )
+        for _ in range(3):
+            AIService()._call_llm([{'role': 'user', 'content': 'hi'}])
+        self.assertEqual(fake.calls, ['first', 'second', 'first', 'second', 'second'])
+
+    def test_unconfigured_provider_leaves_an_open_circuit_open(self):
+        fake = FakeProviders(
+            self, {'first': RuntimeError('boom'), 'second': lambda messages: 'answer'},
+            AI_CIRCUIT_FAILURE_THRESHOLD=1, AI_CIRCUIT_RESET_TIMEOUT=0,
+        )
+        AIService()._call_llm([{'role': 'user', 'content': 'hi'}])
+        breaker = resilience.get_circuit_breaker('first')
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        fake.script['first'] = ProviderNotConfigured('first', 'no key')
+        self.assertEqual(AIService()._call_llm([{'role': 'user', 'content': 'hi'}]), 'answer')
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.failures, 1)
+
+    def test_every_provider_failing_uses_fallback(self):
+        FakeProviders(self, {'first': RuntimeError('boom'), 'second': RuntimeError('boom')})
+        answer = AIService()._call_llm([{'role': 'user', 'content': 'hi'}], fallback=lambda: 'local')
+        self.assertEqual(answer, 'local')
+
+
+class HedgingTests(SimpleTestCase):
+    def test_slow_provider_is_hedged(self):
+        fake = FakeProviders(
+            self, {'first': slow('slow answer', 0.5), 'second': lambda messages: 'fast answer'},
+            AI_HEDGE_AFTER=0.05,
+        )
+        start = time.monotonic()
+        answer = AIService()._call_llm([{'role': 'user', 'content': 'hi'}])
+        self.assertEqual(answer, 'fast answer')
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(fake.calls, ['first', 'second'])
+
+    def test_fast_provider_is_not_hedged(self):
+        fake = FakeProviders(
+            self, {'first': lambda messages: 'answer', 'second': lambda messages: 'other'},
+            AI_HEDGE_AFTER=0.5,
+        )
+        self.assertEqual(AIService()._call_llm([{'role': 'user', 'content': 'hi'}]), 'answer')
+        self.assertEqual(fake.calls, ['first'])
+
+    def test_failed_hedge_waits_for_first_call(self):
+        FakeProviders(
+            self, {'first': slow('slow answer', 0.2), 'second': RuntimeError('boom')},
+            AI_HEDGE_AFTER=0.05,
+        )
+        self.assertEqual(AIService()._call_llm([{'role': 'user', 'content': 'hi'}]), 'slow answer')
@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from ai_integration.routing import resolve_route
+from ai_integration.services import AIService
+from .fakes import FakeProviders
+
+CHAIN = ['openai', 'anthropic', 'lm_studio']
+MODELS = {'openai': 'gpt-3.5-turbo', 'anthropic': 'claude-3-sonnet-20240229', 'lm_studio': 'local-model'}
+
+
+class ResolveRouteTests(SimpleTestCase):
+    @override_settings(AI_TASK_ROUTES={})
+    def test_defaults(self):
+        route = resolve_route('title', CHAIN, MODELS)
+        self.assertEqual(route.providers, tuple(CHAIN))
+        self.assertEqual(route.model('openai'), 'gpt-3.5-turbo')
+        self.assertEqual((route.max_tokens, route.temperature), (60, 0.3))
+        self.assertEqual(resolve_route('chat', CHAIN, MODELS).max_tokens, 1000)
+
+    @override_settings(AI_TASK_ROUTES={'title': {'provider': 'lm_studio', 'model': 'qwen', 'max_tokens': 30}})
+    def test_provider_goes_first_and_keeps_the_chain_as_fallback(self):
+        route = resolve_route('title', CHAIN, MODELS)
+        self.assertEqual(route.providers, ('lm_studio', 'openai', 'anthropic'))
+        self.assertEqual(route.model('lm_studio'), 'qwen')
+        self.assertEqual(route.max_tokens, 30)
+        self.assertEqual(route.temperature, 0.3)
+        # Other tasks are unaffected.
+        self.assertEqual(resolve_route('chat', CHAIN, MODELS).providers, tuple(CHAIN))
+
+    @override_settings(AI_TASK_ROUTES={'analysis': {
+        'providers': ['anthropic'], 'models': {'anthropic': 'claude-3-haiku'}, 'temperature': 0,
+    }})
+    def test_providers_replace_the_chain(self):
+        route = resolve_route('analysis', CHAIN, MODELS)
+        self.assertEqual(route.providers, ('anthropic',))
+        self.assertEqual(route.model('anthropic'), 'claude-3-haiku')
+        self.assertEqual(route.temperature, 0.0)
+
+    def test_unknown_task(self):
+        with self.assertRaises(ValueError):
+            resolve_route('poetry', CHAIN, MODELS)
+
+
+class TaskDispatchTests(SimpleTestCase):
+    def test_each_task_uses_its_route(self):
+        providers = FakeProviders(
+            self, {'openai': lambda messages: 'chat answer', 'lm_studio': lambda messages: 'Short Title'},
+            AI_TASK_ROUTES={'title': {'provider': 'lm_studio', 'model': 'qwen', 'max_tokens': 30}},
+            AI_LOCAL_ANALYSIS='fallback',
+        )
+        service = AIService()
+        self.assertEqual(service.chat(1, 'hello', history=[]), 'chat answer')
+        self.assertEqual(service.generate_title('hello there'), 'Short Title')
+
+        self.assertEqual(providers.calls, ['openai', 'lm_studio'])
+        chat_route, title_route = providers.routes
+        self.assertEqual((chat_route.task, chat_route.max_tokens), ('chat', 1000))
+        self.assertEqual((title_route.task, title_route.model('lm_studio'), title_route.max_tokens), ('title', 'qwen', 30))
+
+    def test_routed_provider_fails_over_to_the_chain(self):
+        providers = FakeProviders(
+            self, {'openai': lambda messages: 'From OpenAI', 'lm_studio': RuntimeError('offline')},
+            AI_TASK_ROUTES={'title': {'provider': 'lm_studio', 'model': 'qwen'}},
+        )
+        self.assertEqual(AIService().generate_title('hello there'), 'From OpenAI')
+        self.assertEqual(providers.calls, ['lm_studio', 'openai'])
+
+    @override_settings(AI_TASK_ROUTES={'title': {'provider': 'lm_studio', 'model': 'qwen', 'max_tokens': 30,
+                                                 'temperature': 0.1}},
+                       LM_STUDIO_URL='http://lm.test/v1')
+    def test_lm_studio_request_carries_the_route(self):
+        response = mock.Mock()
+        response.json.return_value = {'choices': [{'message': {'content': 'T'}}]}
+        service = AIService()
+        with mock.patch('ai_integration.services.requests.post', return_value=response) as post:
+            self.assertEqual(service._call_lm_studio([{'role': 'user', 'content': 'x'}], 'sys', service._route('title')), 'T')
+        payload = post.call_args.kwargs['json']
+        self.assertEqual(post.call_args.args[0], 'http://lm.test/v1/chat/completions')
+        self.assertEqual((payload['model'], payload['max_tokens'], payload['temperature']), ('qwen', 30, 0.1))
+        self.assertEqual(payload['messages'][0], {'role': 'system', 'content': 'sys'})
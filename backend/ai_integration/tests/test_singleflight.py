@@ -0,0 +1,145 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import timedelta
+
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from ai_integration.models import LLMFlight
+from ai_integration.singleflight import SingleFlight, fingerprint
+
+
+def closing_connections(fn):
+    def run(*args):
+        try:
+            return fn(*args)
+        finally:
+            connections.close_all()
+    return run
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_stable_and_order_independent_for_dicts(self):
+        self.assertEqual(fingerprint({'a': 1, 'b': 2}), fingerprint({'b': 2, 'a': 1}))
+        self.assertNotEqual(fingerprint('x', [1]), fingerprint('x', [2]))
+
+
+@override_settings(AI_SINGLE_FLIGHT_ACROSS_PROCESSES=False)
+class InProcessTests(SimpleTestCase):
+    def test_followers_share_the_leader_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return 'answer'
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            leader = executor.submit(flight.do, 'key', fn)
+            while 'key' not in flight._calls:
+                time.sleep(0.001)
+            followers = [executor.submit(flight.do, 'key', fn) for _ in range(3)]
+            release.set()
+            self.assertEqual(leader.result(), ('answer', False))
+            self.assertEqual([f.result() for f in followers], [('answer', True)] * 3)
+        self.assertEqual(len(calls), 1)
+
+    def test_leader_error_reaches_followers(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fn():
+            release.wait(5)
+            raise ValueError('boom')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flight.do, 'key', fn)
+            while 'key' not in flight._calls:
+                time.sleep(0.001)
+            follower = executor.submit(flight.do, 'key', fn)
+            release.set()
+            with self.assertRaises(ValueError):
+                leader.result()
+            with self.assertRaises(ValueError):
+                follower.result()
+        self.assertEqual(flight._calls, {})
+
+    def test_follower_timeout(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(flight.do, 'key', lambda: release.wait(5) and 'answer')
+            while 'key' not in flight._calls:
+                time.sleep(0.001)
+            with self.assertRaises(FutureTimeoutError):
+                flight.do('key', lambda: 'other', timeout=0.05)
+            release.set()
+
+
+@override_settings(AI_SINGLE_FLIGHT_TIMEOUT=60, AI_SINGLE_FLIGHT_LINGER=5)
+class AcrossProcessesTests(TransactionTestCase):
+    def test_uncontended_leader_records_result(self):
+        self.assertEqual(SingleFlight().do('key', lambda: 'answer'), ('answer', False))
+        flight = LLMFlight.objects.get(key='key')
+        self.assertEqual(flight.result, 'answer')
+        self.assertIsNotNone(flight.completed_at)
+
+    def test_waits_for_leader_in_another_process(self):
+        LLMFlight.objects.create(key='key')
+
+        @closing_connections
+        def other_leader():
+            time.sleep(0.2)
+            LLMFlight.objects.filter(key='key').update(result='theirs', completed_at=timezone.now())
+
+        thread = threading.Thread(target=other_leader)
+        thread.start()
+        result = SingleFlight().do('key', lambda: 'ours')
+        thread.join()
+        self.assertEqual(result, ('theirs', True))
+
+    def test_recent_result_is_shared(self):
+        LLMFlight.objects.create(key='key', result='theirs', completed_at=timezone.now())
+        self.assertEqual(SingleFlight().do('key', lambda: 'ours'), ('theirs', True))
+
+    def test_expired_result_is_replaced(self):
+        LLMFlight.objects.create(key='key', result='old', completed_at=timezone.now() - timedelta(seconds=10))
+        self.assertEqual(SingleFlight().do('key', lambda: 'new'), ('new', False))
+        self.assertEqual(LLMFlight.objects.get(key='key').result, 'new')
+
+    def test_dead_leader_row_is_taken_over(self):
+        LLMFlight.objects.create(key='key')
+        LLMFlight.objects.filter(key='key').update(created_at=timezone.now() - timedelta(seconds=120))
+
+        self.assertEqual(SingleFlight().do('key', lambda: 'answer'), ('answer', False))
+        flight = LLMFlight.objects.get(key='key')
+        self.assertEqual(flight.result, 'answer')
+        self.assertGreater(flight.created_at, timezone.now() - timedelta(seconds=60))
+
+    def test_slow_leader_does_not_overwrite_successor(self):
+        def fn():
+            # Another process takes the row over while this call runs.
+            LLMFlight.objects.filter(key='key').delete()
+            LLMFlight.objects.create(key='key')
+            return 'late'
+
+        self.assertEqual(SingleFlight().do('key', fn), ('late', False))
+        self.assertIsNone(LLMFlight.objects.get(key='key').completed_at)
+
+    def test_failed_call_releases_row(self):
+        def fn():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            SingleFlight().do('key', fn)
+        self.assertFalse(LLMFlight.objects.filter(key='key').exists())
+
+    @override_settings(AI_SINGLE_FLIGHT_ACROSS_PROCESSES=False)
+    def test_in_process_only_skips_table(self):
+        self.assertEqual(SingleFlight().do('key', lambda: 'answer'), ('answer', False))
+        self.assertFalse(LLMFlight.objects.exists())
@@ -0,0 +1,83 @@
+"""
+Database router sending reads of read-only requests to a replica.
+
+ReplicaRoutingMiddleware enables replica reads for safe (GET/HEAD/OPTIONS)
+requests and for views that declare ``read_replica = True``. Everything else,
+and every read that follows a write in the same request, goes to the primary.
+After a write the client is pinned to the primary for
+DATABASE_REPLICA_STICKY_SECONDS through a cookie, so it reads its own writes
+even when the replica lags behind. Writes to BOOKKEEPING_MODELS don't count:
+clients never read those rows back, and they are always read from the primary.
+"""
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_DB_ALIAS = 'replica'
+
+# Coordination rows written on the side of read-only work: in-flight LLM
+# calls (ai_integration.singleflight), idempotency keys and the conditional
+# GET change marker.
+BOOKKEEPING_MODELS = frozenset({
+    'ai_integration.llmflight', 'conversations.idempotencykey', 'conversations.changemarker',
+})
+
+_state = threading.local()
+
+
+def replica_configured() -> bool:
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def begin_request():
+    """Start routing for a request handled by the current thread: primary only."""
+    _state.use_replica = False
+    _state.wrote = False
+
+
+def allow_replica_reads():
+    """Let the current request read from the replica until it writes."""
+    _state.use_replica = True
+
+
+def is_bookkeeping(model) -> bool:
+    return model is not None and model._meta.label_lower in BOOKKEEPING_MODELS
+
+
+def end_request() -> bool:
+    """Stop replica routing; returns whether the request wrote to the database."""
+    wrote = getattr(_state, 'wrote', False)
+    _state.use_replica = False
+    _state.wrote = False
+    return wrote
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica only for replica-enabled requests that have not
+    written yet (bookkeeping writes aside).
+    """
+
+    def db_for_read(self, model, **hints):
+        if not getattr(_state, 'use_replica', False) or getattr(_state, 'wrote', False):
+            return DEFAULT_DB_ALIAS
+        # Coordination between workers must not see a lagging copy.
+        if is_bookkeeping(model):
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction must see the transaction's own changes.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if not is_bookkeeping(model):
+            _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,361 @@
+"""
+Lightweight Prometheus metrics collectors.
+
+Every worker process keeps its samples in memory and periodically flushes a
+snapshot to its own file in METRICS_DIR. The /api/metrics view merges the
+snapshots of all workers, so the exposition covers the whole deployment and
+recording a sample never costs more than a dict update under a lock.
+"""
+import atexit
+import json
+import math
+import os
+import threading
+import time
+import weakref
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Registry:
+    """Holds the metrics of this process and merges snapshots across processes."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._samplers = []
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_sampler(self, sampler):
+        """Call ``sampler()`` before every snapshot, e.g. to set gauges of current state."""
+        self._samplers.append(sampler)
+
+    def snapshot(self) -> Dict:
+        for sampler in self._samplers:
+            try:
+                sampler()
+            except Exception:
+                # Metrics must never break request handling.
+                pass
+        with self._lock:
+            return {
+                name: {
+                    'kind': metric.kind,
+                    'help': metric.documentation,
+                    'labelnames': list(metric.labelnames),
+                    'buckets': list(getattr(metric, 'buckets', ())),
+                    'values': [[list(labels), value] for labels, value in metric.values.items()],
+                }
+                for name, metric in self._metrics.items()
+            }
+
+    def _path_for(self, pid: int) -> str:
+        return os.path.join(settings.METRICS_DIR, f'metrics_{pid}.json')
+
+    def flush(self):
+        """Write this process's snapshot to METRICS_DIR (atomically)."""
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return
+        try:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            path = self._path_for(os.getpid())
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as fh:
+                json.dump({'pid': os.getpid(), 'metrics': self.snapshot()}, fh)
+            os.replace(tmp_path, path)
+            self._last_flush = time.monotonic()
+        except OSError:
+            # Metrics must never break request handling.
+            pass
+
+    def maybe_flush(self):
+        """Flush at most once per METRICS_FLUSH_INTERVAL seconds."""
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0)
+        if time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def _load_snapshots(self) -> Iterable[Tuple[Dict, bool]]:
+        """Yield (metrics, is_live) for every process snapshot on disk."""
+        own_pid = os.getpid()
+        yield self.snapshot(), True
+        try:
+            names = os.listdir(settings.METRICS_DIR)
+        except OSError:
+            return
+        for name in names:
+            if not (name.startswith('metrics_') and name.endswith('.json')):
+                continue
+            try:
+                pid = int(name[len('metrics_'):-len('.json')])
+            except ValueError:
+                continue
+            if pid == own_pid:
+                continue
+            try:
+                with open(os.path.join(settings.METRICS_DIR, name)) as fh:
+                    data = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            yield data.get('metrics', {}), _pid_alive(pid)
+
+    def collect(self) -> Dict:
+        """Merge the snapshots of all processes into a single view."""
+        merged = {}
+        for snapshot, is_live in self._load_snapshots():
+            for name, metric in snapshot.items():
+                # Gauges describe current state, so dead workers don't count.
+                if metric['kind'] == 'gauge' and not is_live:
+                    continue
+                target = merged.setdefault(name, {
+                    'kind': metric['kind'],
+                    'help': metric['help'],
+                    'labelnames': metric['labelnames'],
+                    'buckets': metric['buckets'],
+                    'values': {},
+                })
+                for labels, value in metric['values']:
+                    key = tuple(labels)
+                    if key not in target['values']:
+                        target['values'][key] = value
+                    elif metric['kind'] == 'histogram':
+                        target['values'][key] = [a + b for a, b in zip(target['values'][key], value)]
+                    else:
+                        target['values'][key] += value
+        return merged
+
+    def expose(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            labelnames = metric['labelnames']
+            for labels, value in sorted(metric['values'].items()):
+                pairs = list(zip(labelnames, labels))
+                if metric['kind'] != 'histogram':
+                    lines.append(f'{name}{_format_labels(pairs)} {_format_value(value)}')
+                    continue
+                cumulative = 0
+                bucket_counts = value[:-2]
+                for bound, count in zip(list(metric['buckets']) + [math.inf], bucket_counts):
+                    cumulative += count
+                    le = '+Inf' if bound == math.inf else _format_value(bound)
+                    lines.append(f'{name}_bucket{_format_labels(pairs + [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(pairs)} {_format_value(value[-2])}')
+                lines.append(f'{name}_count{_format_labels(pairs)} {_format_value(value[-1])}')
+        return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with REGISTRY._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. in-flight calls."""
+    kind = 'gauge'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with REGISTRY._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with REGISTRY._lock:
+            self.values[key] = value
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with REGISTRY._lock:
+            # Per-bucket counts (the last slot is +Inf), then sum and count.
+            sample = self.values.get(key)
+            if sample is None:
+                sample = [0] * (len(self.buckets) + 1) + [0.0, 0]
+                self.values[key] = sample
+            sample[index] += 1
+            sample[-2] += value
+            sample[-1] += 1
+
+
+# HTTP
+HTTP_REQUEST_DURATION = Histogram(
+    'chatportal_http_request_duration_seconds',
+    'HTTP request latency by view/action.',
+    ('view', 'method', 'status'),
+)
+
+# Database
+DB_QUERIES_PER_REQUEST = Histogram(
+    'chatportal_db_queries_per_request',
+    'Number of database queries executed per HTTP request.',
+    ('view',),
+    buckets=COUNT_BUCKETS,
+)
+DB_QUERY_SECONDS_PER_REQUEST = Histogram(
+    'chatportal_db_query_duration_seconds_per_request',
+    'Total time spent in database queries per HTTP request.',
+    ('view',),
+)
+
+# LLM providers
+LLM_REQUEST_DURATION = Histogram(
+    'chatportal_llm_request_duration_seconds',
+    'Latency of LLM provider calls.',
+    ('provider', 'model'),
+)
+LLM_ERRORS = Counter(
+    'chatportal_llm_errors_total',
+    'LLM provider calls that failed.',
+    ('provider', 'model'),
+)
+LLM_FALLBACKS = Counter(
+    'chatportal_llm_fallbacks_total',
+    'LLM calls answered with the canned fallback response.',
+    ('provider', 'model'),
+)
+LLM_CACHE_HITS = Counter(
+    'chatportal_llm_cache_hits_total',
+    'LLM calls answered without contacting the provider.',
+    ('provider', 'model'),
+)
+LLM_IN_FLIGHT = Gauge(
+    'chatportal_llm_in_flight',
+    'LLM provider calls currently in progress.',
+    ('provider',),
+)
+LLM_CIRCUIT_OPEN = Gauge(
+    'chatportal_llm_circuit_open',
+    'Whether the circuit breaker of a provider is open (1) or closed (0).',
+    ('provider',),
+)
+LLM_RATE_LIMITED = Counter(
+    'chatportal_llm_rate_limited_total',
+    'LLM calls rejected by the outbound rate limiter.',
+    ('provider', 'reason'),
+)
+LLM_RATE_LIMIT_WAIT = Histogram(
+    'chatportal_llm_rate_limit_wait_seconds',
+    'Time LLM calls spent queued in the outbound rate limiter.',
+    ('provider',),
+)
+
+# Conversation context cache
+CONTEXT_CACHE_LOOKUPS = Counter(
+    'chatportal_context_cache_lookups_total',
+    'Conversation context lookups by where they were answered (local, shared or database).',
+    ('source',),
+)
+
+# Background work
+BACKGROUND_QUEUE_DEPTH = Gauge(
+    'chatportal_background_queue_depth',
+    'Tasks waiting in background queues.',
+    ('queue',),
+)
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def track_queue(queue: str, executor):
+    """
+    Report the tasks waiting in ``executor`` (a ThreadPoolExecutor) as
+    BACKGROUND_QUEUE_DEPTH{queue=...}. The depth is sampled whenever a
+    snapshot is taken; executors that are garbage collected drop out.
+    """
+    with _queues_lock:
+        _queues.setdefault(queue, weakref.WeakSet()).add(executor)
+    return executor
+
+
+def _pending(executor) -> int:
+    depth = executor._work_queue.qsize()
+    # Shutting down leaves a wake-up sentinel in the queue.
+    return max(depth - 1, 0) if executor._shutdown else depth
+
+
+def _sample_queues():
+    with _queues_lock:
+        queues = {queue: list(executors) for queue, executors in _queues.items()}
+    for queue, executors in queues.items():
+        BACKGROUND_QUEUE_DEPTH.set(sum(_pending(executor) for executor in executors), queue=queue)
+
+
+REGISTRY.add_sampler(_sample_queues)
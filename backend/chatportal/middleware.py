@@ -0,0 +1,153 @@
+"""
+Project-wide middleware.
+"""
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import db_router, metrics, profiling
+
+
+class QueryStats:
+    """Database execute wrapper counting queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """
+    Record request latency and per-request database work for /api/metrics.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else '<unmatched>'
+        metrics.HTTP_REQUEST_DURATION.observe(
+            elapsed, view=view, method=request.method, status=response.status_code
+        )
+        metrics.DB_QUERIES_PER_REQUEST.observe(stats.count, view=view)
+        metrics.DB_QUERY_SECONDS_PER_REQUEST.observe(stats.duration, view=view)
+        metrics.REGISTRY.maybe_flush()
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile selected requests and save the result to PROFILING_DIR.
+
+    A request is profiled when a staff user sends the PROFILING_HEADER header
+    or when it is picked by PROFILING_SAMPLE_RATE. With PROFILING_ENABLED off
+    the middleware is removed from the stack entirely.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.PROFILING_HEADER.upper().replace('-', '_')
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+
+    def should_profile(self, request) -> bool:
+        if request.META.get(self.header):
+            user = getattr(request, 'user', None)
+            return bool(user and user.is_staff)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = profiling.create_profiler()
+        sql = profiling.SQLRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sql))
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else '<unmatched>'
+        profile_id = profiling.new_profile_id(view)
+        try:
+            profiling.save_profile(profile_id, profiler, sql, {
+                'view': view,
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'duration': elapsed,
+                'captured_at': time.time(),
+            })
+        except OSError:
+            return response
+        response['X-Profile-Id'] = profile_id
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let read-only requests read from the replica database (see db_router).
+
+    Requests using a safe method, or dispatched to a view class with
+    ``read_replica = True``, read from the replica unless the client recently
+    wrote something. A request that writes to a table clients read back (see
+    db_router.BOOKKEEPING_MODELS) pins its client to the primary for
+    DATABASE_REPLICA_STICKY_SECONDS, whatever its method.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        if not db_router.replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.cookie = settings.DATABASE_REPLICA_STICKY_COOKIE
+        self.sticky_seconds = settings.DATABASE_REPLICA_STICKY_SECONDS
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        read_only = request.method in self.SAFE_METHODS or getattr(view_class, 'read_replica', False)
+        if read_only and self.cookie not in request.COOKIES:
+            db_router.allow_replica_reads()
+
+    def __call__(self, request):
+        db_router.begin_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = db_router.end_request()
+        if wrote:
+            response.set_cookie(
+                self.cookie, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,145 @@
+"""
+Opt-in per-request profiling.
+
+A profiled request produces up to three files in PROFILING_DIR sharing one
+profile id:
+- ``<id>.folded``: collapsed stacks (sampling mode), ready for flamegraph.pl,
+  speedscope or inferno.
+- ``<id>.prof``: a pstats dump (cProfile mode), e.g. for snakeviz or flameprof.
+- ``<id>.json``: request metadata and the SQL statements it executed.
+"""
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+
+from django.conf import settings
+
+
+class SamplingProfiler:
+    """Periodically samples the stack of the thread that started it."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                filename = os.path.basename(code.co_filename)
+                stack.append(f'{code.co_name} ({filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path: str):
+        with open(f'{path}.folded', 'w') as fh:
+            for stack, count in self.stacks.items():
+                fh.write(f'{stack} {count}\n')
+
+
+class CProfileProfiler:
+    """Deterministic profiler built on cProfile."""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path: str):
+        self.profile.dump_stats(f'{path}.prof')
+
+
+class SQLRecorder:
+    """Database execute wrapper keeping the statements of one request."""
+
+    max_statements = 1000
+
+    def __init__(self):
+        self.statements: List[Dict] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(self.statements) < self.max_statements:
+                self.statements.append({
+                    'sql': sql,
+                    'many': many,
+                    'duration': time.perf_counter() - start,
+                })
+
+
+def create_profiler():
+    if getattr(settings, 'PROFILING_MODE', 'sampling') == 'cprofile':
+        return CProfileProfiler()
+    return SamplingProfiler(getattr(settings, 'PROFILING_INTERVAL', 0.005))
+
+
+def new_profile_id(view_name: str) -> str:
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '-', view_name or 'unmatched')
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{os.urandom(3).hex()}"
+
+
+def save_profile(profile_id: str, profiler, sql: SQLRecorder, metadata: Dict):
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILING_DIR, profile_id)
+    profiler.write(path)
+    metadata = dict(metadata, id=profile_id, sql_count=len(sql.statements), sql=sql.statements)
+    with open(f'{path}.json', 'w') as fh:
+        json.dump(metadata, fh, indent=2, default=str)
+
+
+def list_profiles() -> List[Dict]:
+    """Return metadata of captured profiles, newest first."""
+    try:
+        names = os.listdir(settings.PROFILING_DIR)
+    except OSError:
+        return []
+    profiles = []
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.PROFILING_DIR, name)) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        data.pop('sql', None)
+        data['files'] = sorted(
+            other for other in names
+            if other.startswith(data.get('id', '') + '.')
+        )
+        profiles.append(data)
+    return sorted(profiles, key=lambda p: p.get('id', ''), reverse=True)
+
+
+def profile_file_path(name: str):
+    """Resolve a profile file name inside PROFILING_DIR, or None."""
+    if os.path.basename(name) != name or not name.endswith(('.json', '.folded', '.prof')):
+        return None
+    path = os.path.join(settings.PROFILING_DIR, name)
+    return path if os.path.isfile(path) else None
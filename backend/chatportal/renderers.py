@@ -0,0 +1,84 @@
+"""
+JSON renderer and parser backed by orjson, enabled with ORJSON_RENDERING.
+
+Both produce and accept exactly what DRF's JSONRenderer/JSONParser do (compact
+separators, UTF-8, escaped U+2028/U+2029). Datetimes are formatted by DRF's
+encoder. Whatever orjson would write differently is rendered by DRF instead:
+floats that Python writes in exponent notation (1e+20) or that are not finite
+(DRF rejects them), integers beyond 64 bits (orjson rejects them), indented
+responses, and everything when orjson is not installed.
+"""
+import math
+
+from django.conf import settings
+from rest_framework.utils import encoders
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+_SCALARS = frozenset([str, int, bool, type(None)])
+
+
+def _has_odd_floats(data) -> bool:
+    """Whether ``data`` holds a float orjson would format unlike json.dumps (exponent or non-finite)."""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        kind = type(value)
+        if kind in _SCALARS:
+            continue
+        if kind is float:
+            if not math.isfinite(value) or (value and not 1e-4 <= abs(value) < 1e16):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Renderer which serializes to JSON with orjson."""
+    _encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None or _has_odd_floats(data):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self._encoder.default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            )
+        except TypeError:
+            # e.g. integers beyond 64 bits, which json.dumps handles.
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer: keep the output a strict JavaScript subset.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    """Parses JSON-serialized data with orjson."""
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -4,6 +4,9 @@ Django settings for chatportal project.
 
 from pathlib import Path
 import os
+import json
+import tempfile
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -40,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'chatportal.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -48,6 +52,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'chatportal.middleware.ReplicaRoutingMiddleware',
+    'chatportal.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'chatportal.urls'
@@ -75,17 +81,35 @@ WSGI_APPLICATION = 'chatportal.wsgi.application'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
 # PostgreSQL configuration
+# Connections are kept open for DB_CONN_MAX_AGE seconds and checked before
+# reuse, instead of opening a new connection for every request.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'chatportal_db',
-        'USER': 'postgres',
-        'PASSWORD': 'nodejs',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.getenv('DB_NAME', 'chatportal_db'),
+        'USER': os.getenv('DB_USER', 'postgres'),
+        'PASSWORD': os.getenv('DB_PASSWORD', 'nodejs'),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Optional read replica. Read-only requests (and views with read_replica = True)
+# read from it; a client that wrote something (bookkeeping rows aside) reads
+# from the primary for the next DATABASE_REPLICA_STICKY_SECONDS.
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['chatportal.db_router.ReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', '10'))
+DATABASE_REPLICA_STICKY_COOKIE = 'db_primary'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -137,6 +161,17 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Encode and parse API JSON with orjson (requires the orjson package). The
+# bytes are the same as with DRF's JSON renderer, which is used otherwise.
+ORJSON_RENDERING = os.getenv('ORJSON_RENDERING', 'False').lower() == 'true'
+if ORJSON_RENDERING:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ['chatportal.renderers.ORJSONRenderer']
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = [
+        'chatportal.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ]
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -148,6 +183,9 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
+
 # AI API Keys (hardcoded per user request)
 OPENAI_API_KEY = ''
 ANTHROPIC_API_KEY = ''
@@ -158,3 +196,131 @@ LM_STUDIO_MODEL = os.getenv('LM_STUDIO_MODEL', 'local-model')
 # Default AI provider (openai, anthropic, google, lm_studio)
 AI_PROVIDER = 'openai'
 
+
+# Metrics (Prometheus text format served at /api/metrics).
+# Each worker flushes its samples to METRICS_DIR, which must be shared by all
+# worker processes of a deployment and should be emptied when it (re)starts.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'chatportal_metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+# Who may read /api/metrics besides staff users: clients from
+# METRICS_ALLOWED_IPS (comma-separated) and requests sending
+# "Authorization: Bearer <METRICS_TOKEN>" (disabled when empty).
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Per-request profiling. Requests are profiled when a staff user sends the
+# PROFILING_HEADER header, or at random with PROFILING_SAMPLE_RATE (0..1).
+# Captured profiles are listed at /admin/profiles/.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILING_HEADER = 'X-Profile-Request'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_MODE = os.getenv('PROFILING_MODE', 'sampling')  # sampling or cprofile
+PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL', '0.005'))
+PROFILING_DIR = os.getenv('PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'chatportal_profiles'))
+
+# Provider failover and resilience.
+# AI_PROVIDER_CHAIN lists providers to try in order, e.g. "openai,anthropic,lm_studio";
+# it defaults to AI_PROVIDER alone. Unconfigured providers are skipped.
+AI_PROVIDER_CHAIN = [p.strip() for p in os.getenv('AI_PROVIDER_CHAIN', '').split(',') if p.strip()] or [AI_PROVIDER]
+AI_PROVIDER_TIMEOUT = float(os.getenv('AI_PROVIDER_TIMEOUT', '30'))
+# Time budget (seconds) of a request that calls the LLM (0 disables it). Provider
+# calls get at most the time left, and a request that runs out of it answers 504.
+# A new conversation's title is generated in the background instead when less
+# than AI_TITLE_MIN_BUDGET seconds are left after the reply.
+AI_REQUEST_DEADLINE = float(os.getenv('AI_REQUEST_DEADLINE', '55'))
+AI_TITLE_MIN_BUDGET = float(os.getenv('AI_TITLE_MIN_BUDGET', '5'))
+# Open a provider's circuit after this many consecutive failures and probe it
+# again after AI_CIRCUIT_RESET_TIMEOUT seconds.
+AI_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('AI_CIRCUIT_FAILURE_THRESHOLD', '5'))
+AI_CIRCUIT_RESET_TIMEOUT = float(os.getenv('AI_CIRCUIT_RESET_TIMEOUT', '30'))
+# Start the next provider of the chain in parallel when a call has not answered
+# after this many seconds (0 disables hedging).
+AI_HEDGE_AFTER = float(os.getenv('AI_HEDGE_AFTER', '0'))
+AI_HEDGE_MAX_WORKERS = int(os.getenv('AI_HEDGE_MAX_WORKERS', '16'))
+
+# Outbound rate limits per provider, shared by all worker processes on the host
+# through lock files in AI_RATE_LIMIT_DIR. Example AI_RATE_LIMITS value:
+# {"openai": {"max_concurrent": 8, "requests_per_minute": 500, "tokens_per_minute": 90000}}
+# Providers without an entry are not limited.
+AI_RATE_LIMITS = json.loads(os.getenv('AI_RATE_LIMITS', '{}'))
+AI_RATE_LIMIT_DIR = os.getenv('AI_RATE_LIMIT_DIR', os.path.join(tempfile.gettempdir(), 'chatportal_ratelimit'))
+# Calls waiting for capacity beyond AI_RATE_LIMIT_QUEUE_SIZE are rejected, and
+# queued calls give up after AI_RATE_LIMIT_QUEUE_TIMEOUT seconds.
+AI_RATE_LIMIT_QUEUE_SIZE = int(os.getenv('AI_RATE_LIMIT_QUEUE_SIZE', '32'))
+AI_RATE_LIMIT_QUEUE_TIMEOUT = float(os.getenv('AI_RATE_LIMIT_QUEUE_TIMEOUT', '10'))
+
+# Per-task model routing (tasks: chat, title, suggestions, analysis, query).
+# Each task can override the provider chain, models, max_tokens and temperature
+# (see ai_integration/routing.py). Example AI_TASK_ROUTES value:
+# {"title": {"provider": "lm_studio", "model": "qwen2.5-0.5b-instruct", "max_tokens": 30},
+#  "analysis": {"models": {"openai": "gpt-4o-mini"}, "temperature": 0}}
+AI_TASK_ROUTES = json.loads(os.getenv('AI_TASK_ROUTES', '{}'))
+
+# Local (no-LLM) analysis: "fallback" answers title and analysis calls locally
+# when no provider does; "first" also computes titles, key topics and sentiment
+# locally and asks the LLM only for summaries and action items; "off" keeps the
+# canned fallback response.
+AI_LOCAL_ANALYSIS = os.getenv('AI_LOCAL_ANALYSIS', 'fallback').lower()
+
+# Coalesce identical concurrent LLM calls into one provider call. Followers
+# wait up to AI_SINGLE_FLIGHT_TIMEOUT seconds for the leader, and a finished
+# result is still shared for AI_SINGLE_FLIGHT_LINGER seconds. Calls are
+# coalesced within a process in memory, and across processes through the
+# LLMFlight table unless AI_SINGLE_FLIGHT_ACROSS_PROCESSES is false (e.g. with
+# a single worker process).
+AI_SINGLE_FLIGHT = os.getenv('AI_SINGLE_FLIGHT', 'True').lower() == 'true'
+AI_SINGLE_FLIGHT_ACROSS_PROCESSES = os.getenv('AI_SINGLE_FLIGHT_ACROSS_PROCESSES', 'True').lower() == 'true'
+AI_SINGLE_FLIGHT_TIMEOUT = float(os.getenv('AI_SINGLE_FLIGHT_TIMEOUT', '60'))
+AI_SINGLE_FLIGHT_LINGER = float(os.getenv('AI_SINGLE_FLIGHT_LINGER', '5'))
+
+# Conversations without activity for this long are ended and analyzed by
+# `manage.py sweep_idle_conversations`.
+CONVERSATION_IDLE_TIMEOUT_MINUTES = int(os.getenv('CONVERSATION_IDLE_TIMEOUT_MINUTES', '60'))
+
+# `manage.py archive_conversations` compresses the messages of conversations
+# ended more than this many days ago into the cold archive.
+CONVERSATION_ARCHIVE_AFTER_DAYS = int(os.getenv('CONVERSATION_ARCHIVE_AFTER_DAYS', '365'))
+
+# Shared conversations are served from snapshots pre-rendered into
+# SHARED_SNAPSHOT_DIR (gzip, and brotli when the brotli package is installed).
+# The directory must be shared by all worker processes of a deployment; missing
+# snapshots are rendered again on first access.
+SHARED_SNAPSHOT_DIR = os.getenv('SHARED_SNAPSHOT_DIR', os.path.join(tempfile.gettempdir(), 'chatportal_shared'))
+SHARED_SNAPSHOT_MAX_AGE = int(os.getenv('SHARED_SNAPSHOT_MAX_AGE', '60'))
+
+# Build conversation and message list responses from database rows instead of
+# ModelSerializer instances (same output, much less CPU per page).
+FAST_LIST_RENDERING = os.getenv('FAST_LIST_RENDERING', 'True').lower() == 'true'
+
+# Deleted conversations are hidden at once and their messages purged in chunks
+# on a background thread; `manage.py purge_deleted_conversations` finishes any
+# purge interrupted by a restart.
+CONVERSATION_PURGE_IN_BACKGROUND = os.getenv('CONVERSATION_PURGE_IN_BACKGROUND', 'True').lower() == 'true'
+CONVERSATION_PURGE_CHUNK_SIZE = int(os.getenv('CONVERSATION_PURGE_CHUNK_SIZE', '5000'))
+
+# Chat context: the last CONVERSATION_CONTEXT_MESSAGES messages sent to the LLM.
+# Windows of up to CONVERSATION_CONTEXT_CACHE_SIZE conversations are cached per
+# process for CONVERSATION_CONTEXT_CACHE_TTL seconds, and also in the Django
+# cache named by CONVERSATION_CONTEXT_CACHE_ALIAS (e.g. "default") when set.
+CONVERSATION_CONTEXT_MESSAGES = int(os.getenv('CONVERSATION_CONTEXT_MESSAGES', '10'))
+CONVERSATION_CONTEXT_CACHE_SIZE = int(os.getenv('CONVERSATION_CONTEXT_CACHE_SIZE', '1000'))
+CONVERSATION_CONTEXT_CACHE_TTL = int(os.getenv('CONVERSATION_CONTEXT_CACHE_TTL', '300'))
+CONVERSATION_CONTEXT_CACHE_ALIAS = os.getenv('CONVERSATION_CONTEXT_CACHE_ALIAS', '')
+
+# Batch chat (POST /api/conversations/batch_chat/): maximum prompts per request,
+# how many conversations are answered concurrently, and the seconds the whole
+# batch may take (0 disables): prompts not answered by then are reported as
+# errors instead of being run.
+BATCH_CHAT_MAX_ITEMS = int(os.getenv('BATCH_CHAT_MAX_ITEMS', '200'))
+BATCH_CHAT_WORKERS = int(os.getenv('BATCH_CHAT_WORKERS', '50'))
+BATCH_CHAT_DEADLINE = float(os.getenv('BATCH_CHAT_DEADLINE', '120'))
+
+# Idempotency-Key header on send_message, reply and end_conversation: stored
+# responses are replayed for this many seconds, and a retry arriving while the
+# original request is still running waits up to IDEMPOTENCY_WAIT_TIMEOUT. A key
+# still in flight after IDEMPOTENCY_LEASE seconds (longer than any request, see
+# AI_REQUEST_DEADLINE) belongs to a crashed worker and is taken over.
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', '86400'))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', '60'))
+IDEMPOTENCY_LEASE = float(os.getenv('IDEMPOTENCY_LEASE', '120'))
@@ -0,0 +1,130 @@
+from unittest import mock
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from ai_integration.models import LLMFlight
+from chatportal import db_router
+from chatportal.db_router import REPLICA_DB_ALIAS, ReplicaRouter
+from chatportal.middleware import ReplicaRoutingMiddleware
+from conversations.models import Conversation, IdempotencyKey
+
+
+class ReadOnlyPostView:
+    read_replica = True
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        db_router.begin_request()
+        self.addCleanup(db_router.end_request)
+
+    def test_reads_use_primary_by_default(self):
+        self.assertEqual(self.router.db_for_read(None), DEFAULT_DB_ALIAS)
+
+    def test_replica_reads_until_first_write(self):
+        db_router.allow_replica_reads()
+        self.assertEqual(self.router.db_for_read(None), REPLICA_DB_ALIAS)
+
+        self.assertEqual(self.router.db_for_write(None), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.router.db_for_read(None), DEFAULT_DB_ALIAS)
+        self.assertTrue(db_router.end_request())
+
+    def test_reads_inside_transaction_use_primary(self):
+        db_router.allow_replica_reads()
+        with mock.patch.object(connections[DEFAULT_DB_ALIAS], 'in_atomic_block', True):
+            self.assertEqual(self.router.db_for_read(None), DEFAULT_DB_ALIAS)
+
+    def test_end_request_resets_state(self):
+        db_router.allow_replica_reads()
+        self.assertFalse(db_router.end_request())
+        self.assertEqual(self.router.db_for_read(None), DEFAULT_DB_ALIAS)
+
+    def test_bookkeeping_writes_keep_replica_reads(self):
+        db_router.allow_replica_reads()
+        for model in (LLMFlight, IdempotencyKey):
+            self.assertEqual(self.router.db_for_write(model), DEFAULT_DB_ALIAS)
+            self.assertEqual(self.router.db_for_read(model), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.router.db_for_read(Conversation), REPLICA_DB_ALIAS)
+        self.assertFalse(db_router.end_request())
+
+    def test_migrations_only_run_on_primary(self):
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'conversations'))
+        self.assertFalse(self.router.allow_migrate(REPLICA_DB_ALIAS, 'conversations'))
+
+
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(db_router, 'replica_configured', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.seen = []
+        self.write = False
+        self.write_model = None
+
+    def get_response(self, request):
+        self.seen.append(self.router.db_for_read(None))
+        if self.write:
+            self.router.db_for_write(None)
+        if self.write_model:
+            self.router.db_for_write(self.write_model)
+            self.seen.append(self.router.db_for_read(Conversation))
+        return HttpResponse('ok')
+
+    def handle(self, request, view_func=None):
+        middleware = ReplicaRoutingMiddleware(self.get_response)
+
+        def wrapped(request):
+            middleware.process_view(request, view_func or (lambda r: None), (), {})
+            return self.get_response(request)
+
+        middleware.get_response = wrapped
+        return middleware(request)
+
+    def test_not_used_without_replica(self):
+        with mock.patch.object(db_router, 'replica_configured', return_value=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                ReplicaRoutingMiddleware(self.get_response)
+
+    def test_get_reads_from_replica(self):
+        response = self.handle(self.factory.get('/api/conversations/'))
+        self.assertEqual(self.seen, [REPLICA_DB_ALIAS])
+        self.assertNotIn('db_primary', response.cookies)
+
+    def test_post_reads_from_primary_and_pins_client(self):
+        self.write = True
+        response = self.handle(self.factory.post('/api/conversations/'))
+        self.assertEqual(self.seen, [DEFAULT_DB_ALIAS])
+        self.assertEqual(response.cookies['db_primary']['max-age'], 10)
+
+    def test_post_without_writes_does_not_pin_client(self):
+        response = self.handle(self.factory.post('/api/conversations/'))
+        self.assertNotIn('db_primary', response.cookies)
+
+    def test_read_only_view_reads_from_replica_despite_post(self):
+        view = lambda r: None
+        view.cls = ReadOnlyPostView
+        self.write_model = LLMFlight
+        response = self.handle(self.factory.post('/api/query/'), view)
+        self.assertEqual(self.seen, [REPLICA_DB_ALIAS, REPLICA_DB_ALIAS])
+        self.assertNotIn('db_primary', response.cookies)
+
+    def test_get_that_writes_pins_client(self):
+        self.write = True
+        response = self.handle(self.factory.get('/api/conversations/'))
+        self.assertIn('db_primary', response.cookies)
+
+    def test_pinned_client_reads_from_primary(self):
+        request = self.factory.get('/api/conversations/')
+        request.COOKIES['db_primary'] = '1'
+        self.handle(request)
+        self.assertEqual(self.seen, [DEFAULT_DB_ALIAS])
+
+    def test_routing_does_not_leak_past_the_request(self):
+        self.handle(self.factory.get('/api/conversations/'))
+        self.assertEqual(self.router.db_for_read(None), DEFAULT_DB_ALIAS)
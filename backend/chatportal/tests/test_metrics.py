@@ -0,0 +1,80 @@
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from chatportal import metrics
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(METRICS_DIR=self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_counter_and_histogram_exposition(self):
+        counter = metrics.Counter('test_events_total', 'Events.', ('kind',))
+        histogram = metrics.Histogram('test_latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+        counter.inc(kind='a')
+        counter.inc(2, kind='a')
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        text = metrics.REGISTRY.expose()
+
+        self.assertIn('test_events_total{kind="a"} 3', text)
+        self.assertIn('test_latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{le="1"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn('test_latency_seconds_count 3', text)
+
+    def test_queue_depth_is_sampled_from_tracked_executors(self):
+        release = threading.Event()
+        executor = metrics.track_queue('test_queue', ThreadPoolExecutor(max_workers=1))
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(release.set)
+        executor.submit(release.wait)
+        for _ in range(3):
+            executor.submit(lambda: None)
+
+        values = metrics.REGISTRY.collect()['chatportal_background_queue_depth']['values']
+        self.assertEqual(values[('test_queue',)], 3)
+
+        release.set()
+        executor.shutdown(wait=True)
+        values = metrics.REGISTRY.collect()['chatportal_background_queue_depth']['values']
+        self.assertEqual(values[('test_queue',)], 0)
+
+    def test_hedge_executor_is_tracked(self):
+        from ai_integration.resilience import get_hedge_executor
+
+        self.assertIn(get_hedge_executor(), metrics._queues['hedge'])
+
+
+@override_settings(METRICS_ALLOWED_IPS=['10.0.0.5'], METRICS_TOKEN='s3cret')
+class MetricsAccessTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(METRICS_DIR=self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_anonymous_clients_are_refused(self):
+        self.assertEqual(self.client.get('/api/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+    def test_token_allowed_ip_and_staff_may_read(self):
+        self.assertEqual(self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        self.assertEqual(self.client.get('/api/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        self.assertEqual(self.client.get('/api/metrics').status_code, 200)
+
+    def test_empty_token_is_not_accepted(self):
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from chatportal import profiling
+from chatportal.middleware import ProfilingMiddleware
+
+
+class StaffUser:
+    is_staff = True
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class ProfilingTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(PROFILING_DIR=self.tmp.name, PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_sampling_profiler_collects_folded_stacks(self):
+        profiler = profiling.SamplingProfiler(0.001)
+        profiler.start()
+        busy(0.05)
+        profiler.stop()
+
+        self.assertTrue(any('busy (test_profiling.py' in stack for stack in profiler.stacks))
+        path = os.path.join(self.tmp.name, 'sample')
+        profiler.write(path)
+        with open(f'{path}.folded') as fh:
+            line = fh.readline().rstrip('\n')
+        stack, count = line.rsplit(' ', 1)
+        self.assertTrue(count.isdigit())
+        self.assertIn(';', stack)
+
+    @override_settings(PROFILING_MODE='cprofile')
+    def test_cprofile_mode(self):
+        profiler = profiling.create_profiler()
+        self.assertIsInstance(profiler, profiling.CProfileProfiler)
+        profiler.start()
+        busy(0.001)
+        profiler.stop()
+        profiler.write(os.path.join(self.tmp.name, 'sample'))
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp.name, 'sample.prof')))
+
+    def test_middleware_saves_profile_for_staff_header(self):
+        def view(request):
+            busy(0.01)
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/api/conversations/', HTTP_X_PROFILE_REQUEST='1')
+        request.user = StaffUser()
+        response = ProfilingMiddleware(view)(request)
+
+        profile_id = response['X-Profile-Id']
+        profiles = profiling.list_profiles()
+        self.assertEqual([p['id'] for p in profiles], [profile_id])
+        self.assertEqual(profiles[0]['path'], '/api/conversations/')
+        self.assertEqual(profiles[0]['status'], 200)
+        self.assertIn(f'{profile_id}.folded', profiles[0]['files'])
+        self.assertIsNotNone(profiling.profile_file_path(f'{profile_id}.json'))
+
+    def test_middleware_ignores_header_from_non_staff(self):
+        request = RequestFactory().get('/', HTTP_X_PROFILE_REQUEST='1')
+        request.user = type('Anonymous', (), {'is_staff': False})()
+        response = ProfilingMiddleware(lambda request: HttpResponse('ok'))(request)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(profiling.list_profiles(), [])
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_middleware_is_removed(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: HttpResponse('ok'))
+
+    def test_profile_file_path_rejects_traversal(self):
+        self.assertIsNone(profiling.profile_file_path('../settings.json'))
+        self.assertIsNone(profiling.profile_file_path('profile.txt'))
+        self.assertIsNone(profiling.profile_file_path('missing.json'))
@@ -0,0 +1,69 @@
+import datetime
+import decimal
+import io
+import uuid
+from unittest import skipIf
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from chatportal.renderers import ORJSONParser, ORJSONRenderer, orjson
+
+
+@skipIf(orjson is None, 'orjson is not installed')
+class ORJSONRendererTests(SimpleTestCase):
+    def assertSameBytes(self, data):
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_matches_drf_renderer(self):
+        now = timezone.now()
+        self.assertSameBytes({
+            'text': 'héllo "quoted" \\ \n\t',
+            'separators': 'line paragraph ',
+            'int': 42,
+            'big_int': 2 ** 63 - 1,
+            'float': 0.1,
+            'whole_float': 100.0,
+            'bool': True,
+            'none': None,
+            'nested': [{'a': [1, 2, {'b': 'c'}]}, (3, 4)],
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'decimal': decimal.Decimal('1.50'),
+            'lazy': gettext_lazy('Conversation'),
+            'set': {7},
+            1: 'integer key',
+            'utc_datetime': now,
+            'whole_second': now.replace(microsecond=0),
+            'naive_datetime': datetime.datetime(2024, 1, 2, 3, 4, 5, 678901),
+            'offset_datetime': datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+            'date': datetime.date(2024, 1, 2),
+            'time': datetime.time(3, 4, 5, 678901),
+        })
+
+    def test_exponent_floats_match(self):
+        for value in (1e20, -1e16, 1.5e-7, 9e-05, 1e16, 123456789012345680.0):
+            self.assertSameBytes({'value': value, 'list': [value]})
+
+    def test_integers_beyond_64_bits_are_rendered(self):
+        self.assertSameBytes({'value': 2 ** 70, 'negative': -(2 ** 65)})
+
+    def test_non_finite_floats_are_rejected_like_drf(self):
+        for value in (float('nan'), float('inf'), float('-inf')):
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({'value': value})
+            with self.assertRaises(ValueError):
+                ORJSONRenderer().render({'value': [value]})
+
+    def test_indented_and_empty(self):
+        context = {'indent': 2}
+        self.assertEqual(
+            ORJSONRenderer().render({'a': [1]}, renderer_context=context),
+            JSONRenderer().render({'a': [1]}, renderer_context=context),
+        )
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_parser(self):
+        data = ORJSONParser().parse(io.BytesIO('{"a": [1, "é"]}'.encode()))
+        self.assertEqual(data, {'a': [1, 'é']})
@@ -3,9 +3,13 @@ URL configuration for chatportal project.
 """
 from django.contrib import admin
 from django.urls import path, include
+from .views import metrics_view, profile_file_view, profile_list_view
 
 urlpatterns = [
+    path('admin/profiles/', profile_list_view, name='profile-list'),
+    path('admin/profiles/<str:name>', profile_file_view, name='profile-file'),
     path('admin/', admin.site.urls),
+    path('api/metrics', metrics_view, name='metrics'),
     path('api/', include('conversations.urls')),
 ]
 
@@ -0,0 +1,87 @@
+"""
+Project-level views.
+"""
+import hmac
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from django.views.decorators.http import require_GET
+
+from . import metrics, profiling
+
+
+def _may_read_metrics(request) -> bool:
+    """Staff users, METRICS_ALLOWED_IPS and holders of METRICS_TOKEN may read metrics."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_active and user.is_staff:
+        return True
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Expose collected metrics in the Prometheus text format.
+    GET /api/metrics
+    """
+    if not _may_read_metrics(request):
+        return HttpResponseForbidden('Metrics are not public.')
+    metrics.REGISTRY.flush()
+    return HttpResponse(
+        metrics.REGISTRY.expose(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+@staff_member_required
+def profile_list_view(request):
+    """
+    List captured request profiles.
+    GET /admin/profiles/
+    """
+    rows = format_html_join(
+        '\n',
+        '<tr><td>{}</td><td>{} {}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+        (
+            (
+                profile.get('id'),
+                profile.get('method'),
+                profile.get('path'),
+                profile.get('status'),
+                f"{profile.get('duration', 0):.3f}s",
+                profile.get('sql_count'),
+                format_html_join(' ', '<a href="{}">{}</a>', (
+                    (reverse('profile-file', args=[name]), name.rsplit('.', 1)[-1])
+                    for name in profile['files']
+                )),
+            )
+            for profile in profiling.list_profiles()
+        )
+    )
+    return HttpResponse(format_html(
+        '<html><head><title>Request profiles</title></head><body>'
+        '<h1>Request profiles</h1>'
+        '<table border="1" cellpadding="4">'
+        '<tr><th>Profile</th><th>Request</th><th>Status</th><th>Duration</th>'
+        '<th>SQL queries</th><th>Files</th></tr>{}</table></body></html>',
+        rows
+    ))
+
+
+@staff_member_required
+def profile_file_view(request, name):
+    """
+    Download a captured profile file.
+    GET /admin/profiles/<name>
+    """
+    path = profiling.profile_file_path(name)
+    if path is None:
+        raise Http404('Profile not found')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
@@ -1,21 +1,124 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
 from .models import Conversation, Message
+from .purge import mark_deleted
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for very large tables. An unfiltered changelist takes the row
+    count from the PostgreSQL planner statistics instead of COUNT(*), and a
+    filtered one stops counting at COUNT_LIMIT rows; ``estimated`` and
+    ``capped`` tell which happened.
+    """
+    ESTIMATE_THRESHOLD = 100000
+    COUNT_LIMIT = 10000
+
+    estimated = False
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        # Unfiltered means no filters beyond the model manager's own (e.g.
+        # Conversation.objects hides deleted conversations).
+        if queryset.query.where == queryset.model._default_manager.all().query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.ESTIMATE_THRESHOLD:
+                self.estimated = True
+                return estimate
+            return queryset.count()
+        count = queryset[:self.COUNT_LIMIT + 1].count()
+        if count > self.COUNT_LIMIT:
+            self.capped = True
+            return self.COUNT_LIMIT
+        return count
+
+
+def estimated_row_count(model, using):
+    """Planner row estimate of a table (summed over its partitions), or None."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT SUM(GREATEST(reltuples, 0))::bigint FROM pg_class '
+            'WHERE oid = to_regclass(%s) '
+            'OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))',
+            [model._meta.db_table, model._meta.db_table]
+        )
+        return cursor.fetchone()[0]
+
+
+class EstimatedCountAdminMixin:
+    """Changelist paginated by EstimatedCountPaginator, telling the user when its count is approximate."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        paginator = getattr(changelist, 'paginator', None)
+        if getattr(paginator, 'capped', False):
+            messages.warning(request, (
+                f'More than {paginator.COUNT_LIMIT:,} {self.opts.verbose_name_plural} match; only the first '
+                f'{paginator.COUNT_LIMIT:,} are paginated. Narrow the filters to see the rest.'
+            ))
+        elif getattr(paginator, 'estimated', False):
+            messages.info(request, f'The number of {self.opts.verbose_name_plural} is an estimate.')
+        return response
 
 
 @admin.register(Conversation)
-class ConversationAdmin(admin.ModelAdmin):
-    list_display = ['title', 'status', 'start_timestamp', 'end_timestamp']
-    list_filter = ['status', 'start_timestamp']
+class ConversationAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
+    list_display = ['title', 'status', 'start_timestamp', 'end_timestamp', 'last_message_at', 'message_count']
+    list_filter = ['status', 'is_archived']
     search_fields = ['title', 'summary']
+    date_hierarchy = 'start_timestamp'
+    ordering = ['-start_timestamp', '-id']
+    raw_id_fields = ['parent_conversation']
+    readonly_fields = ['message_count', 'branches_count', 'last_message_at']
+
+    # Deleting from the admin marks conversations like the API does; the rows
+    # are purged in the background (see conversations.purge).
+    def delete_model(self, request, obj):
+        mark_deleted(obj)
+
+    def delete_queryset(self, request, queryset):
+        for conversation in queryset:
+            mark_deleted(conversation)
 
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
     list_display = ['conversation', 'sender', 'timestamp', 'content_preview']
     list_filter = ['sender', 'timestamp']
+    list_select_related = ['conversation']
     search_fields = ['content']
+    ordering = ['-timestamp', '-id']
+    autocomplete_fields = ['conversation']
+    raw_id_fields = ['parent_message']
+
+    # Admin writes keep the conversations' counters and updated_at current,
+    # like the API's (see ConversationQuerySet).
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            previous_conversation = form.initial.get('conversation')
+            Message.objects.count_move(obj, previous_conversation, redated='timestamp' in form.changed_data)
+            Conversation.objects.filter(pk__in=[previous_conversation, obj.conversation_id]).touch()
+        else:
+            Conversation.objects.filter(pk=obj.conversation_id).add_messages(1, obj.timestamp)
+
+    def delete_model(self, request, obj):
+        Message.objects.filter(pk=obj.pk).delete_and_count()
+
+    def delete_queryset(self, request, queryset):
+        queryset.delete_and_count()
 
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
     content_preview.short_description = 'Content'
-
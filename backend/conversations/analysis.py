@@ -0,0 +1,104 @@
+"""
+Batch analysis of conversations outside the request path.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import close_old_connections
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from ai_integration.services import AIService
+from .archive import archived_messages
+from .models import Conversation, Message
+
+
+ANALYSIS_FIELDS = ['summary', 'key_topics', 'sentiment', 'action_items']
+
+
+def load_messages(conversations: Iterable[Conversation]) -> Dict[int, List[Dict]]:
+    """
+    Fetch the messages of many conversations: a single query for those in
+    the message table, the cold archive (see conversations.archive) for the
+    archived ones.
+    """
+    messages = defaultdict(list)
+    live, archived = [], []
+    for conv in conversations:
+        (archived if conv.is_archived else live).append(conv)
+    rows = Message.objects.filter(
+        conversation_id__in=[conv.id for conv in live]
+    ).order_by('timestamp').values_list('conversation_id', 'sender', 'content')
+    for conversation_id, sender, content in rows:
+        messages[conversation_id].append({'sender': sender, 'content': content})
+    prefetch_related_objects(archived, 'archive')
+    for conv in archived:
+        messages[conv.id] = [{'sender': msg.sender, 'content': msg.content} for msg in archived_messages(conv)]
+    return messages
+
+
+def pack(items: List[Tuple[int, List[Dict]]], pack_size: int, pack_max_chars: int) -> List[List[Tuple[int, List[Dict]]]]:
+    """
+    Group short conversations into packs of up to ``pack_size`` analysed with a
+    single prompt; conversations longer than ``pack_max_chars`` go alone.
+    """
+    packs, current = [], []
+    for item in items:
+        length = sum(len(msg['content']) for msg in item[1])
+        if pack_size <= 1 or length > pack_max_chars:
+            packs.append([item])
+            continue
+        current.append(item)
+        if len(current) >= pack_size:
+            packs.append(current)
+            current = []
+    if current:
+        packs.append(current)
+    return packs
+
+
+def _analyze_pack(items: List[Tuple[int, List[Dict]]]) -> Dict[int, Dict]:
+    try:
+        return AIService().analyze_conversations(items)
+    finally:
+        # Worker threads open their own DB connections (single-flight lock rows).
+        close_old_connections()
+
+
+def analyze_conversations(conversations: List[Conversation], executor: ThreadPoolExecutor,
+                          pack_size: int = 1, pack_max_chars: int = 2000) -> List[Conversation]:
+    """
+    Analyze conversations concurrently on ``executor`` and set the analysis
+    fields on the instances. Returns the instances that were analyzed;
+    conversations without messages, and those no provider could analyze
+    (fallback analyses), are skipped. Nothing is saved.
+    """
+    messages = load_messages(conversations)
+    items = [(conv.id, messages[conv.id]) for conv in conversations if messages.get(conv.id)]
+    results = {}
+    for analyses in executor.map(_analyze_pack, pack(items, pack_size, pack_max_chars)):
+        results.update(analyses)
+
+    analyzed = []
+    for conv in conversations:
+        analysis = results.get(conv.id)
+        if analysis is None or analysis.get('fallback'):
+            continue
+        conv.summary = analysis.get('summary', '')
+        conv.key_topics = analysis.get('key_topics', [])
+        conv.sentiment = analysis.get('sentiment', '')
+        conv.action_items = analysis.get('action_items', [])
+        analyzed.append(conv)
+    return analyzed
+
+
+def save_analyses(conversations: List[Conversation], batch_size: int = None):
+    """
+    Write the analysis fields of ``conversations`` back. updated_at moves
+    with them, so the conditional GET validators see the new analysis.
+    """
+    now = timezone.now()
+    for conv in conversations:
+        conv.updated_at = now
+    Conversation.objects.bulk_update(conversations, ANALYSIS_FIELDS + ['updated_at'], batch_size=batch_size)
@@ -0,0 +1,134 @@
+"""
+Cold archive tier for old ended conversations.
+
+Archiving moves a conversation's messages out of the message table into one
+compressed blob (zstd, or zlib where the ``zstandard`` package is missing) stored in ConversationArchive. The conversation row, with its
+title and summary, stays in place; ``Conversation.message_history`` rehydrates
+the messages on demand, and a conversation that receives new messages is
+restored to the hot table first.
+"""
+import json
+import zlib
+from datetime import datetime
+from typing import List, Tuple
+
+from django.db import router, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import Conversation, ConversationArchive, Message, record_change
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+MESSAGE_FIELDS = [
+    'id', 'content', 'sender', 'timestamp', 'parent_message_id',
+    'reactions', 'is_bookmarked', 'created_at', 'updated_at',
+]
+DATETIME_FIELDS = ('timestamp', 'created_at', 'updated_at')
+
+
+def _isoformat(value: datetime) -> str:
+    # Full precision: DjangoJSONEncoder would cut microseconds to milliseconds.
+    return value.isoformat()
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """Compress with the best available codec; returns (codec, blob)."""
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(data)
+    return 'zlib', zlib.compress(data, 9)
+
+
+def decompress(codec: str, blob: bytes) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('The zstandard package is required to read zstd archives')
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+def archived_messages(conversation: Conversation) -> List[Message]:
+    """
+    Rebuild the archived messages of a conversation as unsaved Message
+    instances. Each carries ``known_replies_count`` for MessageSerializer.
+    """
+    cache = getattr(conversation, '_archived_messages', None)
+    if cache is not None:
+        return cache
+    try:
+        archive = conversation.archive
+    except ConversationArchive.DoesNotExist:
+        return []
+    rows = json.loads(decompress(archive.codec, bytes(archive.payload)))
+
+    replies_counts = {}
+    for row in rows:
+        if row['parent_message_id'] is not None:
+            replies_counts[row['parent_message_id']] = replies_counts.get(row['parent_message_id'], 0) + 1
+    messages = []
+    for row in rows:
+        for field in DATETIME_FIELDS:
+            row[field] = parse_datetime(row[field])
+        message = Message(conversation=conversation, **row)
+        message.known_replies_count = replies_counts.get(row['id'], 0)
+        messages.append(message)
+    conversation._archived_messages = messages
+    return messages
+
+
+def archive_conversation(conversation: Conversation) -> ConversationArchive:
+    """Move the messages of ``conversation`` into a compressed archive."""
+    with transaction.atomic():
+        conversation = Conversation.objects.select_for_update().get(pk=conversation.pk)
+        if conversation.is_archived:
+            return conversation.archive
+        rows = list(
+            Message.objects.of_conversation(conversation).order_by('timestamp', 'id').values(*MESSAGE_FIELDS)
+        )
+        data = json.dumps(rows, default=_isoformat, separators=(',', ':')).encode()
+        codec, blob = compress(data)
+        archive = ConversationArchive.objects.create(
+            conversation=conversation,
+            codec=codec,
+            payload=blob,
+            message_count=len(rows),
+            original_size=len(data),
+            first_message_at=rows[0]['timestamp'] if rows else None,
+            last_message_at=rows[-1]['timestamp'] if rows else None,
+        )
+        # A raw delete: Message.parent_message is SET_NULL, and replies in other
+        # conversations must keep pointing at these ids, which restoring reuses.
+        archived = Message.objects.db_manager(router.db_for_write(Message)).of_conversation(conversation)
+        archived._raw_delete(archived.db)
+        record_change(archived.db)
+        conversation.is_archived = True
+        conversation.save(update_fields=['is_archived', 'updated_at'])
+    return archive
+
+
+def restore_conversation(conversation: Conversation):
+    """Move archived messages back into the message table."""
+    with transaction.atomic():
+        locked = Conversation.objects.select_for_update().get(pk=conversation.pk)
+        if locked.is_archived:
+            messages = archived_messages(locked)
+            stamps = [(message.created_at, message.updated_at) for message in messages]
+            Message.objects.bulk_create(messages)
+            # bulk_create stamps created_at/updated_at with the current time.
+            for message, (created_at, updated_at) in zip(messages, stamps):
+                message.created_at, message.updated_at = created_at, updated_at
+            Message.objects.bulk_update(messages, ['created_at', 'updated_at'])
+            if messages:
+                Conversation.objects.filter(pk=locked.pk).include_messages_since(
+                    min(message.timestamp for message in messages)
+                )
+            ConversationArchive.objects.filter(conversation=locked).delete()
+            # The restored messages keep their updated_at.
+            record_change(locked._state.db)
+            locked.is_archived = False
+            locked.save(update_fields=['is_archived', 'updated_at'])
+    conversation.is_archived = False
+    conversation.__dict__.pop('_archived_messages', None)
@@ -0,0 +1,190 @@
+"""
+Batch chat for automation clients: many prompts answered concurrently.
+
+Prompts are grouped by conversation. Each group runs as one task on a bounded
+thread pool, answering its prompts in order so later prompts see the earlier
+replies; different conversations run in parallel. Context is loaded for every
+conversation with one query up front, and the messages of the tasks that
+finish together are saved with one bulk insert. Every prompt gets its own
+AI_REQUEST_DEADLINE budget; a prompt that runs out of it is reported as an
+error and the group moves on to its next prompt. The whole batch has
+BATCH_CHAT_DEADLINE seconds: prompts are cut short when it runs out, and
+those not started by then are reported as errors without being run.
+"""
+import logging
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from ai_integration.deadline import Deadline, request_deadline
+from ai_integration.exceptions import DeadlineExceeded
+from ai_integration.services import AIService
+from chatportal import metrics
+from .archive import restore_conversation
+from .context_cache import invalidate
+from .models import Conversation, Message
+from .serializers import MessageSerializer
+from .snapshots import refresh_snapshots
+
+logger = logging.getLogger(__name__)
+
+
+CONTEXT_MESSAGES = settings.CONVERSATION_CONTEXT_MESSAGES
+
+
+def load_histories(conversation_ids: Iterable[int]) -> Dict[int, List[Dict]]:
+    """The last CONTEXT_MESSAGES messages of each conversation, with a single query."""
+    rows = Message.objects.filter(conversation_id__in=list(conversation_ids)).annotate(
+        recent=Window(RowNumber(), partition_by=F('conversation_id'), order_by=F('timestamp').desc())
+    ).filter(recent__lte=CONTEXT_MESSAGES).order_by('timestamp').values_list('conversation_id', 'sender', 'content')
+    histories = defaultdict(list)
+    for conversation_id, sender, content in rows:
+        histories[conversation_id].append({
+            'role': 'user' if sender == 'user' else 'assistant',
+            'content': content
+        })
+    return histories
+
+
+def _prompt_deadline(batch_deadline: Optional[Deadline]) -> Optional[Deadline]:
+    """The prompt's own AI_REQUEST_DEADLINE, or the batch's when that comes first."""
+    deadline = request_deadline()
+    if batch_deadline is None or (deadline is not None and deadline.expires_at <= batch_deadline.expires_at):
+        return deadline
+    return batch_deadline
+
+
+def _chat_group(conversation_id: int, history: List[Dict], items: List[Dict], needs_title: bool,
+                batch_deadline: Optional[Deadline] = None) -> Dict:
+    """Answer the prompts of one conversation in order. Nothing is saved."""
+    history = history[-CONTEXT_MESSAGES:]
+    answers, title = [], None
+    try:
+        for item in items:
+            if batch_deadline is not None and batch_deadline.expired():
+                answers.append({**item, 'error': 'The batch ran out of time before this prompt was answered'})
+                continue
+            asked = timezone.now()
+            service = AIService(deadline=_prompt_deadline(batch_deadline))
+            try:
+                reply = service.chat(conversation_id, item['content'], history=history)
+            except DeadlineExceeded:
+                logger.warning("Batch chat deadline exceeded for conversation %s", conversation_id)
+                answers.append({**item, 'error': 'The AI service did not answer in time'})
+                continue
+            except Exception:
+                logger.exception("Batch chat failed for conversation %s", conversation_id)
+                answers.append({**item, 'error': 'Failed to generate a response'})
+                continue
+            answers.append({**item, 'reply': reply, 'asked': asked, 'answered': timezone.now()})
+            history = (history + [
+                {'role': 'user', 'content': item['content']},
+                {'role': 'assistant', 'content': reply},
+            ])[-CONTEXT_MESSAGES:]
+            if needs_title and title is None:
+                try:
+                    title = service.generate_title(item['content'])[:255]
+                except DeadlineExceeded:
+                    # The reply used up the budget; a later prompt may title it.
+                    pass
+    finally:
+        # Pool threads open their own DB connections (single-flight lock rows).
+        connections.close_all()
+    return {'conversation_id': conversation_id, 'answers': answers, 'title': title}
+
+
+def _save(outcomes: List[Dict], conversations: Dict[int, Conversation]) -> List[Dict]:
+    """Bulk insert the messages of finished groups and build their results."""
+    pairs, titled = [], []
+    for outcome in outcomes:
+        for answer in outcome['answers']:
+            if 'reply' in answer:
+                pairs.append((answer, (
+                    Message(conversation_id=answer['conversation_id'], content=answer['content'],
+                            sender='user', timestamp=answer['asked']),
+                    Message(conversation_id=answer['conversation_id'], content=answer['reply'],
+                            sender='ai', timestamp=answer['answered']),
+                )))
+        if outcome['title']:
+            conversation = conversations[outcome['conversation_id']]
+            conversation.title = outcome['title']
+            conversation.updated_at = timezone.now()
+            titled.append(conversation)
+
+    with transaction.atomic():
+        Message.objects.bulk_create_and_count([message for _, messages in pairs for message in messages])
+        if titled:
+            Conversation.objects.bulk_update(titled, ['title', 'updated_at'])
+    invalidate(outcome['conversation_id'] for outcome in outcomes)
+    refresh_snapshots({outcome['conversation_id'] for outcome in outcomes})
+
+    results = []
+    for answer, (user_message, ai_message) in pairs:
+        user_message.known_replies_count = ai_message.known_replies_count = 0
+        results.append({
+            'index': answer['index'],
+            'conversation_id': answer['conversation_id'],
+            'status': 'ok',
+            'user_message': MessageSerializer(user_message).data,
+            'ai_message': MessageSerializer(ai_message).data,
+        })
+    for outcome in outcomes:
+        for answer in outcome['answers']:
+            if 'error' in answer:
+                results.append({
+                    'index': answer['index'],
+                    'conversation_id': answer['conversation_id'],
+                    'status': 'error',
+                    'error': answer['error'],
+                })
+    return results
+
+
+def run_batch_chat(items: List[Dict], workers: int) -> Iterator[Dict]:
+    """
+    Answer ``items`` (dicts with conversation_id and content) with at most
+    ``workers`` concurrent conversations, yielding one result per item as
+    soon as its conversation is done. Results carry the item's ``index``.
+    """
+    conversations = Conversation.objects.in_bulk({item['conversation_id'] for item in items})
+    groups = defaultdict(list)
+    for index, item in enumerate(items):
+        if item['conversation_id'] not in conversations:
+            yield {'index': index, 'conversation_id': item['conversation_id'], 'status': 'not_found'}
+            continue
+        groups[item['conversation_id']].append({'index': index, **item})
+    if not groups:
+        return
+
+    seconds = getattr(settings, 'BATCH_CHAT_DEADLINE', 0)
+    batch_deadline = Deadline(seconds) if seconds else None
+    for conversation_id in groups:
+        if conversations[conversation_id].is_archived:
+            restore_conversation(conversations[conversation_id])
+    histories = load_histories(groups)
+
+    executor = metrics.track_queue('batch_chat', ThreadPoolExecutor(
+        max_workers=min(workers, len(groups)), thread_name_prefix='batch-chat'
+    ))
+    try:
+        pending = {
+            executor.submit(
+                _chat_group, conversation_id, histories.get(conversation_id, []), group,
+                not conversations[conversation_id].title and conversation_id not in histories,
+                batch_deadline,
+            )
+            for conversation_id, group in groups.items()
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from _save([future.result() for future in done], conversations)
+    finally:
+        # When the caller stops reading (a streaming client went away) the
+        # queued groups are dropped instead of being answered for no one.
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,142 @@
+"""
+Conditional GET (ETag / Last-Modified) support for the conversation and
+message endpoints.
+
+Validators are computed with one indexed lookup each, so an unchanged
+resource is answered with 304 Not Modified without loading or serializing its
+payload. Conversation validators rest on conversations' updated_at, which
+message inserts, edits, moves and deletes move along with the counters (see
+ConversationQuerySet); payloads that include messages also take the latest
+updated_at of those messages, which reactions and bookmarks move without
+writing the conversation row. The list validators add the ChangeMarker,
+since removing the row with the latest updated_at would move it backwards.
+"""
+import hashlib
+from datetime import datetime
+from functools import partial
+from typing import Optional, Tuple
+
+from django.db.models import OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .fastpath import count_subquery
+from .models import ChangeMarker, Conversation, Message
+
+
+Validator = Tuple[str, Optional[datetime]]
+
+
+def make_validator(*parts, last_modified: Optional[datetime] = None) -> Validator:
+    """Build an (etag, last_modified) pair from the values a response depends on."""
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+    return quote_etag(digest), last_modified
+
+
+def _latest_change(queryset) -> Tuple[Optional[datetime], Optional[int]]:
+    """
+    Latest updated_at of ``queryset`` (read off its updated_at index) and the
+    ChangeMarker, with one query. (None, None) when there are no rows.
+    """
+    marker = ChangeMarker.objects.filter(name=ChangeMarker.ROWS).values('value')
+    row = queryset.order_by('-updated_at').values('updated_at').annotate(marker=Subquery(marker))[:1]
+    row = next(iter(row), None)
+    return (row['updated_at'], row['marker']) if row else (None, None)
+
+
+def _conversations_state() -> Tuple[Optional[datetime], Optional[int]]:
+    """
+    Latest updated_at of the conversation rows, including the ones marked as
+    deleted (marking moves updated_at), and the ChangeMarker, which moves when
+    the purge removes a row (which may have held the latest updated_at).
+    """
+    return _latest_change(Conversation.all_objects.all())
+
+
+def conversation_list_validator(request) -> Validator:
+    # Adding or deleting messages updates the conversation's counters and
+    # updated_at, so message counts are covered as well.
+    last, marker = _conversations_state()
+    return make_validator(request.get_full_path(), last, marker, last_modified=last)
+
+
+def conversation_detail_validator(request, pk) -> Optional[Validator]:
+    # The timestamp bound lets PostgreSQL prune partitions at run time, as in
+    # Message.objects.of_conversation; (conversation, updated_at) index.
+    messages_updated_at = Message.objects.filter(
+        conversation=OuterRef('pk'), timestamp__gte=OuterRef('first_message_at'),
+    ).order_by('-updated_at').values('updated_at')[:1]
+    row = Conversation.objects.filter(pk=pk).annotate(
+        messages_updated_at=Subquery(messages_updated_at),
+    ).values('updated_at', 'message_count', 'messages_updated_at').first()
+    if row is None:
+        return None
+    last = max(filter(None, (row['updated_at'], row['messages_updated_at'])))
+    return make_validator(
+        request.get_full_path(), row['updated_at'], row['message_count'], row['messages_updated_at'],
+        last_modified=last,
+    )
+
+
+def message_list_validator(request) -> Validator:
+    # Deleting a conversation hides its messages and advances the marker.
+    last, marker = _latest_change(Message.objects.all())
+    return make_validator(request.get_full_path(), 'messages', last, marker, last_modified=last)
+
+
+def message_detail_validator(request, pk) -> Optional[Validator]:
+    # A subquery rather than a join + GROUP BY: on the partitioned table the
+    # primary key is (id, timestamp), so grouping by id alone is rejected.
+    row = Message.objects.filter(pk=pk).annotate(
+        replies_count=count_subquery(Message.objects.all(), 'parent_message'),
+    ).values('updated_at', 'replies_count').first()
+    if row is None:
+        return None
+    return make_validator(
+        request.get_full_path(), row['updated_at'], row['replies_count'],
+        last_modified=row['updated_at'],
+    )
+
+
+def _set_validator_headers(response, etag: str, last_modified: Optional[datetime]):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Clients must revalidate instead of heuristically reusing a stale copy.
+    patch_cache_control(response, no_cache=True)
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin adding ETag/Last-Modified validation to ``list`` and
+    ``retrieve``. Subclasses set ``list_validator`` and ``detail_validator``.
+    """
+    list_validator = None
+    detail_validator = None
+
+    def _conditional(self, request, validator, render):
+        if validator is None:
+            return render()
+        etag, last_modified = validator
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if response is None:
+            response = render()
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            _set_validator_headers(response, etag, last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        validator = self.list_validator(request)
+        return self._conditional(request, validator, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            validator = self.detail_validator(request, kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (TypeError, ValueError):
+            # Malformed ids are left to the regular 404 handling.
+            validator = None
+        return self._conditional(request, validator, partial(super().retrieve, request, *args, **kwargs))
@@ -0,0 +1,170 @@
+"""
+Cache of the recent-message context windows of active conversations.
+
+Every chat turn sends the last CONVERSATION_CONTEXT_MESSAGES messages of the
+conversation to the LLM. Those windows are kept in a per-process LRU of
+CONVERSATION_CONTEXT_CACHE_SIZE conversations and, when
+CONVERSATION_CONTEXT_CACHE_ALIAS names a Django cache, in that cache too so
+worker processes share them. send_message and reply append their two new
+messages to the cached window instead of re-reading it; edits, deletes and
+branching invalidate it.
+
+Each window is stamped with the conversation's message_version, which every
+message insert, edit, move and delete bumps. A window whose stamp differs
+from the conversation row the caller already loaded (another worker changed
+its messages) is treated as a miss, so steady chatting needs no extra queries
+while windows never lag behind the messages.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from chatportal import metrics
+from .models import Conversation, Message
+
+
+class ContextCache:
+    """Thread-safe LRU of (stamp, messages) windows keyed by conversation id."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: int) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[conversation_id]
+                return None
+            self._entries.move_to_end(conversation_id)
+            return entry[1]
+
+    def set(self, conversation_id: int, window: Dict):
+        with self._lock:
+            self._entries[conversation_id] = (time.monotonic() + self.ttl, window)
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, conversation_id: int):
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local = None
+_local_lock = threading.Lock()
+
+
+def _local_cache() -> ContextCache:
+    global _local
+    with _local_lock:
+        if _local is None:
+            _local = ContextCache(
+                settings.CONVERSATION_CONTEXT_CACHE_SIZE, settings.CONVERSATION_CONTEXT_CACHE_TTL
+            )
+    return _local
+
+
+def _shared_cache():
+    alias = getattr(settings, 'CONVERSATION_CONTEXT_CACHE_ALIAS', '')
+    return caches[alias] if alias else None
+
+
+def _key(conversation_id: int) -> str:
+    return f'conversation-context:v2:{conversation_id}'
+
+
+def _window_size() -> int:
+    return settings.CONVERSATION_CONTEXT_MESSAGES
+
+
+def _as_context(messages: Iterable) -> List[Dict]:
+    return [
+        {'role': 'user' if msg.sender == 'user' else 'assistant', 'content': msg.content}
+        for msg in messages
+    ]
+
+
+def _store(conversation_id: int, window: Dict):
+    _local_cache().set(conversation_id, window)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.set(_key(conversation_id), window, settings.CONVERSATION_CONTEXT_CACHE_TTL)
+
+
+def load_context(conversation: Conversation, max_messages: int) -> List[Dict]:
+    """The last ``max_messages`` messages of ``conversation`` from the database."""
+    if conversation.is_archived:
+        messages = list(conversation.message_history)[-max_messages:] if max_messages else []
+    else:
+        messages = reversed(
+            Message.objects.of_conversation(conversation).order_by('-timestamp', '-id')[:max_messages]
+        )
+    return _as_context(messages)
+
+
+def get_context(conversation: Conversation, max_messages: int = None) -> List[Dict]:
+    """
+    The last ``max_messages`` (default CONVERSATION_CONTEXT_MESSAGES) messages
+    of ``conversation`` as role/content dicts, oldest first.
+    """
+    size = _window_size()
+    max_messages = size if max_messages is None else max_messages
+    if max_messages > size:
+        return load_context(conversation, max_messages)
+
+    window = _local_cache().get(conversation.pk)
+    source = 'local'
+    if window is None or window['stamp'] != conversation.message_version:
+        shared = _shared_cache()
+        window = shared.get(_key(conversation.pk)) if shared is not None else None
+        source = 'shared'
+        if window is not None and window['stamp'] == conversation.message_version:
+            _local_cache().set(conversation.pk, window)
+        else:
+            window = {'stamp': conversation.message_version, 'messages': load_context(conversation, size)}
+            source = 'database'
+            _store(conversation.pk, window)
+    metrics.CONTEXT_CACHE_LOOKUPS.inc(source=source)
+    return list(window['messages'][-max_messages:]) if max_messages else []
+
+
+def append_messages(conversation: Conversation, messages: List[Message]):
+    """
+    Add messages just written to ``conversation``, each with
+    Message.objects.create_and_count, to its cached window.
+    ``conversation.message_version`` must be the version from before the
+    writes; when the cached window doesn't match it the window is dropped
+    instead.
+    """
+    window = _local_cache().get(conversation.pk)
+    if window is None or window['stamp'] != conversation.message_version:
+        invalidate([conversation.pk])
+        return
+    _store(conversation.pk, {
+        'stamp': conversation.message_version + len(messages),
+        'messages': (window['messages'] + _as_context(messages))[-_window_size():],
+    })
+
+
+def invalidate(conversation_ids: Iterable[int]):
+    """Drop the cached windows of conversations whose messages changed."""
+    ids = set(conversation_ids)
+    local = _local_cache()
+    for conversation_id in ids:
+        local.delete(conversation_id)
+    shared = _shared_cache()
+    if shared is not None and ids:
+        shared.delete_many([_key(conversation_id) for conversation_id in ids])
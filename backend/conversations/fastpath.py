@@ -0,0 +1,85 @@
+"""
+Fast read path for list endpoints.
+
+With FAST_LIST_RENDERING on, list responses are built from ``values_list()``
+rows instead of ModelSerializer instances. The output keys, their order and
+the value formats match the regular serializers, so the wire format is
+unchanged; counts that the serializers compute per object are fetched with
+correlated subqueries in the same query.
+"""
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+def count_subquery(queryset, field: str, fallback=None):
+    """
+    Correlated COUNT(*) of ``queryset`` rows whose ``field`` points at the
+    outer row. ``fallback`` is used when there are none.
+    """
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+        count=Count('pk')
+    ).values('count')
+    fallbacks = [fallback] if fallback is not None else []
+    return Coalesce(
+        Subquery(counts, output_field=models.IntegerField()), *fallbacks, 0,
+        output_field=models.IntegerField()
+    )
+
+
+class FastListMixin:
+    """
+    ViewSet mixin serving ``list`` from values_list() rows.
+    ``fast_list_fields`` must follow the serializer's field order; fields that
+    are not model columns are added by ``annotate_fast_list``.
+    """
+    fast_list_fields = ()
+
+    def annotate_fast_list(self, queryset):
+        return queryset
+
+    @classmethod
+    def _row_converters(cls):
+        """(index, converter) pairs for columns whose Python value needs formatting."""
+        converters = cls.__dict__.get('_converters')
+        if converters is None:
+            converters = []
+            model = cls.queryset.model
+            for index, name in enumerate(cls.fast_list_fields):
+                try:
+                    field = model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    continue
+                if isinstance(field, models.DateTimeField):
+                    converters.append((index, serializers.DateTimeField().to_representation))
+            cls._converters = converters
+        return converters
+
+    def _build_rows(self, rows):
+        fields = self.fast_list_fields
+        converters = self._row_converters()
+        if not converters:
+            return [dict(zip(fields, row)) for row in rows]
+        data = []
+        for row in rows:
+            row = list(row)
+            for index, convert in converters:
+                if row[index] is not None:
+                    row[index] = convert(row[index])
+            data.append(dict(zip(fields, row)))
+        return data
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'FAST_LIST_RENDERING', False):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.annotate_fast_list(self.filter_queryset(self.get_queryset()))
+        rows = queryset.values_list(*self.fast_list_fields)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self._build_rows(page))
+        return Response(self._build_rows(rows))
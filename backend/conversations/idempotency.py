@@ -0,0 +1,121 @@
+"""
+Idempotency-Key support for the mutating chat endpoints.
+
+The first request with a given key runs normally and its response is stored
+in IdempotencyKey. Retries with the same key within IDEMPOTENCY_KEY_TTL get
+the stored response back (with ``Idempotent-Replayed: true``) without creating
+messages or calling the LLM again; a retry that arrives while the original is
+still running waits for it. Reusing a key with a different request body is
+rejected with 422. Server errors are not stored, so those requests can be
+retried. A key left in flight for longer than IDEMPOTENCY_LEASE (its worker
+died) is claimed by the next request.
+"""
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.1
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _replay(record) -> Response:
+    response = Response(record['response'], status=record['status_code'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(key: str, request_hash: str) -> Tuple[Optional[datetime], Optional[Response]]:
+    """
+    Claim ``key`` for this request. Returns (created_at of our row, None) when
+    claimed, otherwise (None, the Response to send: a replay or an error).
+    """
+    ttl = timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    lease = timedelta(seconds=settings.IDEMPOTENCY_LEASE)
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        try:
+            with transaction.atomic():
+                claimed = IdempotencyKey.objects.create(key=key, request_hash=request_hash)
+            return claimed.created_at, None
+        except IntegrityError:
+            pass
+        record = IdempotencyKey.objects.filter(key=key).values(
+            'request_hash', 'status_code', 'response', 'created_at', 'completed_at'
+        ).first()
+        if record is None:
+            continue
+        age = timezone.now() - record['created_at']
+        if age > ttl or (record['completed_at'] is None and age > lease):
+            # Expired, or abandoned in flight; whoever deletes this row first re-claims.
+            IdempotencyKey.objects.filter(key=key, created_at=record['created_at']).delete()
+            continue
+        if record['request_hash'] != request_hash:
+            return None, Response(
+                {'error': 'Idempotency-Key was already used with a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if record['completed_at'] is not None:
+            return None, _replay(record)
+        if time.monotonic() >= deadline:
+            return None, Response(
+                {'error': 'A request with this Idempotency-Key is still in progress'},
+                status=status.HTTP_409_CONFLICT
+            )
+        time.sleep(POLL_INTERVAL)
+
+
+def idempotent(view):
+    """
+    Make a viewset action honor the ``Idempotency-Key`` request header.
+    Requests without the header are not affected.
+    """
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        header = request.META.get(HEADER)
+        if not header:
+            return view(self, request, *args, **kwargs)
+        if len(header) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        key = _hash(header, request.method, request.path)
+        claimed_at, replay = _claim(key, _hash(request.data))
+        if replay is not None:
+            return replay
+
+        # Only touch our own row: if our lease ran out, another request owns the key now.
+        own = IdempotencyKey.objects.filter(key=key, created_at=claimed_at)
+        try:
+            response = view(self, request, *args, **kwargs)
+        except BaseException:
+            own.delete()
+            raise
+        if response.status_code >= 500 or not isinstance(response, Response):
+            own.delete()
+            return response
+        now = timezone.now()
+        own.update(
+            status_code=response.status_code, response=response.data, completed_at=now
+        )
+        IdempotencyKey.objects.filter(
+            created_at__lt=now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        ).delete()
+        return response
+    return wrapper
@@ -0,0 +1,59 @@
+"""
+Management command that moves old ended conversations into the cold archive.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from conversations.archive import archive_conversation
+from conversations.models import Conversation
+
+
+class Command(BaseCommand):
+    help = 'Compresses the messages of old ended conversations into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int,
+            default=getattr(settings, 'CONVERSATION_ARCHIVE_AFTER_DAYS', 365),
+            help='Archive conversations ended more than this many days ago'
+        )
+        parser.add_argument('--limit', type=int, help='Maximum number of conversations to archive')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Conversations selected per round (default: 100)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        candidates = Conversation.objects.filter(
+            status='ended',
+            is_archived=False,
+            end_timestamp__lt=cutoff,
+        ).order_by('id')
+        if options['dry_run']:
+            self.stdout.write(f'{candidates.count()} conversations ended before {cutoff:%Y-%m-%d} would be archived')
+            return
+
+        archived = 0
+        last_id = 0
+        start = time.monotonic()
+        while options['limit'] is None or archived < options['limit']:
+            batch_size = options['batch_size']
+            if options['limit'] is not None:
+                batch_size = min(batch_size, options['limit'] - archived)
+            batch = list(candidates.filter(id__gt=last_id).only('id')[:batch_size])
+            if not batch:
+                break
+            for conversation in batch:
+                # One transaction per conversation keeps locks short.
+                archive_conversation(conversation)
+            archived += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'Archived {archived} conversations (last id {last_id})')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} conversations in {time.monotonic() - start:.1f}s'
+        ))
@@ -107,6 +107,8 @@ class Command(BaseCommand):
             timestamp=timezone.now() - timedelta(hours=2, minutes=1)
         )
 
+        Conversation.objects.filter(id__in=[conv1.id, conv2.id, conv3.id]).reconcile_counters()
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'Successfully created {Conversation.objects.count()} conversations with sample data!'
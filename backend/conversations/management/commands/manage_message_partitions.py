@@ -0,0 +1,54 @@
+"""
+Management command that maintains the monthly partitions of the message table.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from conversations.partitions import (
+    add_months,
+    create_partition,
+    default_partition_months,
+    detach_partitions,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+    month_start,
+    partition_name,
+)
+
+
+class Command(BaseCommand):
+    help = 'Creates upcoming monthly message partitions and detaches old ones (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='Create partitions up to this many months ahead (default: 3)')
+        parser.add_argument('--detach-older-than', type=int, metavar='MONTHS',
+                            help='Detach partitions whose month ended more than MONTHS months ago')
+        parser.add_argument('--drop', action='store_true',
+                            help='Drop detached partitions instead of keeping them as standalone tables')
+
+    def handle(self, *args, **options):
+        if not is_partitioned(connection):
+            raise CommandError('The message table is not partitioned (PostgreSQL migrations not applied?)')
+
+        this_month = month_start(timezone.now())
+        created = ensure_partitions(connection, this_month, add_months(this_month, options['months_ahead']))
+        # Rows outside every partition land in the default one; give them a home.
+        for month in default_partition_months(connection):
+            if create_partition(connection, month):
+                created.append(partition_name(month))
+        for name in created:
+            self.stdout.write(f'Created partition {name}')
+
+        if options['detach_older_than'] is not None:
+            before = add_months(this_month, -options['detach_older_than'])
+            for name in detach_partitions(connection, before, drop=options['drop']):
+                self.stdout.write(f"{'Dropped' if options['drop'] else 'Detached'} partition {name}")
+
+        partitions = list_partitions(connection)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(partitions)} monthly partitions attached'
+            + (f' ({partitions[0][0]} .. {partitions[-1][0]})' if partitions else '')
+        ))
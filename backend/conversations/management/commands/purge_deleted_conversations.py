@@ -0,0 +1,48 @@
+"""
+Management command that purges conversations marked as deleted.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from conversations.models import Conversation
+from conversations.purge import purge_conversation
+
+
+class Command(BaseCommand):
+    help = 'Deletes the messages and rows of conversations marked as deleted, in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int,
+            default=getattr(settings, 'CONVERSATION_PURGE_CHUNK_SIZE', 5000),
+            help='Messages deleted per statement'
+        )
+        parser.add_argument('--interval', type=int,
+                            help='Keep running and purge every N seconds (default: purge once)')
+
+    def purge(self, chunk_size):
+        conversations = messages = 0
+        pending = Conversation.all_objects.filter(deleted_at__isnull=False).order_by('deleted_at')
+        for conversation_id in list(pending.values_list('id', flat=True)):
+            messages += purge_conversation(conversation_id, chunk_size=chunk_size)
+            conversations += 1
+        return conversations, messages
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.monotonic()
+            conversations, messages = self.purge(options['chunk_size'])
+            self.stdout.write(
+                f'Purged {conversations} deleted conversations ({messages} messages) '
+                f'in {time.monotonic() - start:.1f}s'
+            )
+            if not options['interval']:
+                break
+            close_old_connections()
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
@@ -0,0 +1,112 @@
+"""
+Management command to (re)run AI analysis over many conversations.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from conversations.analysis import analyze_conversations, save_analyses
+from conversations.models import Conversation
+from conversations.snapshots import refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Re-runs AI analysis (summary, topics, sentiment, action items) over conversations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', default='ended', help='Conversation status to select (default: ended)')
+        parser.add_argument('--since', help='Only conversations started at or after this ISO datetime')
+        parser.add_argument('--until', help='Only conversations started at or before this ISO datetime')
+        parser.add_argument('--ids', help='Comma-separated conversation ids')
+        parser.add_argument('--missing-summary', action='store_true', help='Only conversations without a summary')
+        parser.add_argument('--limit', type=int, help='Maximum number of conversations to process')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent LLM calls (default: 8)')
+        parser.add_argument('--pack', type=int, default=1,
+                            help='Analyze up to this many short conversations per prompt (default: 1)')
+        parser.add_argument('--pack-max-chars', type=int, default=2000,
+                            help='Only conversations shorter than this are packed (default: 2000)')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Conversations written back per bulk_update (default: 100)')
+        parser.add_argument('--checkpoint', help='File recording progress; an existing checkpoint is resumed')
+
+    def get_queryset(self, options):
+        conversations = Conversation.objects.all()
+        if options['status'] != 'all':
+            conversations = conversations.filter(status=options['status'])
+        for option, lookup in (('since', 'start_timestamp__gte'), ('until', 'start_timestamp__lte')):
+            if options[option]:
+                value = parse_datetime(options[option])
+                if value is None:
+                    raise CommandError(f'Invalid --{option} datetime: {options[option]}')
+                conversations = conversations.filter(**{lookup: value})
+        if options['ids']:
+            conversations = conversations.filter(id__in=[int(i) for i in options['ids'].split(',')])
+        if options['missing_summary']:
+            conversations = conversations.filter(summary='')
+        return conversations.order_by('id')
+
+    def read_checkpoint(self, path):
+        if not path or not os.path.exists(path):
+            return {'last_id': 0, 'processed': 0}
+        with open(path) as fh:
+            return json.load(fh)
+
+    def write_checkpoint(self, path, checkpoint):
+        if not path:
+            return
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(checkpoint, fh)
+        os.replace(tmp_path, path)
+
+    def handle(self, *args, **options):
+        checkpoint = self.read_checkpoint(options['checkpoint'])
+        conversations = self.get_queryset(options).filter(id__gt=checkpoint['last_id'])
+        total = conversations.count()
+        if options['limit']:
+            total = min(total, options['limit'])
+        if checkpoint['last_id']:
+            self.stdout.write(f"Resuming after conversation {checkpoint['last_id']}")
+        self.stdout.write(f'Analyzing {total} conversations with {options["workers"]} workers...')
+
+        # Enough conversations per round to keep every worker busy.
+        chunk_size = max(options['batch_size'], options['workers'] * max(options['pack'], 1) * 4)
+        processed = analyzed = 0
+        last_id = checkpoint['last_id']
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while processed < total:
+                chunk = list(conversations.filter(id__gt=last_id)[:min(chunk_size, total - processed)])
+                if not chunk:
+                    break
+                updated = analyze_conversations(
+                    chunk, executor,
+                    pack_size=options['pack'],
+                    pack_max_chars=options['pack_max_chars'],
+                )
+                save_analyses(updated, batch_size=options['batch_size'])
+                refresh_snapshots(conv.id for conv in updated)
+
+                processed += len(chunk)
+                analyzed += len(updated)
+                last_id = chunk[-1].id
+                checkpoint = {'last_id': last_id, 'processed': checkpoint['processed'] + len(chunk)}
+                self.write_checkpoint(options['checkpoint'], checkpoint)
+
+                elapsed = time.monotonic() - start
+                self.stdout.write(
+                    f'Processed {processed}/{total} conversations '
+                    f'({processed / elapsed:.1f}/s, last id {last_id})'
+                )
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Analyzed {analyzed} of {processed} conversations in {elapsed:.1f}s '
+                f'({processed / elapsed if elapsed else 0:.1f} conversations/s)'
+            )
+        )
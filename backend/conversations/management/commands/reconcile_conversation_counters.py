@@ -0,0 +1,44 @@
+"""
+Management command that repairs the denormalized activity counters of conversations.
+"""
+from django.core.management.base import BaseCommand
+
+from conversations.models import Conversation, ConversationQuerySet
+
+
+class Command(BaseCommand):
+    help = 'Recomputes message_count, branches_count, last_message_at and first_message_at where they have drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Conversations checked per query (default: 1000)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted conversations')
+
+    def drifted(self, ids):
+        """Ids whose stored counters differ from the tables."""
+        expressions = ConversationQuerySet.counter_expressions()
+        expected = {f'expected_{name}': expressions[name] for name in Conversation.COUNTER_FIELDS}
+        rows = Conversation.objects.filter(id__in=ids).annotate(**expected).values_list(
+            'id', *Conversation.COUNTER_FIELDS, *expected
+        )
+        size = len(Conversation.COUNTER_FIELDS)
+        return [row[0] for row in rows if row[1:1 + size] != row[1 + size:]]
+
+    def handle(self, *args, **options):
+        conversations = Conversation.objects.order_by('id')
+        checked = fixed = 0
+        last_id = 0
+        while True:
+            ids = list(conversations.filter(id__gt=last_id).values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            last_id = ids[-1]
+            checked += len(ids)
+            drifted = self.drifted(ids)
+            if drifted and not options['dry_run']:
+                # Recomputed inside the UPDATE, so writes made since the check count too.
+                Conversation.objects.filter(id__in=drifted).reconcile_counters()
+            fixed += len(drifted)
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Found' if options['dry_run'] else 'Fixed'} {fixed} drifted conversations out of {checked}"
+        ))
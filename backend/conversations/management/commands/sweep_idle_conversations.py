@@ -0,0 +1,134 @@
+"""
+Management command that ends idle conversations and analyzes them in the background.
+
+A conversation is ended before it is analyzed, so an analysis that fails (no
+provider answered) or is interrupted (the sweeper died) leaves it ended
+without a summary. Every sweep therefore also picks up ended conversations
+that still have no summary --retry-minutes after they were claimed.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from chatportal import metrics
+from conversations.analysis import analyze_conversations, save_analyses
+from conversations.models import Conversation, Message
+from conversations.snapshots import refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Ends conversations idle past a threshold and generates their summaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--idle-minutes', type=int,
+            default=getattr(settings, 'CONVERSATION_IDLE_TIMEOUT_MINUTES', 60),
+            help='Minutes without activity after which a conversation is ended'
+        )
+        parser.add_argument('--interval', type=int,
+                            help='Keep running and sweep every N seconds (default: sweep once)')
+        parser.add_argument('--batch-size', type=int, default=50, help='Conversations ended per batch (default: 50)')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent LLM calls (default: 4)')
+        parser.add_argument('--pack', type=int, default=1,
+                            help='Analyze up to this many short conversations per prompt (default: 1)')
+        parser.add_argument('--retry-minutes', type=int, default=10,
+                            help='Analyze ended conversations still without a summary after this many minutes '
+                                 '(default: 10)')
+
+    def claim_batch(self, cutoff, batch_size):
+        """
+        Mark a batch of idle conversations as ended and return them.
+        Rows are locked with SKIP LOCKED so several sweepers can run at once.
+        """
+        recent_messages = Message.objects.filter(conversation=OuterRef('pk'), timestamp__gte=cutoff)
+        idle = Conversation.objects.filter(
+            status='active',
+            start_timestamp__lt=cutoff,
+        ).exclude(Exists(recent_messages)).order_by('start_timestamp')
+        with transaction.atomic():
+            batch = list(idle.select_for_update(skip_locked=True)[:batch_size])
+            if not batch:
+                return []
+            now = timezone.now()
+            Conversation.objects.filter(id__in=[conv.id for conv in batch]).update(
+                status='ended', end_timestamp=now, updated_at=now
+            )
+        for conv in batch:
+            conv.status = 'ended'
+            conv.end_timestamp = now
+        return batch
+
+    def claim_unanalyzed(self, retry_cutoff, batch_size, after_id):
+        """
+        Claim a batch of ended conversations with messages (archived ones
+        included) but no summary,
+        claimed (updated_at) before ``retry_cutoff``, in id order after
+        ``after_id``. Claiming touches updated_at, so a batch being analyzed
+        by another sweeper is left alone.
+        """
+        has_messages = Message.objects.filter(conversation=OuterRef('pk'))
+        unanalyzed = Conversation.objects.filter(
+            status='ended',
+            summary='',
+            updated_at__lt=retry_cutoff,
+            id__gt=after_id,
+        ).filter(Exists(has_messages) | Q(is_archived=True, message_count__gt=0)).order_by('id')
+        with transaction.atomic():
+            batch = list(unanalyzed.select_for_update(skip_locked=True)[:batch_size])
+            if batch:
+                Conversation.objects.filter(id__in=[conv.id for conv in batch]).update(updated_at=timezone.now())
+        return batch
+
+    def analyze(self, batch, executor, options):
+        """Analyze and save a batch; returns how many conversations got an analysis."""
+        metrics.BACKGROUND_QUEUE_DEPTH.set(len(batch), queue='idle_sweeper')
+        metrics.REGISTRY.maybe_flush()
+        updated = analyze_conversations(batch, executor, pack_size=options['pack'])
+        save_analyses(updated)
+        refresh_snapshots(conv.id for conv in updated)
+        metrics.BACKGROUND_QUEUE_DEPTH.set(0, queue='idle_sweeper')
+        return len(updated)
+
+    def sweep(self, executor, options):
+        now = timezone.now()
+        cutoff = now - timedelta(minutes=options['idle_minutes'])
+        retry_cutoff = now - timedelta(minutes=options['retry_minutes'])
+        ended = analyzed = 0
+        while True:
+            batch = self.claim_batch(cutoff, options['batch_size'])
+            if not batch:
+                break
+            ended += len(batch)
+            analyzed += self.analyze(batch, executor, options)
+        last_id = 0
+        while True:
+            batch = self.claim_unanalyzed(retry_cutoff, options['batch_size'], last_id)
+            if not batch:
+                break
+            last_id = batch[-1].id
+            analyzed += self.analyze(batch, executor, options)
+        metrics.REGISTRY.flush()
+        return ended, analyzed
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                start = time.monotonic()
+                ended, analyzed = self.sweep(executor, options)
+                self.stdout.write(
+                    f'Ended {ended} idle conversations and analyzed {analyzed} '
+                    f'in {time.monotonic() - start:.1f}s'
+                )
+                if not options['interval']:
+                    break
+                close_old_connections()
+                try:
+                    time.sleep(options['interval'])
+                except KeyboardInterrupt:
+                    break
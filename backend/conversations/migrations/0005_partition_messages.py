@@ -0,0 +1,95 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+# Partitioned tables need the partition key in their primary key, and a
+# foreign key can't reference a partitioned table by id alone, so the
+# self-reference of parent_message is kept by Django only (db_constraint=False).
+CREATE_PARTITIONED_TABLE = '''
+ALTER TABLE conversations_message RENAME TO conversations_message_unpartitioned;
+CREATE SEQUENCE conversations_message_partitioned_id_seq;
+CREATE TABLE conversations_message (
+    id bigint NOT NULL DEFAULT nextval('conversations_message_partitioned_id_seq'),
+    content text NOT NULL,
+    sender varchar(10) NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    conversation_id bigint NOT NULL,
+    is_bookmarked boolean NOT NULL,
+    parent_message_id bigint NULL,
+    reactions jsonb NOT NULL,
+    updated_at timestamp with time zone NOT NULL,
+    CONSTRAINT conversations_message_partitioned_pkey PRIMARY KEY (id, "timestamp")
+) PARTITION BY RANGE ("timestamp");
+CREATE TABLE conversations_message_default PARTITION OF conversations_message DEFAULT;
+'''
+
+COPY_AND_SWAP = '''
+INSERT INTO conversations_message (
+    id, content, sender, "timestamp", created_at, conversation_id,
+    is_bookmarked, parent_message_id, reactions, updated_at
+)
+SELECT
+    id, content, sender, "timestamp", created_at, conversation_id,
+    is_bookmarked, parent_message_id, reactions, updated_at
+FROM conversations_message_unpartitioned;
+SELECT setval('conversations_message_partitioned_id_seq', COALESCE(MAX(id), 0) + 1, false)
+FROM conversations_message;
+DROP TABLE conversations_message_unpartitioned;
+ALTER SEQUENCE conversations_message_partitioned_id_seq RENAME TO conversations_message_id_seq;
+ALTER SEQUENCE conversations_message_id_seq OWNED BY conversations_message.id;
+ALTER TABLE conversations_message
+    RENAME CONSTRAINT conversations_message_partitioned_pkey TO conversations_message_pkey;
+ALTER TABLE conversations_message
+    ADD CONSTRAINT conversations_message_conversation_id_fk
+    FOREIGN KEY (conversation_id) REFERENCES conversations_conversation (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX conversations_message_conversation_ts_idx ON conversations_message (conversation_id, "timestamp");
+CREATE INDEX conversations_message_parent_message_id_idx ON conversations_message (parent_message_id);
+CREATE INDEX conversations_message_updated_at_idx ON conversations_message (updated_at);
+'''
+
+
+def partition_messages(apps, schema_editor):
+    """
+    Rebuild conversations_message as a table partitioned by month and copy
+    the existing rows over. Runs in one transaction; on large tables run it
+    in a maintenance window.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    from conversations.partitions import add_months, ensure_partitions
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT MIN("timestamp") FROM conversations_message')
+        oldest = cursor.fetchone()[0]
+        cursor.execute(CREATE_PARTITIONED_TABLE)
+    now = timezone.now()
+    ensure_partitions(connection, oldest or now, add_months(now, 3))
+    with connection.cursor() as cursor:
+        cursor.execute(COPY_AND_SWAP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0004_message_updated_at'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(partition_messages),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='message',
+                    name='parent_message',
+                    field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='replies', to='conversations.message'),
+                ),
+            ],
+        ),
+    ]
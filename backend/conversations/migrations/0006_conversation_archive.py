@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0005_partition_messages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationArchive',
+            fields=[
+                ('conversation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='conversations.conversation')),
+                ('codec', models.CharField(choices=[('zstd', 'Zstandard'), ('zlib', 'zlib')], max_length=10)),
+                ('payload', models.BinaryField()),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('original_size', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='is_archived',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:24
+
+from django.db import migrations, models
+
+
+# Trigram indexes matching the SQL of Django's icontains lookup on PostgreSQL
+# (UPPER(column::text) LIKE UPPER('%term%')), so admin search can use them.
+TRIGRAM_INDEXES = [
+    ('conversations_message_content_trgm_idx', 'conversations_message', 'content'),
+    ('conversations_conversation_title_trgm_idx', 'conversations_conversation', 'title'),
+    ('conversations_conversation_summary_trgm_idx', 'conversations_conversation', 'summary'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    Create the pg_trgm search indexes. Skipped on other databases and when
+    the pg_trgm extension isn't available on the server (search still works,
+    with sequential scans).
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, table, column in TRIGRAM_INDEXES:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+                f'USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for name, _, _ in TRIGRAM_INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0006_conversation_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['start_timestamp', 'id'], name='conversation_start_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['timestamp', 'id'], name='message_timestamp_id_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:29
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    """Initial values; the same computation as ConversationQuerySet.reconcile_counters."""
+    Conversation = apps.get_model('conversations', 'Conversation')
+    Message = apps.get_model('conversations', 'Message')
+    ConversationArchive = apps.get_model('conversations', 'ConversationArchive')
+    messages = Message.objects.filter(conversation=OuterRef('pk')).order_by().values('conversation')
+    branches = Conversation.objects.filter(
+        parent_conversation=OuterRef('pk'), deleted_at__isnull=True
+    ).order_by().values('parent_conversation')
+    Conversation.objects.update(
+        message_count=Coalesce(
+            Subquery(messages.annotate(count=Count('pk')).values('count')),
+            Subquery(ConversationArchive.objects.filter(conversation=OuterRef('pk')).values('message_count')),
+            0,
+            output_field=models.IntegerField()
+        ),
+        branches_count=Coalesce(
+            Subquery(branches.annotate(count=Count('pk')).values('count')), 0, output_field=models.IntegerField()
+        ),
+        last_message_at=Subquery(messages.annotate(last=Max('timestamp')).values('last')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0009_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='branches_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(models.OrderBy(models.F('last_message_at'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), name='conversation_activity_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:02
+
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+
+
+def backfill_first_message_at(apps, schema_editor):
+    """Archived conversations are filled in by 0012 from their archives."""
+    Conversation = apps.get_model('conversations', 'Conversation')
+    Message = apps.get_model('conversations', 'Message')
+    messages = Message.objects.filter(conversation=OuterRef('pk')).order_by().values('conversation')
+    Conversation.objects.update(
+        first_message_at=Subquery(messages.annotate(first=Min('timestamp')).values('first'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0010_conversation_activity_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='first_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_first_message_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:09
+
+import json
+
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+from conversations.archive import decompress
+
+
+def backfill_message_range(apps, schema_editor):
+    """
+    Read the timestamp range of every archive from its payload, and give the
+    archived conversations the first_message_at/last_message_at that 0010 and
+    0011 could not compute (their messages were not in the message table).
+    """
+    Conversation = apps.get_model('conversations', 'Conversation')
+    ConversationArchive = apps.get_model('conversations', 'ConversationArchive')
+    archives = ConversationArchive.objects.filter(last_message_at__isnull=True).only('conversation_id', 'codec', 'payload')
+    for archive in archives.iterator(chunk_size=100):
+        rows = json.loads(decompress(archive.codec, bytes(archive.payload)))
+        timestamps = [parse_datetime(row['timestamp']) for row in rows]
+        if not timestamps:
+            continue
+        first, last = min(timestamps), max(timestamps)
+        ConversationArchive.objects.filter(pk=archive.pk).update(first_message_at=first, last_message_at=last)
+        Conversation.objects.filter(pk=archive.conversation_id, is_archived=True).update(
+            first_message_at=first, last_message_at=last
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0011_conversation_first_message_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationarchive',
+            name='first_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversationarchive',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_message_range, migrations.RunPython.noop),
+    ]
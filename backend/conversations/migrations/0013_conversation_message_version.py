@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0012_archive_message_range'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='message_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
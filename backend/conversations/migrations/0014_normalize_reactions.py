@@ -0,0 +1,45 @@
+from django.db import migrations
+
+from conversations.models import REACTION_COUNT_SQL, reaction_count
+
+# Rows whose reactions are not an object of non-negative integers.
+NORMALIZE_REACTIONS = r'''
+UPDATE conversations_message SET reactions = CASE
+    WHEN jsonb_typeof(reactions) = 'object' THEN (
+        SELECT COALESCE(jsonb_object_agg(key, {count}), '{{}}'::jsonb) FROM jsonb_each(reactions)
+    )
+    ELSE '{{}}'::jsonb
+END
+WHERE jsonb_typeof(reactions) <> 'object' OR EXISTS (
+    SELECT 1 FROM jsonb_each(reactions) WHERE value::text !~ '^\d{{1,9}}$'
+)
+'''.format(count=REACTION_COUNT_SQL % "(value #>> '{}')")
+
+
+def normalize_reactions(apps, schema_editor):
+    """Rewrite legacy reaction counters (strings, floats, ...) as integers."""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(NORMALIZE_REACTIONS)
+        return
+    Message = apps.get_model('conversations', 'Message')
+    changed = []
+    for message in Message.objects.only('id', 'reactions').iterator(chunk_size=1000):
+        if isinstance(message.reactions, dict):
+            reactions = {emoji: reaction_count(value) for emoji, value in message.reactions.items()}
+        else:
+            reactions = {}
+        if reactions != message.reactions:
+            message.reactions = reactions
+            changed.append(message)
+    Message.objects.bulk_update(changed, ['reactions'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0013_conversation_message_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_reactions, migrations.RunPython.noop),
+    ]
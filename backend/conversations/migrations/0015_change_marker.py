@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0014_normalize_reactions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeMarker',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
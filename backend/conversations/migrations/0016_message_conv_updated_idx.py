@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0015_change_marker'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'updated_at'], name='message_conv_updated_idx'),
+        ),
+    ]
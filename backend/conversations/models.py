@@ -1,9 +1,123 @@
 """
 Database models for conversations and messages.
 """
-from django.db import models
+import re
+
+from django.db import connections, models, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Greatest, Least
 from django.utils import timezone
 
+# Leading digits of a stored reaction counter. Legacy rows may hold strings,
+# floats or other JSON values; whatever doesn't start with (at most 9) digits
+# counts as 0.
+REACTION_COUNT_RE = re.compile(r'\s*(\d{1,9})(?!\d)')
+REACTION_COUNT_SQL = r"COALESCE(substring(%s from '^\s*(\d{1,9})(?!\d)')::int, 0)"
+
+
+def reaction_count(value) -> int:
+    """A stored reaction counter as an int, read like REACTION_COUNT_SQL does."""
+    match = REACTION_COUNT_RE.match(str(value))
+    return int(match.group(1)) if match else 0
+
+
+class ConversationQuerySet(models.QuerySet):
+    """
+    QuerySet maintaining the denormalized activity counters of conversations.
+    Call these in the same transaction as the writes they account for.
+    Removing messages also advances the ChangeMarker.
+    """
+
+    def add_messages(self, count: int, last_message_at, first_message_at=None) -> int:
+        first_message_at = first_message_at or last_message_at
+        return self.update(
+            message_count=F('message_count') + count,
+            first_message_at=Least(Coalesce(F('first_message_at'), first_message_at), first_message_at),
+            last_message_at=Greatest(Coalesce(F('last_message_at'), last_message_at), last_message_at),
+            message_version=F('message_version') + 1,
+            updated_at=timezone.now()
+        )
+
+    def include_messages_since(self, timestamp) -> int:
+        """Lower first_message_at to ``timestamp`` for messages moved in or re-dated."""
+        return self.update(
+            first_message_at=Least(Coalesce(F('first_message_at'), timestamp), timestamp),
+            message_version=F('message_version') + 1,
+            updated_at=timezone.now()
+        )
+
+    def remove_messages(self, count: int) -> int:
+        updated = self.update(
+            message_count=Greatest(F('message_count') - count, 0),
+            last_message_at=Subquery(
+                Message.objects.filter(conversation=OuterRef('pk')).order_by('-timestamp').values('timestamp')[:1]
+            ),
+            message_version=F('message_version') + 1,
+            updated_at=timezone.now()
+        )
+        record_change(self.db)
+        return updated
+
+    def touch(self) -> int:
+        """
+        Record a change to the conversations' messages that leaves the
+        counters alone (edits, moves). Bumps message_version, which stamps
+        the context windows (see context_cache), and updated_at. Reactions
+        and bookmarks aren't part of either and only move the messages'
+        updated_at, which the conditional GET validators read.
+        """
+        return self.update(message_version=F('message_version') + 1, updated_at=timezone.now())
+
+    def add_branches(self, count: int = 1) -> int:
+        return self.update(
+            branches_count=Greatest(F('branches_count') + count, 0),
+            updated_at=timezone.now()
+        )
+
+    @staticmethod
+    def counter_expressions() -> dict:
+        """The counters of each conversation computed from the tables."""
+        messages = Message.objects.filter(conversation=OuterRef('pk')).order_by()
+        branches = Conversation.objects.filter(parent_conversation=OuterRef('pk')).order_by()
+        archived = ConversationArchive.objects.filter(conversation=OuterRef('pk'))
+        return {
+            'message_count': Coalesce(
+                Subquery(messages.values('conversation').annotate(count=Count('pk')).values('count')),
+                Subquery(archived.values('message_count')),
+                0,
+                output_field=models.IntegerField()
+            ),
+            'branches_count': Coalesce(
+                Subquery(branches.values('parent_conversation').annotate(count=Count('pk')).values('count')),
+                0,
+                output_field=models.IntegerField()
+            ),
+            # Archived messages are not in the message table; their archive
+            # records the range of their timestamps.
+            'first_message_at': Case(
+                When(is_archived=True, then=Subquery(archived.values('first_message_at'))),
+                default=Subquery(messages.order_by('timestamp').values('timestamp')[:1])
+            ),
+            'last_message_at': Case(
+                When(is_archived=True, then=Subquery(archived.values('last_message_at'))),
+                default=Subquery(messages.order_by('-timestamp').values('timestamp')[:1])
+            ),
+            # Not derived from the tables: reconciling leaves it as it is.
+            'message_version': F('message_version'),
+        }
+
+    def reconcile_counters(self) -> int:
+        """Recompute the counters from the message and conversation tables."""
+        return self.update(**self.counter_expressions(), updated_at=timezone.now())
+
+
+class ConversationManager(models.Manager.from_queryset(ConversationQuerySet)):
+    """Default manager; hides conversations marked as deleted (see conversations.purge)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 
 class Conversation(models.Model):
     """
@@ -24,6 +138,7 @@ class Conversation(models.Model):
     action_items = models.JSONField(default=list, blank=True, null=True)
     share_token = models.CharField(max_length=64, unique=True, null=True, blank=True)
     is_shared = models.BooleanField(default=False)
+    is_archived = models.BooleanField(default=False, db_index=True)
     parent_conversation = models.ForeignKey(
         'self',
         on_delete=models.SET_NULL,
@@ -32,20 +147,163 @@ class Conversation(models.Model):
         related_name='branches'
     )
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Set when the conversation is deleted; its rows are purged in the background.
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    # Denormalized activity, maintained by ConversationQuerySet; archived
+    # messages still count. `manage.py reconcile_conversation_counters` fixes drift.
+    message_count = models.PositiveIntegerField(default=0)
+    branches_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    # Never later than the oldest message (deletes don't raise it); bounds
+    # message queries so PostgreSQL skips older partitions. Null: unknown.
+    first_message_at = models.DateTimeField(null=True, blank=True)
+    # Bumped by every change to the conversation's messages; stamps the
+    # cached context windows (see conversations.context_cache).
+    message_version = models.PositiveBigIntegerField(default=0)
+
+    objects = ConversationManager()
+    all_objects = ConversationQuerySet.as_manager()
 
     class Meta:
         ordering = ['-start_timestamp']
+        indexes = [
+            # Newest-first listings (API and admin changelist).
+            models.Index(fields=['start_timestamp', 'id'], name='conversation_start_id_idx'),
+            models.Index(fields=['deleted_at'], name='conversation_deleted_idx',
+                         condition=models.Q(deleted_at__isnull=False)),
+            # Most recently active first (?ordering=activity).
+            models.Index(F('last_message_at').desc(nulls_last=True), F('id').desc(),
+                         name='conversation_activity_idx'),
+        ]
+
+    COUNTER_FIELDS = ('message_count', 'branches_count', 'last_message_at', 'first_message_at', 'message_version')
 
     def __str__(self):
         return f"{self.title or 'Untitled'} - {self.status}"
 
+    def save(self, *args, **kwargs):
+        # The counters are only written with F() updates; saving an instance
+        # loaded before a concurrent message insert must not overwrite them.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            record_change(self._state.db)
+
     def end_conversation(self):
         """Mark conversation as ended."""
         self.status = 'ended'
         self.end_timestamp = timezone.now()
         self.save()
 
+    @property
+    def message_history(self):
+        """
+        The conversation's messages in order, rehydrated from the cold archive
+        when the conversation has been archived.
+        """
+        if self.is_archived:
+            from .archive import archived_messages
+            return archived_messages(self)
+        if 'messages' in getattr(self, '_prefetched_objects_cache', {}):
+            return self.messages.all()
+        return Message.objects.of_conversation(self)
+
+
+class MessageQuerySet(models.QuerySet):
+    """QuerySet with set-based message operations."""
+
+    def of_conversation(self, conversation: Conversation) -> 'MessageQuerySet':
+        """
+        The messages of ``conversation``. The lower timestamp bound lets
+        PostgreSQL prune the month partitions older than its first message.
+        """
+        messages = self.filter(conversation=conversation)
+        if conversation.first_message_at is not None:
+            messages = messages.filter(timestamp__gte=conversation.first_message_at)
+        return messages
+
+    def create_and_count(self, **kwargs) -> 'Message':
+        """Create a message and update its conversation's counters in one transaction."""
+        with transaction.atomic(using=self.db):
+            message = self.create(**kwargs)
+            Conversation.all_objects.using(self.db).filter(pk=message.conversation_id).add_messages(
+                1, message.timestamp
+            )
+        return message
+
+    def bulk_create_and_count(self, messages: list) -> list:
+        """bulk_create ``messages`` and update their conversations' counters in one transaction."""
+        added = {}
+        for message in messages:
+            count, first, last = added.get(message.conversation_id, (0, message.timestamp, message.timestamp))
+            added[message.conversation_id] = (count + 1, min(first, message.timestamp), max(last, message.timestamp))
+        with transaction.atomic(using=self.db):
+            created = self.bulk_create(messages)
+            for conversation_id, (count, first, last) in added.items():
+                Conversation.all_objects.using(self.db).filter(pk=conversation_id).add_messages(count, last, first)
+        return created
+
+    def delete_and_count(self) -> int:
+        """Delete the selected messages and update their conversations' counters."""
+        with transaction.atomic(using=self.db):
+            removed = dict(
+                self.order_by().values('conversation_id').annotate(count=Count('id')).values_list('conversation_id', 'count')
+            )
+            self.delete()
+            for conversation_id, count in removed.items():
+                Conversation.all_objects.using(self.db).filter(pk=conversation_id).remove_messages(count)
+        return sum(removed.values())
+
+    def count_move(self, message: 'Message', previous_conversation_id: int, redated: bool = False):
+        """
+        Update the counters after ``message`` was saved with another
+        conversation (it was in ``previous_conversation_id``) or, when
+        ``redated``, another timestamp.
+        """
+        conversations = Conversation.all_objects.using(self.db)
+        with transaction.atomic(using=self.db):
+            if previous_conversation_id != message.conversation_id:
+                conversations.filter(pk=previous_conversation_id).remove_messages(1)
+                conversations.filter(pk=message.conversation_id).add_messages(1, message.timestamp)
+            elif redated:
+                # Recomputes last_message_at from the table.
+                conversations.filter(pk=message.conversation_id).remove_messages(0)
+                conversations.filter(pk=message.conversation_id).include_messages_since(message.timestamp)
+
+    def add_reaction(self, emoji: str) -> int:
+        """
+        Atomically increment the ``emoji`` counter of every selected message,
+        writing only the ``reactions`` and ``updated_at`` columns; their
+        conversations' rows are left alone. Returns the number of messages.
+        """
+        if connections[self.db].vendor == 'postgresql':
+            # The increment happens inside the UPDATE, so concurrent reactions
+            # never overwrite each other.
+            return self.update(
+                reactions=RawSQL(
+                    "jsonb_set(CASE WHEN jsonb_typeof(reactions) = 'object' THEN reactions ELSE '{}'::jsonb END, "
+                    "ARRAY[%s], to_jsonb(" + REACTION_COUNT_SQL % '(reactions ->> %s)' + " + 1))",
+                    [emoji, emoji]
+                ),
+                updated_at=timezone.now()
+            )
+        with transaction.atomic(using=self.db):
+            messages = list(self.select_for_update().only('id', 'reactions'))
+            now = timezone.now()
+            for message in messages:
+                reactions = message.reactions if isinstance(message.reactions, dict) else {}
+                reactions[emoji] = reaction_count(reactions.get(emoji, 0)) + 1
+                message.reactions = reactions
+                message.updated_at = now
+            self.model.objects.using(self.db).bulk_update(messages, ['reactions', 'updated_at'])
+        return len(messages)
+
 
 class Message(models.Model):
     """
@@ -64,20 +322,108 @@ class Message(models.Model):
     content = models.TextField()
     sender = models.CharField(max_length=10, choices=SENDER_CHOICES)
     timestamp = models.DateTimeField(default=timezone.now)
+    # No database constraint: the table is partitioned by month on PostgreSQL
+    # and its primary key is (id, timestamp), which a foreign key can't target.
     parent_message = models.ForeignKey(
         'self',
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
-        related_name='replies'
+        related_name='replies',
+        db_constraint=False
     )
     reactions = models.JSONField(default=dict, blank=True)
     is_bookmarked = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = MessageQuerySet.as_manager()
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Newest-first admin changelist across all conversations.
+            models.Index(fields=['timestamp', 'id'], name='message_timestamp_id_idx'),
+            # Latest change to a conversation's messages (conditional GET).
+            models.Index(fields=['conversation', 'updated_at'], name='message_conv_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender}: {self.content[:50]}"
 
+
+
+class ConversationArchive(models.Model):
+    """
+    Compressed messages of an archived conversation (see conversations.archive).
+    """
+    CODEC_CHOICES = [
+        ('zstd', 'Zstandard'),
+        ('zlib', 'zlib'),
+    ]
+
+    conversation = models.OneToOneField(
+        Conversation,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='archive'
+    )
+    codec = models.CharField(max_length=10, choices=CODEC_CHOICES)
+    payload = models.BinaryField()
+    message_count = models.PositiveIntegerField(default=0)
+    original_size = models.PositiveIntegerField(default=0)
+    # Range of the archived message timestamps (for reconcile_counters).
+    first_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archive of conversation {self.conversation_id} ({self.message_count} messages)"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored response of a request sent with an ``Idempotency-Key`` header, so
+    retries are answered without running it again (see conversations.idempotency).
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.key} ({'done' if self.completed_at else 'in flight'})"
+
+
+class ChangeMarker(models.Model):
+    """
+    Counter advanced after every commit that creates conversations, removes
+    conversations or messages, or restores archived messages (see
+    record_change). The list validators combine it with the latest
+    updated_at, which those writes can leave in place or move backwards.
+    Adding messages moves updated_at forwards and leaves the marker alone.
+    """
+    ROWS = 'rows'
+
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def advance(cls, using: str):
+        # Autocommit and outside the writer's transaction: the row lock is
+        # only held for this statement.
+        markers = cls.objects.using(using)
+        if not markers.filter(name=cls.ROWS).update(value=F('value') + 1):
+            marker, created = markers.get_or_create(name=cls.ROWS, defaults={'value': 1})
+            if not created:
+                markers.filter(name=cls.ROWS).update(value=F('value') + 1)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+def record_change(using: str):
+    """Advance the ChangeMarker once the current transaction on ``using`` commits."""
+    transaction.on_commit(lambda: ChangeMarker.advance(using), using=using)
@@ -0,0 +1,130 @@
+"""
+Monthly range partitioning of the message table (PostgreSQL only).
+
+``conversations_message`` is partitioned by ``timestamp`` into one partition
+per month named ``conversations_message_yYYYYmMM`` plus a default partition
+catching rows outside every range. Future partitions are created ahead of
+time by ``manage.py manage_message_partitions``; old ones can be detached,
+which only touches catalog metadata.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+from typing import List, Tuple
+
+from django.db import transaction
+
+from .models import Message
+
+
+TABLE = Message._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_RE = re.compile(rf'^{TABLE}_y(\d{{4}})m(\d{{2}})$')
+
+
+def month_start(value: datetime) -> datetime:
+    """First instant (UTC) of the month containing ``value``."""
+    value = value.astimezone(dt_timezone.utc) if value.tzinfo else value
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    return f'{TABLE}_y{month.year:04d}m{month.month:02d}'
+
+
+def is_partitioned(connection) -> bool:
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE])
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection) -> List[Tuple[str, datetime]]:
+    """Monthly partitions attached to the message table, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)',
+            [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            partitions.append((name, datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def default_partition_months(connection) -> List[datetime]:
+    """Months that have rows in the default partition."""
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', \"timestamp\" AT TIME ZONE 'UTC') "
+            f'FROM {quote(DEFAULT_PARTITION)}'
+        )
+        return sorted(row[0].replace(tzinfo=dt_timezone.utc) for row in cursor.fetchall())
+
+
+def create_partition(connection, month: datetime) -> bool:
+    """
+    Create and attach the partition for ``month``. Rows of that month that
+    landed in the default partition are moved into it. Returns False when
+    the partition already exists.
+    """
+    name = partition_name(month)
+    quote = connection.ops.quote_name
+    start, end = month, add_months(month, 1)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+        cursor.execute(f'CREATE TABLE {quote(name)} (LIKE {quote(TABLE)} INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} '
+            f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f'INSERT INTO {quote(name)} SELECT * FROM moved',
+            [start, end]
+        )
+        cursor.execute(
+            f'ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)',
+            [start, end]
+        )
+    return True
+
+
+def ensure_partitions(connection, first_month: datetime, last_month: datetime) -> List[str]:
+    """Create every missing monthly partition from ``first_month`` to ``last_month`` inclusive."""
+    created = []
+    month = month_start(first_month)
+    last_month = month_start(last_month)
+    while month <= last_month:
+        if create_partition(connection, month):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def detach_partitions(connection, before: datetime, drop: bool = False) -> List[str]:
+    """
+    Detach the monthly partitions entirely older than ``before``. Detached
+    partitions stay as standalone tables (for dumping or archiving) unless
+    ``drop`` is set.
+    """
+    quote = connection.ops.quote_name
+    detached = []
+    for name, month in list_partitions(connection):
+        if add_months(month, 1) > before:
+            continue
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(name)}')
+            if drop:
+                cursor.execute(f'DROP TABLE {quote(name)}')
+        detached.append(name)
+    return detached
@@ -0,0 +1,120 @@
+"""
+Deferred deletion of conversations.
+
+Deleting a conversation through the API only marks it (``deleted_at``), which
+hides it from the default manager at once. The rows are removed afterwards,
+outside the request: messages in chunks of CONVERSATION_PURGE_CHUNK_SIZE, each
+chunk one short transaction of set-based SQL, then the conversation itself.
+Purging runs on a background thread after the delete commits and, for
+anything left over (e.g. after a restart), in
+``manage.py purge_deleted_conversations``.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+from django.utils import timezone
+
+from chatportal import metrics
+from .context_cache import invalidate
+from .models import Conversation, ConversationArchive, Message, record_change
+from .snapshots import delete_snapshot
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def mark_deleted(conversation: Conversation) -> bool:
+    """
+    Hide ``conversation`` and unshare it; its rows are purged later. Returns
+    False, changing nothing, when it was already marked.
+    """
+    token = conversation.share_token
+    now = timezone.now()
+    with transaction.atomic():
+        marked = Conversation.objects.filter(pk=conversation.pk, deleted_at__isnull=True).update(
+            deleted_at=now, updated_at=now, is_shared=False, share_token=None
+        )
+        if not marked:
+            return False
+        if conversation.parent_conversation_id:
+            Conversation.objects.filter(pk=conversation.parent_conversation_id).add_branches(-marked)
+        record_change(router.db_for_write(Conversation))
+    delete_snapshot(token)
+    invalidate([conversation.pk])
+    if getattr(settings, 'CONVERSATION_PURGE_IN_BACKGROUND', True):
+        transaction.on_commit(lambda: schedule_purge([conversation.pk]))
+    return True
+
+
+def purge_conversation(conversation_id: int, chunk_size: int = None) -> int:
+    """
+    Delete a conversation marked as deleted and everything that belongs to
+    it. Returns the number of messages deleted; does nothing for
+    conversations that aren't marked.
+    """
+    chunk_size = chunk_size or settings.CONVERSATION_PURGE_CHUNK_SIZE
+    if not Conversation.all_objects.filter(pk=conversation_id, deleted_at__isnull=False).exists():
+        return 0
+    quote = connection.ops.quote_name
+    messages = quote(Message._meta.db_table)
+    conversations = quote(Conversation._meta.db_table)
+
+    with connection.cursor() as cursor:
+        # Replies elsewhere to messages of this conversation (Message.parent_message is SET_NULL).
+        cursor.execute(
+            f'UPDATE {messages} SET parent_message_id = NULL '
+            f'WHERE parent_message_id IN (SELECT id FROM {messages} WHERE conversation_id = %s) '
+            f'AND conversation_id <> %s',
+            [conversation_id, conversation_id]
+        )
+        deleted = 0
+        while True:
+            # (id, timestamp) is the primary key of the partitioned message table.
+            cursor.execute(
+                f'DELETE FROM {messages} WHERE (id, "timestamp") IN ('
+                f'SELECT id, "timestamp" FROM {messages} WHERE conversation_id = %s LIMIT %s)',
+                [conversation_id, chunk_size]
+            )
+            deleted += cursor.rowcount
+            if cursor.rowcount < chunk_size:
+                break
+
+    with transaction.atomic():
+        ConversationArchive.objects.filter(conversation_id=conversation_id).delete()
+        with connection.cursor() as cursor:
+            # Branches outlive their parent (Conversation.parent_conversation is SET_NULL).
+            cursor.execute(
+                f'UPDATE {conversations} SET parent_conversation_id = NULL WHERE parent_conversation_id = %s',
+                [conversation_id]
+            )
+            cursor.execute(f'DELETE FROM {conversations} WHERE id = %s', [conversation_id])
+        record_change(connection.alias)
+    return deleted
+
+
+def _purge_all(conversation_ids: Iterable[int]):
+    try:
+        for conversation_id in conversation_ids:
+            try:
+                purge_conversation(conversation_id)
+            except Exception:
+                logger.exception("Purging conversation %s failed", conversation_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_purge(conversation_ids: Iterable[int]):
+    """Purge conversations on the background purge thread."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = metrics.track_queue(
+                'purge', ThreadPoolExecutor(max_workers=1, thread_name_prefix='conversation-purge')
+            )
+    _executor.submit(_purge_all, list(conversation_ids))
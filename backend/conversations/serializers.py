@@ -1,6 +1,7 @@
 """
 Serializers for Conversation and Message models.
 """
+from django.conf import settings
 from rest_framework import serializers
 from .models import Conversation, Message
 
@@ -15,13 +16,14 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'timestamp']
     
     def get_replies_count(self, obj):
+        # Messages rehydrated from the archive or just created in bulk know their reply count.
+        if hasattr(obj, 'known_replies_count'):
+            return obj.known_replies_count
         return obj.replies.count()
 
 
 class ConversationSerializer(serializers.ModelSerializer):
     """Serializer for Conversation model with message count."""
-    message_count = serializers.SerializerMethodField()
-    branches_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Conversation
@@ -29,20 +31,18 @@ class ConversationSerializer(serializers.ModelSerializer):
             'id', 'title', 'status', 'start_timestamp', 
             'end_timestamp', 'summary', 'message_count',
             'key_topics', 'sentiment', 'action_items',
-            'share_token', 'is_shared', 'parent_conversation', 'branches_count'
+            'share_token', 'is_shared', 'parent_conversation', 'branches_count',
+            'last_message_at'
+        ]
+        read_only_fields = [
+            'id', 'start_timestamp', 'end_timestamp', 'share_token',
+            'message_count', 'branches_count', 'last_message_at'
         ]
-        read_only_fields = ['id', 'start_timestamp', 'end_timestamp', 'share_token']
-
-    def get_message_count(self, obj):
-        return obj.messages.count()
-    
-    def get_branches_count(self, obj):
-        return obj.branches.count()
 
 
 class ConversationDetailSerializer(serializers.ModelSerializer):
     """Serializer for Conversation with full message history."""
-    messages = MessageSerializer(many=True, read_only=True)
+    messages = MessageSerializer(many=True, read_only=True, source='message_history')
     
     class Meta:
         model = Conversation
@@ -86,3 +86,39 @@ class BranchConversationSerializer(serializers.Serializer):
     message_id = serializers.IntegerField()
     title = serializers.CharField(max_length=255, required=False, allow_blank=True)
 
+
+
+class BulkMessageOperationSerializer(serializers.Serializer):
+    """Serializer for one operation of a bulk message request."""
+    OPERATIONS = ['bookmark', 'react', 'delete']
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=1000
+    )
+    value = serializers.BooleanField(required=False, allow_null=True, default=None)
+    emoji = serializers.CharField(max_length=10, required=False)
+
+    def validate(self, attrs):
+        if attrs['op'] == 'react' and not attrs.get('emoji'):
+            raise serializers.ValidationError({'emoji': 'This field is required for react.'})
+        return attrs
+
+
+class BulkMessageSerializer(serializers.Serializer):
+    """Serializer for bulk message operations."""
+    operations = BulkMessageOperationSerializer(many=True, allow_empty=False, max_length=100)
+
+
+class BatchChatItemSerializer(serializers.Serializer):
+    """Serializer for one prompt of a batch chat request."""
+    conversation_id = serializers.IntegerField()
+    content = serializers.CharField()
+
+
+class BatchChatSerializer(serializers.Serializer):
+    """Serializer for batch chat requests."""
+    items = BatchChatItemSerializer(many=True, allow_empty=False, max_length=settings.BATCH_CHAT_MAX_ITEMS)
+    stream = serializers.BooleanField(default=False)
@@ -0,0 +1,152 @@
+"""
+Pre-rendered snapshots of shared conversations.
+
+When a conversation is shared its public JSON representation is rendered once
+and written to SHARED_SNAPSHOT_DIR uncompressed, gzip-compressed and (when the
+optional ``brotli`` package is installed) brotli-compressed. The public
+endpoint serves those bytes straight from disk without touching the ORM; any
+change to a shared conversation re-renders its snapshot.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from .models import Conversation
+from .serializers import ConversationDetailSerializer
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+# Share tokens come from secrets.token_urlsafe().
+TOKEN_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+ENCODINGS = {
+    'br': '.json.br',
+    'gzip': '.json.gz',
+    'identity': '.json',
+}
+
+
+def _directory() -> str:
+    return getattr(settings, 'SHARED_SNAPSHOT_DIR')
+
+
+def _path(token: str, suffix: str) -> str:
+    return os.path.join(_directory(), token + suffix)
+
+
+def _write(path: str, data: bytes):
+    # A unique temporary file per write: threads of one process may refresh
+    # the same snapshot concurrently.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _still_shared(conversation_id: int, token: str) -> bool:
+    return Conversation.objects.filter(pk=conversation_id, is_shared=True, share_token=token).exists()
+
+
+def render_snapshot(conversation: Conversation) -> Optional[Dict]:
+    """
+    Render and store the snapshot of a shared conversation.
+    Returns the snapshot metadata (etag and available encodings), or None
+    when the conversation is not (or no longer) shared.
+    """
+    try:
+        conversation = Conversation.objects.prefetch_related('messages__replies').get(
+            pk=conversation.pk, is_shared=True, share_token__isnull=False
+        )
+    except Conversation.DoesNotExist:
+        return None
+    token = conversation.share_token
+    if not TOKEN_RE.match(token):
+        return None
+    body = JSONRenderer().render(ConversationDetailSerializer(conversation).data)
+    os.makedirs(_directory(), exist_ok=True)
+
+    encodings = ['gzip', 'identity']
+    _write(_path(token, ENCODINGS['identity']), body)
+    _write(_path(token, ENCODINGS['gzip']), gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write(_path(token, ENCODINGS['br']), brotli.compress(body))
+        encodings.insert(0, 'br')
+    else:
+        _remove(_path(token, ENCODINGS['br']))
+
+    meta = {
+        'etag': '"%s"' % hashlib.sha256(body).hexdigest()[:32],
+        'encodings': encodings,
+    }
+    # The metadata file is written last: a snapshot exists once it is there.
+    _write(_path(token, '.meta'), json.dumps(meta).encode())
+    # An unshare or delete that committed while we rendered has already
+    # removed its files; don't leave ours behind. One committing after this
+    # check removes them itself.
+    if not _still_shared(conversation.pk, token):
+        delete_snapshot(token)
+        return None
+    return meta
+
+
+def delete_snapshot(token: Optional[str]):
+    """Remove every file of a conversation's snapshot."""
+    if not token or not TOKEN_RE.match(token):
+        return
+    _remove(_path(token, '.meta'))
+    for suffix in ENCODINGS.values():
+        _remove(_path(token, suffix))
+
+
+def load_snapshot(token: str) -> Optional[Dict]:
+    """Return the metadata of a stored snapshot, or None when there is none."""
+    if not TOKEN_RE.match(token):
+        return None
+    try:
+        with open(_path(token, '.meta')) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_path(token: str, encoding: str) -> str:
+    return _path(token, ENCODINGS[encoding])
+
+
+def refresh_snapshots(conversation_ids: Iterable[int]):
+    """
+    Re-render the snapshots of the shared conversations among
+    ``conversation_ids`` once the current transaction commits.
+    """
+    conversation_ids = {conv_id for conv_id in conversation_ids if conv_id is not None}
+    if not conversation_ids:
+        return
+
+    def refresh():
+        for conversation in Conversation.objects.filter(id__in=conversation_ids, is_shared=True):
+            render_snapshot(conversation)
+
+    transaction.on_commit(refresh)
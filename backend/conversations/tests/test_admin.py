@@ -0,0 +1,66 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from conversations import admin as conversations_admin
+from conversations.admin import EstimatedCountPaginator
+from conversations.models import Conversation
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        for status in ('active', 'ended', 'ended'):
+            Conversation.objects.create(status=status)
+
+    def test_unfiltered_manager_queryset_uses_the_estimate(self):
+        # Conversation.objects has its own filter (deleted_at IS NULL); that still counts as unfiltered.
+        with mock.patch.object(conversations_admin, 'estimated_row_count', return_value=250000):
+            paginator = EstimatedCountPaginator(Conversation.objects.all(), 20)
+            self.assertEqual(paginator.count, 250000)
+        self.assertTrue(paginator.estimated)
+        self.assertFalse(paginator.capped)
+
+    def test_small_tables_are_counted_exactly(self):
+        with mock.patch.object(conversations_admin, 'estimated_row_count', return_value=3):
+            paginator = EstimatedCountPaginator(Conversation.objects.all(), 20)
+            self.assertEqual(paginator.count, 3)
+        self.assertFalse(paginator.estimated)
+
+    def test_filtered_count_is_capped(self):
+        with mock.patch.object(EstimatedCountPaginator, 'COUNT_LIMIT', 1):
+            paginator = EstimatedCountPaginator(Conversation.objects.filter(status='ended'), 20)
+            self.assertEqual(paginator.count, 1)
+        self.assertTrue(paginator.capped)
+
+    def test_filtered_count_below_the_cap_is_exact(self):
+        with mock.patch.object(conversations_admin, 'estimated_row_count') as estimate:
+            paginator = EstimatedCountPaginator(Conversation.objects.filter(status='ended'), 20)
+            self.assertEqual(paginator.count, 2)
+        estimate.assert_not_called()
+        self.assertFalse(paginator.capped)
+
+
+class ChangelistTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        for _ in range(3):
+            Conversation.objects.create(status='ended')
+
+    def test_capped_changelist_warns(self):
+        with mock.patch.object(EstimatedCountPaginator, 'COUNT_LIMIT', 2):
+            response = self.client.get('/admin/conversations/conversation/?status__exact=ended')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'More than 2 conversations match')
+
+    def test_estimated_changelist_says_so(self):
+        with mock.patch.object(conversations_admin, 'estimated_row_count', return_value=500000):
+            response = self.client.get('/admin/conversations/conversation/')
+        self.assertContains(response, 'The number of conversations is an estimate.')
+
+    def test_exact_changelist_has_no_notice(self):
+        response = self.client.get('/admin/conversations/message/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'is an estimate')
+        self.assertNotContains(response, 'More than')
@@ -0,0 +1,102 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from conversations import archive
+from conversations.models import Conversation, ConversationArchive, Message
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.conversation = Conversation.objects.create(status='ended', end_timestamp=timezone.now())
+        self.question = Message.objects.create_and_count(
+            conversation=self.conversation, sender='user', content='question', reactions={'+1': 2}
+        )
+        self.answer = Message.objects.create_and_count(
+            conversation=self.conversation, sender='ai', content='answer', parent_message=self.question,
+            is_bookmarked=True
+        )
+
+    def snapshot(self, messages):
+        return [
+            (m.pk, m.content, m.sender, m.timestamp, m.parent_message_id, m.reactions, m.is_bookmarked,
+             m.created_at, m.updated_at)
+            for m in messages
+        ]
+
+    def test_archive_and_restore_round_trip(self):
+        before = self.snapshot(Message.objects.filter(conversation=self.conversation).order_by('timestamp'))
+
+        stored = archive.archive_conversation(self.conversation)
+        self.assertEqual(stored.message_count, 2)
+        self.assertFalse(Message.objects.filter(conversation=self.conversation).exists())
+        self.conversation.refresh_from_db()
+        self.assertTrue(self.conversation.is_archived)
+        self.assertEqual(self.conversation.message_count, 2)
+        history = self.conversation.message_history
+        self.assertEqual(self.snapshot(history), before)
+        self.assertEqual([m.known_replies_count for m in history], [1, 0])
+
+        archive.restore_conversation(self.conversation)
+        self.assertFalse(ConversationArchive.objects.filter(conversation=self.conversation).exists())
+        self.assertFalse(self.conversation.is_archived)
+        self.assertEqual(self.snapshot(Message.objects.filter(conversation=self.conversation).order_by('timestamp')), before)
+
+    def test_archive_and_restore_change_the_message_list_etag(self):
+        Message.objects.create_and_count(conversation=Conversation.objects.create(), sender='user', content='latest')
+        etags = [self.client.get('/api/messages/')['ETag']]
+        for change in (archive.archive_conversation, archive.restore_conversation):
+            with self.captureOnCommitCallbacks(execute=True):
+                change(self.conversation)
+            etags.append(self.client.get('/api/messages/')['ETag'])
+        # The restored messages keep their updated_at; the ChangeMarker moved.
+        self.assertEqual(len(set(etags)), 3)
+
+    def test_replies_elsewhere_keep_their_parent(self):
+        other = Conversation.objects.create()
+        reply = Message.objects.create_and_count(
+            conversation=other, sender='user', content='quoting', parent_message=self.answer
+        )
+
+        archive.archive_conversation(self.conversation)
+        reply.refresh_from_db()
+        self.assertEqual(reply.parent_message_id, self.answer.pk)
+
+        archive.restore_conversation(self.conversation)
+        reply.refresh_from_db()
+        self.assertEqual(reply.parent_message, self.answer)
+
+    def test_archiving_twice_is_a_no_op(self):
+        first = archive.archive_conversation(self.conversation)
+        self.assertEqual(archive.archive_conversation(self.conversation).pk, first.pk)
+        self.assertEqual(ConversationArchive.objects.count(), 1)
+
+    def test_zlib_without_zstandard(self):
+        with mock.patch.object(archive, 'zstandard', None):
+            stored = archive.archive_conversation(self.conversation)
+            self.assertEqual(stored.codec, 'zlib')
+            self.conversation.refresh_from_db()
+            self.assertEqual([m.content for m in self.conversation.message_history], ['question', 'answer'])
+
+    def test_zstd_codec_when_available(self):
+        if archive.zstandard is None:
+            self.skipTest('zstandard is not installed')
+        codec, blob = archive.compress(b'x' * 1000)
+        self.assertEqual(codec, 'zstd')
+        self.assertEqual(archive.decompress(codec, blob), b'x' * 1000)
+        with mock.patch.object(archive, 'zstandard', None):
+            with self.assertRaises(RuntimeError):
+                archive.decompress(codec, blob)
+
+    def test_command_archives_old_ended_conversations(self):
+        Conversation.objects.filter(pk=self.conversation.pk).update(end_timestamp=timezone.now() - timedelta(days=400))
+        recent = Conversation.objects.create(status='ended', end_timestamp=timezone.now())
+        Message.objects.create_and_count(conversation=recent, sender='user', content='recent')
+
+        call_command('archive_conversations', '--older-than-days', '365', stdout=StringIO())
+        self.assertEqual(list(ConversationArchive.objects.values_list('conversation_id', flat=True)), [self.conversation.pk])
+        self.assertEqual(Message.objects.filter(conversation=recent).count(), 1)
@@ -0,0 +1,182 @@
+import json
+import time
+from unittest import mock
+
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from ai_integration.services import AIService
+from ai_integration.tests.fakes import FakeProviders
+from conversations.batch_chat import run_batch_chat
+from conversations.models import Conversation, Message
+
+
+class BatchChatTests(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.prompts = []
+        FakeProviders(self, {'p': self.reply})
+
+    def reply(self, messages):
+        prompt = messages[-1]['content']
+        if prompt.startswith('Generate a short'):
+            return '"Batch title"'
+        self.prompts.append([message['content'] for message in messages])
+        if prompt == 'slow':
+            time.sleep(0.3)
+        if prompt == 'tick':
+            time.sleep(0.15)
+        if prompt in ('boom', 'slow boom'):
+            if prompt == 'slow boom':
+                time.sleep(0.3)
+            raise RuntimeError('provider down')
+        return f're: {prompt}'
+
+    def batch(self, items, **extra):
+        return self.client.post('/api/conversations/batch_chat/', {'items': items, **extra}, format='json')
+
+    def test_answers_and_saves_every_prompt(self):
+        first = Conversation.objects.create()
+        second = Conversation.objects.create(title='Kept')
+        Message.objects.create_and_count(conversation=second, sender='user', content='earlier')
+
+        response = self.batch([
+            {'conversation_id': first.pk, 'content': 'one'},
+            {'conversation_id': second.pk, 'content': 'two'},
+            {'conversation_id': first.pk, 'content': 'three'},
+            {'conversation_id': 999999, 'content': 'lost'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['index'] for r in results], [0, 1, 2, 3])
+        self.assertEqual([r['status'] for r in results], ['ok', 'ok', 'ok', 'not_found'])
+        self.assertEqual(results[2]['ai_message']['content'], 're: three')
+
+        # Prompts of one conversation run in order and see the earlier replies.
+        self.assertIn(['one', 're: one', 'three'], self.prompts)
+        self.assertIn(['earlier', 'two'], self.prompts)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.message_count, 4)
+        self.assertEqual(second.message_count, 3)
+        self.assertEqual(first.title, 'Batch title')
+        self.assertEqual(second.title, 'Kept')
+        self.assertEqual(
+            list(Message.objects.filter(conversation=first).order_by('timestamp').values_list('sender', 'content')),
+            [('user', 'one'), ('ai', 're: one'), ('user', 'three'), ('ai', 're: three')]
+        )
+
+    def test_provider_failure_gets_the_fallback_reply(self):
+        conversation = Conversation.objects.create(title='t')
+        results = self.batch([{'conversation_id': conversation.pk, 'content': 'boom'}]).json()['results']
+        self.assertEqual(results[0]['status'], 'ok')
+        self.assertNotEqual(results[0]['ai_message']['content'], 're: boom')
+
+    def test_failed_prompt_is_reported_and_not_saved(self):
+        conversation = Conversation.objects.create(title='t')
+        chat = AIService.chat
+
+        def failing_chat(service, conversation_id, content, history=None):
+            if content == 'broken':
+                raise ValueError('unexpected')
+            return chat(service, conversation_id, content, history=history)
+
+        with mock.patch.object(AIService, 'chat', failing_chat):
+            response = self.batch([
+                {'conversation_id': conversation.pk, 'content': 'broken'},
+                {'conversation_id': conversation.pk, 'content': 'fine'},
+            ])
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['error', 'ok'])
+        self.assertEqual(results[0]['error'], 'Failed to generate a response')
+        self.assertEqual(Message.objects.filter(conversation=conversation).count(), 2)
+
+    def test_streams_one_line_per_item(self):
+        conversations = [Conversation.objects.create(title='t') for _ in range(3)]
+        response = self.batch([{'conversation_id': c.pk, 'content': 'hi'} for c in conversations], stream=True)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(sorted(line['index'] for line in lines), [0, 1, 2])
+        self.assertTrue(all(line['status'] == 'ok' for line in lines))
+
+    def test_conversations_run_concurrently(self):
+        conversations = [Conversation.objects.create(title='t') for _ in range(6)]
+        started = time.monotonic()
+        with self.settings(BATCH_CHAT_WORKERS=8):
+            response = self.batch([{'conversation_id': c.pk, 'content': 'slow'} for c in conversations])
+        elapsed = time.monotonic() - started
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(elapsed, 1.2)
+
+    def test_every_prompt_gets_its_own_deadline(self):
+        conversation = Conversation.objects.create(title='t')
+        deadlines = []
+        chat = AIService.chat
+
+        def recording_chat(service, conversation_id, content, history=None):
+            deadlines.append(service.deadline)
+            return chat(service, conversation_id, content, history=history)
+
+        with self.settings(AI_REQUEST_DEADLINE=0.25), mock.patch.object(AIService, 'chat', recording_chat):
+            results = self.batch([
+                {'conversation_id': conversation.pk, 'content': 'tick'} for _ in range(3)
+            ]).json()['results']
+        # Together they take longer than one budget.
+        self.assertEqual([r['status'] for r in results], ['ok', 'ok', 'ok'])
+        self.assertEqual(len({id(deadline) for deadline in deadlines}), 3)
+        self.assertTrue(all(deadline.seconds == 0.25 for deadline in deadlines))
+
+    def test_prompt_past_its_deadline_is_reported(self):
+        conversation = Conversation.objects.create(title='t')
+        with self.settings(AI_REQUEST_DEADLINE=0.2):
+            results = self.batch([
+                {'conversation_id': conversation.pk, 'content': 'slow boom'},
+                {'conversation_id': conversation.pk, 'content': 'fine'},
+            ]).json()['results']
+        self.assertEqual([r['status'] for r in results], ['error', 'ok'])
+        self.assertEqual(results[0]['error'], 'The AI service did not answer in time')
+        self.assertEqual(results[1]['ai_message']['content'], 're: fine')
+        self.assertEqual(Message.objects.filter(conversation=conversation).count(), 2)
+
+    def test_prompts_queued_past_the_batch_deadline_are_not_run(self):
+        conversations = [Conversation.objects.create(title='t') for _ in range(3)]
+        with self.settings(BATCH_CHAT_DEADLINE=0.2, BATCH_CHAT_WORKERS=1):
+            results = self.batch([
+                {'conversation_id': conversations[0].pk, 'content': 'slow'},
+                {'conversation_id': conversations[0].pk, 'content': 'late'},
+                {'conversation_id': conversations[1].pk, 'content': 'queued'},
+            ]).json()['results']
+        # The prompts after the one running when the budget ran out never start.
+        self.assertEqual([r['status'] for r in results], ['ok', 'error', 'error'])
+        self.assertEqual(results[2]['error'], 'The batch ran out of time before this prompt was answered')
+        self.assertEqual(self.prompts, [['slow']])
+        self.assertEqual(Message.objects.count(), 2)
+
+    def test_prompts_get_at_most_the_time_left_in_the_batch(self):
+        conversation = Conversation.objects.create(title='t')
+        deadlines = []
+        chat = AIService.chat
+
+        def recording_chat(service, conversation_id, content, history=None):
+            deadlines.append(service.deadline)
+            return chat(service, conversation_id, content, history=history)
+
+        with self.settings(AI_REQUEST_DEADLINE=30, BATCH_CHAT_DEADLINE=5), \
+                mock.patch.object(AIService, 'chat', recording_chat):
+            self.batch([{'conversation_id': conversation.pk, 'content': 'one'}])
+        self.assertEqual(deadlines[0].seconds, 5)
+
+    def test_closing_the_stream_skips_queued_conversations(self):
+        conversations = [Conversation.objects.create(title='t') for _ in range(3)]
+        results = run_batch_chat([{'conversation_id': c.pk, 'content': 'slow'} for c in conversations], workers=1)
+        self.assertEqual(next(results)['status'], 'ok')
+        started = time.monotonic()
+        results.close()
+        self.assertLess(time.monotonic() - started, 0.2)
+        time.sleep(0.4)
+        # The second conversation was already running; the third never starts.
+        self.assertEqual(len(self.prompts), 2)
+
+    def test_rejects_empty_batches(self):
+        self.assertEqual(self.batch([]).status_code, 400)
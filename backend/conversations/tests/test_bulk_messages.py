@@ -0,0 +1,56 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from conversations.models import Conversation, Message
+
+
+class BulkMessageTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.conversation = Conversation.objects.create()
+        self.messages = [
+            Message.objects.create_and_count(conversation=self.conversation, sender='user', content=f'm{i}')
+            for i in range(3)
+        ]
+        self.ids = [message.pk for message in self.messages]
+
+    def bulk(self, *operations):
+        return self.client.post('/api/messages/bulk/', {'operations': list(operations)}, format='json')
+
+    def test_bookmark_react_and_delete(self):
+        missing = max(self.ids) + 100
+        response = self.bulk(
+            {'op': 'bookmark', 'ids': self.ids[:2], 'value': True},
+            {'op': 'react', 'ids': [self.ids[0], missing], 'emoji': '👍'},
+            {'op': 'delete', 'ids': [self.ids[2]]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'op': 'bookmark', 'id': self.ids[0], 'status': 'ok', 'is_bookmarked': True},
+            {'op': 'bookmark', 'id': self.ids[1], 'status': 'ok', 'is_bookmarked': True},
+            {'op': 'react', 'id': self.ids[0], 'status': 'ok', 'reactions': {'👍': 1}},
+            {'op': 'react', 'id': missing, 'status': 'not_found'},
+            {'op': 'delete', 'id': self.ids[2], 'status': 'deleted'},
+        ])
+        self.assertFalse(Message.objects.filter(pk=self.ids[2]).exists())
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 2)
+
+    def test_bookmark_without_value_toggles(self):
+        Message.objects.filter(pk=self.ids[0]).update(is_bookmarked=True)
+        response = self.bulk({'op': 'bookmark', 'ids': self.ids[:2]})
+        self.assertEqual([r['is_bookmarked'] for r in response.json()['results']], [False, True])
+
+    def test_operations_after_delete_see_messages_as_gone(self):
+        response = self.bulk(
+            {'op': 'delete', 'ids': [self.ids[0]]},
+            {'op': 'react', 'ids': [self.ids[0]], 'emoji': '👍'},
+        )
+        self.assertEqual(response.json()['results'][1]['status'], 'not_found')
+
+    def test_invalid_request_changes_nothing(self):
+        response = self.bulk({'op': 'react', 'ids': self.ids})
+        self.assertEqual(response.status_code, 400)
+        response = self.bulk({'op': 'explode', 'ids': self.ids})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Message.objects.filter(reactions={}).count(), 3)
@@ -0,0 +1,75 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from conversations.models import Conversation, Message
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.conversation = Conversation.objects.create(title='First')
+        self.message = Message.objects.create_and_count(conversation=self.conversation, sender='user', content='Hi')
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def assertChanges(self, url, change):
+        before = self.etag(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=before).status_code, 304)
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=before)
+        self.assertEqual(response.status_code, 200, f'{url} still answered 304')
+
+    def test_unchanged_list_is_not_modified(self):
+        for url in ('/api/messages/', '/api/conversations/', f'/api/conversations/{self.conversation.pk}/'):
+            etag = self.etag(url)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+
+    def test_validators_take_one_query(self):
+        for url in ('/api/messages/', '/api/conversations/', f'/api/conversations/{self.conversation.pk}/'):
+            etag = self.etag(url)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(len(queries), 1)
+
+    def test_reactions_and_bookmarks_leave_the_conversation_row_alone(self):
+        updated_at = Conversation.objects.get(pk=self.conversation.pk).updated_at
+        message_url = f'/api/messages/{self.message.pk}/'
+        self.client.post(f'{message_url}react/', {'emoji': '+1'}, format='json')
+        self.client.post(f'{message_url}bookmark/')
+        self.client.post('/api/messages/bulk/', {'operations': [
+            {'op': 'bookmark', 'ids': [self.message.pk], 'value': False},
+            {'op': 'react', 'ids': [self.message.pk], 'emoji': '+1'},
+        ]}, format='json')
+        self.assertEqual(Conversation.objects.get(pk=self.conversation.pk).updated_at, updated_at)
+
+    def test_message_changes_change_etags(self):
+        message_url = f'/api/messages/{self.message.pk}/'
+        for url in ('/api/messages/', f'/api/conversations/{self.conversation.pk}/'):
+            self.assertChanges(url, lambda: self.client.post(f'{message_url}react/', {'emoji': '+1'}, format='json'))
+            self.assertChanges(url, lambda: self.client.post(f'{message_url}bookmark/'))
+            self.assertChanges(url, lambda: self.client.patch(message_url, {'content': 'Edited'}, format='json'))
+            self.assertChanges(url, lambda: self.client.post('/api/messages/bulk/', {
+                'operations': [{'op': 'bookmark', 'ids': [self.message.pk], 'value': False}],
+            }, format='json'))
+            self.assertChanges(url, lambda: Message.objects.create_and_count(
+                conversation=self.conversation, sender='ai', content='Hello'
+            ))
+
+    def test_message_delete_changes_etag(self):
+        self.assertChanges('/api/messages/', lambda: self.client.delete(f'/api/messages/{self.message.pk}/'))
+
+    def test_reconciled_counters_change_etags(self):
+        drifted = Conversation.objects.filter(pk=self.conversation.pk)
+        for url in ('/api/conversations/', f'/api/conversations/{self.conversation.pk}/'):
+            drifted.update(message_count=7)
+            self.assertChanges(url, drifted.reconcile_counters)
+
+    def test_new_conversation_changes_list_etag(self):
+        self.assertChanges('/api/conversations/', lambda: Conversation.objects.create(title='Second'))
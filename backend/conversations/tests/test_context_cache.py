@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ai_integration.services import AIService
+from ai_integration.tests.fakes import FakeProviders
+from conversations import context_cache
+from conversations.models import Conversation, Message
+
+
+@override_settings(CONVERSATION_CONTEXT_MESSAGES=4, CONVERSATION_CONTEXT_CACHE_ALIAS='')
+class ContextCacheTests(TestCase):
+    def setUp(self):
+        context_cache._local_cache().clear()
+        self.addCleanup(context_cache._local_cache().clear)
+        self.client = APIClient()
+        self.conversation = Conversation.objects.create(title='Titled')
+        self.messages = [
+            Message.objects.create_and_count(conversation=self.conversation, sender='user', content=f'm{i}')
+            for i in range(6)
+        ]
+        self.prompts = []
+        FakeProviders(self, {'p': self.reply})
+
+    def reply(self, messages):
+        self.prompts.append([message['content'] for message in messages])
+        return f"re: {messages[-1]['content']}"
+
+    def fresh(self):
+        return Conversation.objects.get(pk=self.conversation.pk)
+
+    def contents(self, context):
+        return [message['content'] for message in context]
+
+    def test_every_message_change_bumps_the_version(self):
+        version = self.fresh().message_version
+        self.assertEqual(version, 6)
+        first = Message.objects.filter(pk=self.messages[0].pk)
+        for change in (
+            lambda: Message.objects.create_and_count(conversation=self.conversation, sender='ai', content='new'),
+            lambda: first.delete_and_count(),
+        ):
+            change()
+            self.assertGreater(self.fresh().message_version, version)
+            version = self.fresh().message_version
+
+    def test_reactions_keep_the_version(self):
+        # Windows hold only senders and contents.
+        version = self.fresh().message_version
+        Message.objects.filter(pk=self.messages[0].pk).add_reaction('+1')
+        self.assertEqual(self.fresh().message_version, version)
+
+    def test_stale_save_and_reconcile_keep_the_version(self):
+        stale = self.fresh()
+        Message.objects.create_and_count(conversation=self.conversation, sender='ai', content='late')
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertEqual(self.fresh().message_version, 7)
+
+        Conversation.objects.filter(pk=self.conversation.pk).reconcile_counters()
+        self.assertEqual(self.fresh().message_version, 7)
+        out = StringIO()
+        call_command('reconcile_conversation_counters', '--dry-run', stdout=out)
+        self.assertIn('Found 0 drifted', out.getvalue())
+
+    def test_window_is_served_from_the_cache(self):
+        conversation = self.fresh()
+        self.assertEqual(self.contents(context_cache.get_context(conversation)), ['m2', 'm3', 'm4', 'm5'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.contents(context_cache.get_context(conversation, 2)), ['m4', 'm5'])
+
+    def test_edit_elsewhere_is_seen(self):
+        context_cache.get_context(self.fresh())
+        # Another worker edits a message; this process's window is not invalidated.
+        Message.objects.filter(pk=self.messages[5].pk).update(content='edited')
+        Conversation.objects.filter(pk=self.conversation.pk).touch()
+        self.assertEqual(self.contents(context_cache.get_context(self.fresh()))[-1], 'edited')
+
+    def test_chat_turns_extend_the_window(self):
+        path = f'/api/conversations/{self.conversation.pk}/send_message/'
+        self.assertEqual(self.client.post(path, {'content': 'first'}, format='json').status_code, 201)
+        self.assertEqual(self.client.post(path, {'content': 'second'}, format='json').status_code, 201)
+        self.assertEqual(self.prompts[-1], ['m4', 'm5', 'first', 're: first', 'second'])
+
+        conversation = self.fresh()
+        self.assertEqual(conversation.message_version, 10)
+        with self.assertNumQueries(0):
+            window = context_cache.get_context(conversation)
+        self.assertEqual(self.contents(window), ['first', 're: first', 'second', 're: second'])
+
+    def test_edit_through_the_api_drops_the_window(self):
+        context_cache.get_context(self.fresh())
+        response = self.client.patch(f'/api/messages/{self.messages[5].pk}/', {'content': 'edited'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.contents(context_cache.get_context(self.fresh()))[-1], 'edited')
+
+    def test_service_loads_history_without_the_cache(self):
+        AIService().chat(self.conversation.pk, 'next')
+        self.assertEqual(self.prompts[-1], ['m2', 'm3', 'm4', 'm5', 'next'])
+        self.assertIsNone(context_cache._local_cache().get(self.conversation.pk))
@@ -0,0 +1,146 @@
+import importlib
+from datetime import timedelta
+from io import StringIO
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from conversations.archive import archive_conversation, restore_conversation
+from conversations.models import Conversation, ConversationArchive, Message
+
+backfill = importlib.import_module('conversations.migrations.0012_archive_message_range')
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.conversation = Conversation.objects.create()
+        now = timezone.now()
+        self.messages = Message.objects.bulk_create_and_count([
+            Message(conversation=self.conversation, sender='user', content=f'm{i}', timestamp=now - timedelta(hours=3 - i))
+            for i in range(3)
+        ])
+
+    def counters(self, conversation=None):
+        conversation = conversation or self.conversation
+        conversation.refresh_from_db()
+        return conversation.message_count, conversation.first_message_at, conversation.last_message_at
+
+    def test_inserts_and_deletes(self):
+        first, middle, last = self.messages
+        self.assertEqual(self.counters(), (3, first.timestamp, last.timestamp))
+
+        Message.objects.filter(pk=last.pk).delete_and_count()
+        self.assertEqual(self.counters(), (2, first.timestamp, middle.timestamp))
+        Message.objects.filter(conversation=self.conversation).delete_and_count()
+        self.assertEqual(self.counters()[0], 0)
+        self.assertIsNone(self.conversation.last_message_at)
+
+    def test_stale_instance_save_keeps_counters(self):
+        stale = Conversation.objects.get(pk=self.conversation.pk)
+        Message.objects.create_and_count(conversation=self.conversation, sender='ai', content='late')
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertEqual(self.counters()[0], 4)
+        self.assertEqual(self.conversation.title, 'Renamed')
+
+    def test_archive_and_restore_keep_counters(self):
+        before = self.counters()
+        archive_conversation(self.conversation)
+        self.assertEqual(self.counters(), before)
+        archive = ConversationArchive.objects.get()
+        self.assertEqual((archive.first_message_at, archive.last_message_at), before[1:])
+
+        restore_conversation(self.conversation)
+        self.assertEqual(self.counters(), before)
+        Message.objects.filter(pk=self.messages[0].pk).delete_and_count()
+        self.assertEqual(self.counters()[0], 2)
+
+    def test_reconcile_archived_conversation_from_archive(self):
+        before = self.counters()
+        archive_conversation(self.conversation)
+        Conversation.objects.filter(pk=self.conversation.pk).update(
+            message_count=0, first_message_at=None, last_message_at=None
+        )
+        Conversation.objects.filter(pk=self.conversation.pk).reconcile_counters()
+        self.assertEqual(self.counters(), before)
+
+    def test_migration_backfills_archived_conversations(self):
+        before = self.counters()
+        archive_conversation(self.conversation)
+        ConversationArchive.objects.update(first_message_at=None, last_message_at=None)
+        Conversation.objects.filter(pk=self.conversation.pk).update(first_message_at=None, last_message_at=None)
+
+        backfill.backfill_message_range(apps, None)
+        archive = ConversationArchive.objects.get()
+        self.assertEqual((archive.first_message_at, archive.last_message_at), before[1:])
+        self.assertEqual(self.counters(), before)
+
+    def test_reconcile_command(self):
+        Conversation.objects.filter(pk=self.conversation.pk).update(message_count=10, branches_count=4)
+        out = StringIO()
+        call_command('reconcile_conversation_counters', '--dry-run', stdout=out)
+        self.assertIn('Found 1 drifted conversations out of 1', out.getvalue())
+        self.assertEqual(self.counters()[0], 10)
+
+        call_command('reconcile_conversation_counters', stdout=StringIO())
+        self.assertEqual(self.counters()[0], 3)
+        self.assertEqual(self.conversation.branches_count, 0)
+        out = StringIO()
+        call_command('reconcile_conversation_counters', stdout=out)
+        self.assertIn('Fixed 0 drifted', out.getvalue())
+
+    def test_branches(self):
+        response = self.client.post(
+            f'/api/conversations/{self.conversation.pk}/branch/', {'message_id': self.messages[1].pk},
+            content_type='application/json'
+        )
+        branch = Conversation.objects.get(pk=response.json()['id'])
+        self.assertEqual(self.counters(branch)[0], 2)
+        self.assertEqual(Conversation.objects.get(pk=self.conversation.pk).branches_count, 1)
+
+        self.client.delete(f'/api/conversations/{branch.pk}/')
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.branches_count, 0)
+
+
+class AdminMoveTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.source = Conversation.objects.create(title='source')
+        self.target = Conversation.objects.create(title='target')
+        now = timezone.now()
+        self.kept = Message.objects.create_and_count(
+            conversation=self.source, sender='user', content='kept', timestamp=now - timedelta(days=2)
+        )
+        self.moved = Message.objects.create_and_count(conversation=self.source, sender='ai', content='moved')
+
+    def change(self, message, **fields):
+        data = {
+            'conversation': message.conversation_id, 'content': message.content, 'sender': message.sender,
+            'timestamp_0': message.timestamp.strftime('%Y-%m-%d'), 'timestamp_1': message.timestamp.strftime('%H:%M:%S'),
+            'parent_message': '', 'reactions': '{}',
+        }
+        data.update(fields)
+        response = self.client.post(f'/admin/conversations/message/{message.pk}/change/', data)
+        self.assertEqual(response.status_code, 302, getattr(response, 'context', None) and response.context['errors'])
+
+    def test_move_between_conversations(self):
+        self.change(self.moved, conversation=self.target.pk)
+        self.source.refresh_from_db()
+        self.target.refresh_from_db()
+        self.assertEqual(self.source.message_count, 1)
+        self.assertEqual(self.source.last_message_at, self.kept.timestamp)
+        self.assertEqual(self.target.message_count, 1)
+        self.assertEqual(Message.objects.of_conversation(self.target).get(), self.moved)
+
+    def test_redate_recomputes_the_range(self):
+        earlier = timezone.now() - timedelta(days=5)
+        self.change(self.moved, timestamp_0=earlier.strftime('%Y-%m-%d'), timestamp_1=earlier.strftime('%H:%M:%S'))
+        self.source.refresh_from_db()
+        self.assertEqual(self.source.message_count, 2)
+        self.assertEqual(self.source.last_message_at, self.kept.timestamp)
+        self.assertLess(self.source.first_message_at, self.kept.timestamp)
+        self.assertEqual(Message.objects.of_conversation(self.source).count(), 2)
@@ -0,0 +1,38 @@
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from chatportal.renderers import ORJSONRenderer
+from conversations.models import Conversation, Message
+
+
+class FastListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        first = Conversation.objects.create(title='First', summary='About things', key_topics=['Things'])
+        Conversation.objects.create(title=None, parent_conversation=first)
+        question = Message.objects.create_and_count(conversation=first, sender='user', content='Question')
+        Message.objects.create_and_count(conversation=first, sender='ai', content='Answer', parent_message=question)
+        Message.objects.filter(pk=question.pk).add_reaction('+1')
+        Message.objects.filter(pk=question.pk).update(is_bookmarked=True)
+        Conversation.objects.reconcile_counters()
+
+    def get_both(self, url):
+        with override_settings(FAST_LIST_RENDERING=True):
+            fast = self.client.get(url)
+        with override_settings(FAST_LIST_RENDERING=False):
+            regular = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        return fast, regular
+
+    def test_wire_format_matches_serializers(self):
+        for url in ('/api/conversations/', '/api/conversations/?ordering=activity', '/api/messages/',
+                    '/api/messages/?page=1'):
+            fast, regular = self.get_both(url)
+            self.assertEqual(fast.content, regular.content, url)
+            self.assertTrue(fast.json()['results'])
+
+    def test_orjson_renders_fast_pages_identically(self):
+        for url in ('/api/conversations/', '/api/messages/'):
+            fast, _ = self.get_both(url)
+            self.assertEqual(ORJSONRenderer().render(fast.data), JSONRenderer().render(fast.data))
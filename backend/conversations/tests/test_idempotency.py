@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ai_integration.tests.fakes import FakeProviders
+from conversations import idempotency
+from conversations.models import Conversation, IdempotencyKey, Message
+
+
+@override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0, IDEMPOTENCY_LEASE=120, IDEMPOTENCY_KEY_TTL=86400)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.conversation = Conversation.objects.create(title='Titled')
+        self.path = f'/api/conversations/{self.conversation.pk}/send_message/'
+        self.during_call = None
+        self.providers = FakeProviders(self, {'p': self.reply})
+
+    def reply(self, messages):
+        if self.during_call:
+            self.during_call()
+        return f"re: {messages[-1]['content']}"
+
+    def send(self, content='hello', key='key-1'):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(self.path, {'content': content}, format='json', **headers)
+
+    def stored_key(self, key='key-1'):
+        return idempotency._hash(key, 'POST', self.path)
+
+    def test_retry_is_replayed(self):
+        first = self.send()
+        second = self.send()
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(len(self.providers.calls), 1)
+        self.assertEqual(Message.objects.filter(conversation=self.conversation).count(), 2)
+
+    def test_requests_without_key_are_not_affected(self):
+        self.send(key=None)
+        self.send(key=None)
+        self.assertEqual(len(self.providers.calls), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.send('hello')
+        response = self.send('something else')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(self.providers.calls), 1)
+
+    def test_overlong_key_is_rejected(self):
+        self.assertEqual(self.send(key='k' * 256).status_code, 400)
+
+    def test_in_flight_key_conflicts(self):
+        IdempotencyKey.objects.create(key=self.stored_key(), request_hash=idempotency._hash({'content': 'hello'}))
+        response = self.send()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.providers.calls, [])
+
+    def test_abandoned_in_flight_key_is_taken_over(self):
+        IdempotencyKey.objects.create(key=self.stored_key(), request_hash=idempotency._hash({'content': 'hello'}))
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(seconds=121))
+        response = self.send()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.providers.calls), 1)
+        record = IdempotencyKey.objects.get()
+        self.assertIsNotNone(record.completed_at)
+        self.assertEqual(record.status_code, 201)
+
+    def test_expired_key_runs_again(self):
+        self.send()
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        response = self.send()
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(len(self.providers.calls), 2)
+
+    def test_completion_leaves_a_successor_claim_alone(self):
+        def taken_over():
+            # Our lease ran out meanwhile and another request claimed the key.
+            IdempotencyKey.objects.all().delete()
+            IdempotencyKey.objects.create(key=self.stored_key(), request_hash='other')
+
+        self.during_call = taken_over
+        self.assertEqual(self.send().status_code, 201)
+        record = IdempotencyKey.objects.get()
+        self.assertEqual(record.request_hash, 'other')
+        self.assertIsNone(record.completed_at)
+
+    def test_failed_request_releases_the_key(self):
+        def fail():
+            raise KeyboardInterrupt
+
+        self.during_call = fail
+        with self.assertRaises(KeyboardInterrupt):
+            self.send()
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.during_call = None
+        self.assertEqual(self.send().status_code, 201)
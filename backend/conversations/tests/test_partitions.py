@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from conversations import partitions
+from conversations.archive import archive_conversation, restore_conversation
+from conversations.models import Conversation, Message
+
+
+def utc(year, month, day=1):
+    return datetime(year, month, day, tzinfo=dt_timezone.utc)
+
+
+def rows_in(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM {connection.ops.quote_name(table)}')
+        return cursor.fetchone()[0]
+
+
+class MonthHelperTests(TestCase):
+    def test_month_arithmetic(self):
+        self.assertEqual(partitions.month_start(utc(2024, 2, 29)), utc(2024, 2))
+        self.assertEqual(partitions.add_months(utc(2024, 11), 3), utc(2025, 2))
+        self.assertEqual(partitions.add_months(utc(2024, 1), -1), utc(2023, 12))
+        self.assertEqual(partitions.partition_name(utc(2024, 3)), 'conversations_message_y2024m03')
+
+
+class PartitionMaintenanceTests(TestCase):
+    def setUp(self):
+        if not partitions.is_partitioned(connection):
+            self.skipTest('The message table is not partitioned')
+        self.conversation = Conversation.objects.create()
+
+    def test_create_partition_moves_rows_out_of_the_default_partition(self):
+        Message.objects.create(conversation=self.conversation, sender='user', content='far', timestamp=utc(2090, 5, 3))
+        self.assertEqual(rows_in(partitions.DEFAULT_PARTITION), 1)
+        self.assertIn(utc(2090, 5), partitions.default_partition_months(connection))
+
+        self.assertTrue(partitions.create_partition(connection, utc(2090, 5)))
+        self.assertFalse(partitions.create_partition(connection, utc(2090, 5)))
+        self.assertEqual(rows_in(partitions.DEFAULT_PARTITION), 0)
+        self.assertEqual(rows_in('conversations_message_y2090m05'), 1)
+        self.assertEqual(Message.objects.filter(content='far').count(), 1)
+
+    def test_detach_only_partitions_older_than_cutoff(self):
+        partitions.ensure_partitions(connection, utc(1990, 1), utc(1990, 2))
+        detached = partitions.detach_partitions(connection, utc(1990, 2), drop=True)
+        self.assertEqual(detached, ['conversations_message_y1990m01'])
+        names = [name for name, _ in partitions.list_partitions(connection)]
+        self.assertNotIn('conversations_message_y1990m01', names)
+        self.assertIn('conversations_message_y1990m02', names)
+
+
+class FirstMessageBoundTests(TestCase):
+    def setUp(self):
+        self.conversation = Conversation.objects.create()
+
+    def add(self, **kwargs):
+        return Message.objects.create_and_count(conversation=self.conversation, sender='user', content='m', **kwargs)
+
+    def test_counters_track_the_oldest_message(self):
+        newer = self.add()
+        older = Message.objects.bulk_create_and_count([
+            Message(conversation=self.conversation, sender='user', content='old', timestamp=newer.timestamp - timedelta(days=40)),
+            Message(conversation=self.conversation, sender='ai', content='mid', timestamp=newer.timestamp - timedelta(days=1)),
+        ])[0]
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.first_message_at, older.timestamp)
+        self.assertEqual(self.conversation.last_message_at, newer.timestamp)
+
+        # Deleting the oldest message keeps a valid (if loose) bound.
+        Message.objects.filter(pk=older.pk).delete_and_count()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.first_message_at, older.timestamp)
+        Conversation.objects.filter(pk=self.conversation.pk).reconcile_counters()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.first_message_at, newer.timestamp - timedelta(days=1))
+
+    def test_of_conversation_is_bounded(self):
+        first = self.add(timestamp=timezone.now() - timedelta(days=3))
+        self.add()
+        other = Conversation.objects.create()
+        Message.objects.create_and_count(conversation=other, sender='user', content='elsewhere')
+        self.conversation.refresh_from_db()
+
+        messages = Message.objects.of_conversation(self.conversation)
+        self.assertIn('"timestamp" >=', str(messages.query))
+        self.assertEqual([message.pk for message in messages][0], first.pk)
+        self.assertEqual(messages.count(), 2)
+        # Without a known bound the query still finds everything.
+        self.conversation.first_message_at = None
+        self.assertEqual(Message.objects.of_conversation(self.conversation).count(), 2)
+
+    def test_bounded_query_prunes_older_partitions(self):
+        if not partitions.is_partitioned(connection):
+            self.skipTest('The message table is not partitioned')
+        partitions.ensure_partitions(connection, utc(2001, 1), utc(2001, 1))
+        self.add()
+        self.conversation.refresh_from_db()
+        plan = Message.objects.of_conversation(self.conversation).explain()
+        self.assertNotIn('conversations_message_y2001m01', plan)
+        self.assertIn('conversations_message_y2001m01', Message.objects.filter(conversation=self.conversation).explain())
+
+    def test_restore_lowers_the_bound(self):
+        message = self.add(timestamp=timezone.now() - timedelta(days=90))
+        archive_conversation(self.conversation)
+        Conversation.objects.filter(pk=self.conversation.pk).update(first_message_at=None)
+        self.conversation.refresh_from_db()
+
+        restore_conversation(self.conversation)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.first_message_at, message.timestamp)
+        self.assertEqual(list(self.conversation.message_history), [message])
+
+    def test_branch_copies_messages_older_than_the_branch(self):
+        first = self.add(timestamp=timezone.now() - timedelta(days=10))
+        second = self.add()
+        response = self.client.post(
+            f'/api/conversations/{self.conversation.pk}/branch/', {'message_id': second.pk},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        branch = Conversation.objects.get(pk=response.json()['id'])
+        self.assertEqual(branch.first_message_at, first.timestamp)
+        self.assertEqual([message.content for message in branch.message_history], ['m', 'm'])
@@ -0,0 +1,158 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from conversations.archive import archive_conversation
+from conversations.models import ChangeMarker, Conversation, ConversationArchive, Message
+from conversations.purge import mark_deleted, purge_conversation
+
+
+@override_settings(CONVERSATION_PURGE_IN_BACKGROUND=False)
+class PurgeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.conversation = Conversation.objects.create(share_token='tok', is_shared=True)
+        self.messages = [
+            Message.objects.create_and_count(conversation=self.conversation, sender='user', content=f'm{i}')
+            for i in range(5)
+        ]
+
+    def test_delete_hides_and_unshares(self):
+        response = self.client.delete(f'/api/conversations/{self.conversation.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Conversation.objects.filter(pk=self.conversation.pk).exists())
+        row = Conversation.all_objects.get(pk=self.conversation.pk)
+        self.assertIsNotNone(row.deleted_at)
+        self.assertIsNone(row.share_token)
+        self.assertFalse(row.is_shared)
+        # Rows stay until the purge.
+        self.assertEqual(Message.objects.filter(conversation=self.conversation).count(), 5)
+        self.assertEqual(self.client.get(f'/api/messages/{self.messages[0].pk}/').status_code, 404)
+
+    def test_delete_decrements_parent_branches(self):
+        branch = Conversation.objects.create(parent_conversation=self.conversation)
+        Conversation.objects.filter(pk=self.conversation.pk).add_branches(1)
+        mark_deleted(branch)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.branches_count, 0)
+
+    def test_deleting_twice_changes_nothing(self):
+        branch = Conversation.objects.create(parent_conversation=self.conversation)
+        Conversation.objects.filter(pk=self.conversation.pk).add_branches(2)
+        self.assertTrue(mark_deleted(branch))
+        self.assertFalse(mark_deleted(branch))
+        self.assertEqual(Conversation.objects.get(pk=self.conversation.pk).branches_count, 1)
+
+    def test_purge_removes_rows_in_chunks(self):
+        other = Conversation.objects.create()
+        reply = Message.objects.create_and_count(
+            conversation=other, sender='user', content='reply', parent_message=self.messages[0]
+        )
+        branch = Conversation.objects.create(parent_conversation=self.conversation)
+        mark_deleted(self.conversation)
+
+        self.assertEqual(purge_conversation(self.conversation.pk, chunk_size=2), 5)
+        self.assertFalse(Conversation.all_objects.filter(pk=self.conversation.pk).exists())
+        self.assertFalse(Message.objects.filter(conversation_id=self.conversation.pk).exists())
+        reply.refresh_from_db()
+        branch.refresh_from_db()
+        self.assertIsNone(reply.parent_message_id)
+        self.assertIsNone(branch.parent_conversation_id)
+
+    def test_purge_removes_the_archive(self):
+        archive_conversation(self.conversation)
+        mark_deleted(self.conversation)
+        purge_conversation(self.conversation.pk)
+        self.assertFalse(ConversationArchive.objects.exists())
+
+    def test_purge_ignores_conversations_not_marked(self):
+        self.assertEqual(purge_conversation(self.conversation.pk), 0)
+        self.assertTrue(Conversation.objects.filter(pk=self.conversation.pk).exists())
+
+    def test_command_purges_marked_conversations(self):
+        kept = Conversation.objects.create()
+        mark_deleted(self.conversation)
+        out = StringIO()
+        call_command('purge_deleted_conversations', stdout=out)
+        self.assertIn('Purged 1 deleted conversations (5 messages)', out.getvalue())
+        self.assertEqual(list(Conversation.all_objects.values_list('pk', flat=True)), [kept.pk])
+
+    def test_background_purge_after_commit(self):
+        with self.settings(CONVERSATION_PURGE_IN_BACKGROUND=True):
+            with mock.patch('conversations.purge.schedule_purge') as schedule_purge:
+                with self.captureOnCommitCallbacks(execute=True):
+                    mark_deleted(self.conversation)
+        schedule_purge.assert_called_once_with([self.conversation.pk])
+
+    def test_admin_delete_marks_instead_of_deleting(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.post(
+            '/admin/conversations/conversation/',
+            {'action': 'delete_selected', '_selected_action': [self.conversation.pk], 'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertIsNotNone(Conversation.all_objects.get(pk=self.conversation.pk).deleted_at)
+        self.assertEqual(Message.objects.filter(conversation=self.conversation).count(), 5)
+
+        other = Conversation.objects.create()
+        response = self.client.post(f'/admin/conversations/conversation/{other.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIsNotNone(Conversation.all_objects.get(pk=other.pk).deleted_at)
+
+
+@override_settings(CONVERSATION_PURGE_IN_BACKGROUND=False)
+class SoftDeleteETagTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.older = Conversation.objects.create()
+        self.newer = Conversation.objects.create()
+
+    def etag(self, path):
+        return self.client.get(path)['ETag']
+
+    def marker(self):
+        return ChangeMarker.objects.filter(name=ChangeMarker.ROWS).values_list('value', flat=True).first() or 0
+
+    def test_purging_a_new_conversation_changes_the_etags(self):
+        # Once the purge removes the row with the latest updated_at, the list
+        # is back at the updated_at it had before; the ChangeMarker tells the
+        # two apart.
+        before = [self.etag('/api/conversations/'), self.etag('/api/messages/')]
+        marker = self.marker()
+        with self.captureOnCommitCallbacks(execute=True):
+            created = Conversation.objects.create()
+            mark_deleted(created)
+            purge_conversation(created.pk)
+        self.assertGreater(self.marker(), marker)
+        self.assertNotEqual([self.etag('/api/conversations/'), self.etag('/api/messages/')], before)
+
+    def test_list_etags_change_on_delete_and_purge(self):
+        for path in ('/api/conversations/', '/api/messages/'):
+            with self.subTest(path=path):
+                conversation = Conversation.objects.create()
+                Message.objects.create_and_count(conversation=conversation, sender='user', content='gone soon')
+                before = self.etag(path)
+                with self.captureOnCommitCallbacks(execute=True):
+                    mark_deleted(conversation)
+                deleted = self.etag(path)
+                self.assertNotEqual(deleted, before)
+                self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=before).status_code, 200)
+
+                with self.captureOnCommitCallbacks(execute=True):
+                    purge_conversation(conversation.pk)
+                self.assertNotIn(self.etag(path), (before, deleted))
+
+    def test_deleting_an_older_conversation_changes_the_etags(self):
+        Message.objects.create_and_count(conversation=self.older, sender='user', content='hidden soon')
+        Conversation.objects.filter(pk=self.newer.pk).touch()
+        before = [self.etag('/api/conversations/'), self.etag('/api/messages/')]
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_deleted(self.older)
+        after = [self.etag('/api/conversations/'), self.etag('/api/messages/')]
+        self.assertNotEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
@@ -0,0 +1,88 @@
+import importlib
+import threading
+
+from django.apps import apps
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from conversations.models import Conversation, Message, reaction_count
+
+normalize = importlib.import_module('conversations.migrations.0014_normalize_reactions')
+
+LEGACY = {'+1': '3', 'heart': 'lots', 'tada': 2.0, 'ok': True, 'big': 10 ** 12, 'fine': 4}
+
+
+class ReactionTests(TestCase):
+    def setUp(self):
+        conversation = Conversation.objects.create()
+        self.message = Message.objects.create_and_count(conversation=conversation, sender='ai', content='Hi')
+
+    def test_react_endpoint_increments_counter(self):
+        client = APIClient()
+        client.post(f'/api/messages/{self.message.pk}/react/', {'emoji': '👍'}, format='json')
+        response = client.post(f'/api/messages/{self.message.pk}/react/', {'emoji': '👍'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['reactions'], {'👍': 2})
+
+    def test_add_reaction_only_touches_reactions(self):
+        Message.objects.filter(pk=self.message.pk).add_reaction('🎉')
+        Message.objects.filter(pk=self.message.pk).update(content='Edited meanwhile')
+        Message.objects.filter(pk=self.message.pk).add_reaction('🎉')
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.reactions, {'🎉': 2})
+        self.assertEqual(self.message.content, 'Edited meanwhile')
+
+    def test_legacy_values_are_read_as_integers(self):
+        Message.objects.filter(pk=self.message.pk).update(reactions=LEGACY)
+        for emoji in LEGACY:
+            Message.objects.filter(pk=self.message.pk).add_reaction(emoji)
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.reactions, {'+1': 4, 'heart': 1, 'tada': 3, 'ok': 1, 'big': 1, 'fine': 5})
+        self.assertEqual({emoji: reaction_count(value) + 1 for emoji, value in LEGACY.items()}, self.message.reactions)
+
+    def test_non_object_reactions_are_replaced(self):
+        Message.objects.filter(pk=self.message.pk).update(reactions=['+1'])
+        Message.objects.filter(pk=self.message.pk).add_reaction('+1')
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.reactions, {'+1': 1})
+
+    def test_migration_normalizes_legacy_values(self):
+        other = Message.objects.create_and_count(conversation=self.message.conversation, sender='user', content='x')
+        clean = Message.objects.create_and_count(conversation=self.message.conversation, sender='user', content='y')
+        Message.objects.filter(pk=self.message.pk).update(reactions=LEGACY)
+        Message.objects.filter(pk=other.pk).update(reactions='broken')
+        Message.objects.filter(pk=clean.pk).update(reactions={'+1': 2})
+        with connection.schema_editor() as schema_editor:
+            normalize.normalize_reactions(apps, schema_editor)
+        reactions = dict(Message.objects.values_list('pk', 'reactions'))
+        self.assertEqual(reactions[self.message.pk], {'+1': 3, 'heart': 0, 'tada': 2, 'ok': 0, 'big': 0, 'fine': 4})
+        self.assertEqual(reactions[other.pk], {})
+        self.assertEqual(reactions[clean.pk], {'+1': 2})
+
+    def test_invalid_emoji_is_rejected(self):
+        response = APIClient().post(f'/api/messages/{self.message.pk}/react/', {'emoji': 'x' * 11}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ConcurrentReactionTests(TransactionTestCase):
+    def test_concurrent_reactions_are_not_lost(self):
+        conversation = Conversation.objects.create()
+        message = Message.objects.create_and_count(conversation=conversation, sender='ai', content='Hi')
+        barrier = threading.Barrier(8)
+
+        def react(emoji):
+            try:
+                barrier.wait()
+                for _ in range(5):
+                    Message.objects.filter(pk=message.pk).add_reaction(emoji)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=react, args=('👍' if i % 2 else '❤️',)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        message.refresh_from_db()
+        self.assertEqual(message.reactions, {'👍': 20, '❤️': 20})
@@ -0,0 +1,67 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from ai_integration.tests.fakes import FakeProviders
+from conversations.archive import archive_conversation
+from conversations.models import Conversation, Message
+
+
+class ReanalyzeConversationsTests(TransactionTestCase):
+    def setUp(self):
+        self.conversation = Conversation.objects.create(status='ended', summary='Good summary.', sentiment='positive')
+        Message.objects.create_and_count(conversation=self.conversation, sender='user', content='How do I cache?')
+        Message.objects.create_and_count(conversation=self.conversation, sender='ai', content='Use Redis.')
+
+    def reanalyze(self, *args):
+        call_command('reanalyze_conversations', '--workers', '2', *args, stdout=StringIO())
+        self.conversation.refresh_from_db()
+
+    def test_writes_provider_analysis(self):
+        FakeProviders(self, {'p': lambda messages: json.dumps({
+            'summary': 'New summary.', 'key_topics': ['Caching'], 'sentiment': 'neutral', 'action_items': [],
+        })})
+        self.reanalyze()
+        self.assertEqual(self.conversation.summary, 'New summary.')
+        self.assertEqual(self.conversation.key_topics, ['Caching'])
+
+    def test_new_analysis_changes_the_etag(self):
+        url = f'/api/conversations/{self.conversation.pk}/'
+        etag = self.client.get(url)['ETag']
+        FakeProviders(self, {'p': lambda messages: json.dumps({
+            'summary': 'New summary.', 'key_topics': [], 'sentiment': 'neutral', 'action_items': [],
+        })})
+        self.reanalyze()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['summary'], 'New summary.')
+
+    def test_analyzes_archived_conversations(self):
+        archive_conversation(self.conversation)
+        prompts = []
+
+        def analyze(messages):
+            prompts.append(messages)
+            return json.dumps({'summary': 'From the archive.', 'key_topics': [], 'sentiment': 'neutral', 'action_items': []})
+
+        FakeProviders(self, {'p': analyze})
+        self.reanalyze()
+        self.assertEqual(self.conversation.summary, 'From the archive.')
+        self.assertIn('Use Redis.', str(prompts))
+
+    def test_keeps_stored_analysis_when_providers_fail(self):
+        FakeProviders(self, {'p': RuntimeError('down')})
+        self.reanalyze()
+        self.assertEqual(self.conversation.summary, 'Good summary.')
+        self.assertEqual(self.conversation.sentiment, 'positive')
+
+    def test_keeps_stored_analysis_of_packed_conversations(self):
+        other = Conversation.objects.create(status='ended', summary='Other summary.')
+        Message.objects.create_and_count(conversation=other, sender='user', content='Hello there')
+        FakeProviders(self, {'p': RuntimeError('down')}, AI_LOCAL_ANALYSIS='off')
+        self.reanalyze('--pack', '2')
+        other.refresh_from_db()
+        self.assertEqual(self.conversation.summary, 'Good summary.')
+        self.assertEqual(other.summary, 'Other summary.')
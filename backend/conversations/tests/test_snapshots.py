@@ -0,0 +1,106 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from conversations import snapshots
+from conversations.models import Conversation, Message
+
+
+class SnapshotWriteTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_concurrent_writes_to_one_path(self):
+        path = os.path.join(self.tmp.name, 'token.json')
+        payloads = [bytes([i]) * 100000 for i in range(8)]
+        errors = []
+        barrier = threading.Barrier(len(payloads))
+
+        def write(data):
+            barrier.wait()
+            try:
+                for _ in range(20):
+                    snapshots._write(path, data)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(data,)) for data in payloads]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        with open(path, 'rb') as fh:
+            self.assertIn(fh.read(), payloads)
+        self.assertEqual(os.listdir(self.tmp.name), ['token.json'])
+
+
+class SharedConversationTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(SHARED_SNAPSHOT_DIR=self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.conversation = Conversation.objects.create(title='Shared')
+        Message.objects.create_and_count(conversation=self.conversation, sender='user', content='Hello')
+
+    def share(self):
+        response = self.client.post(f'/api/conversations/{self.conversation.pk}/share/')
+        return response.json()['share_token']
+
+    def test_serves_compressed_snapshot(self):
+        token = self.share()
+        response = self.client.get(f'/api/shared/{token}/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = json.loads(gzip.decompress(response.content))
+        self.assertEqual(body['title'], 'Shared')
+        self.assertEqual([m['content'] for m in body['messages']], ['Hello'])
+
+        etag = response['ETag']
+        response = self.client.get(f'/api/shared/{token}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_rerender_snapshot(self):
+        token = self.share()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/messages/{Message.objects.get().pk}/react/', {'emoji': '👍'}, format='json')
+        body = json.loads(self.client.get(f'/api/shared/{token}/').content)
+        self.assertEqual(body['messages'][0]['reactions'], {'👍': 1})
+
+    def test_unshare_removes_snapshot(self):
+        token = self.share()
+        self.client.post(f'/api/conversations/{self.conversation.pk}/unshare/')
+        self.assertEqual(os.listdir(self.tmp.name), [])
+        self.assertEqual(self.client.get(f'/api/shared/{token}/').status_code, 404)
+
+    def test_unshare_during_render_leaves_no_files(self):
+        token = self.share()
+        serializer = snapshots.ConversationDetailSerializer
+
+        def unshared_meanwhile(conversation):
+            # Another request unshares (and deletes the old files) while we render.
+            Conversation.objects.filter(pk=conversation.pk).update(share_token=None, is_shared=False)
+            snapshots.delete_snapshot(token)
+            return serializer(conversation)
+
+        with mock.patch.object(snapshots, 'ConversationDetailSerializer', unshared_meanwhile):
+            self.assertIsNone(snapshots.render_snapshot(self.conversation))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+        self.assertEqual(self.client.get(f'/api/shared/{token}/').status_code, 404)
+
+    def test_conversation_without_token_is_skipped(self):
+        Conversation.objects.filter(pk=self.conversation.pk).update(is_shared=True, share_token=None)
+        with self.captureOnCommitCallbacks(execute=True):
+            snapshots.refresh_snapshots([self.conversation.pk])
+        self.assertIsNone(snapshots.render_snapshot(self.conversation))
+        self.assertEqual(os.listdir(self.tmp.name), [])
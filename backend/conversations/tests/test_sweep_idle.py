@@ -0,0 +1,106 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from ai_integration.tests.fakes import FakeProviders
+from conversations.archive import archive_conversation
+from conversations.models import Conversation, Message
+
+
+def analysis(summary):
+    return lambda messages: json.dumps({
+        'summary': summary, 'key_topics': ['Topic'], 'sentiment': 'neutral', 'action_items': [],
+    })
+
+
+class SweepIdleConversationsTests(TransactionTestCase):
+    def make_conversation(self, minutes_ago, **fields):
+        then = timezone.now() - timedelta(minutes=minutes_ago)
+        conversation = Conversation.objects.create(start_timestamp=then, **fields)
+        Message.objects.create_and_count(conversation=conversation, sender='user', content='Hello', timestamp=then)
+        return conversation
+
+    def sweep(self, *args):
+        out = StringIO()
+        call_command('sweep_idle_conversations', '--idle-minutes', '60', *args, stdout=out)
+        return out.getvalue()
+
+    def test_ends_and_analyzes_idle_conversations(self):
+        idle = self.make_conversation(120)
+        recent = self.make_conversation(5)
+        FakeProviders(self, {'p': analysis('Said hello.')})
+
+        self.assertIn('Ended 1 idle conversations and analyzed 1', self.sweep())
+        idle.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual((idle.status, idle.summary), ('ended', 'Said hello.'))
+        self.assertEqual(recent.status, 'active')
+
+    def test_analysis_changes_the_etag(self):
+        conversation = self.make_conversation(120, status='ended')
+        Conversation.objects.filter(pk=conversation.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+        url = f'/api/conversations/{conversation.pk}/'
+        etags = []
+
+        def analyze(messages):
+            # The conversation is claimed by now; the analysis is not saved yet.
+            try:
+                etags.append(self.client.get(url)['ETag'])
+            finally:
+                connections.close_all()
+            return analysis('Said hello.')(messages)
+
+        FakeProviders(self, {'p': analyze})
+        self.sweep()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['summary'], 'Said hello.')
+
+    def test_failed_analysis_is_retried_by_a_later_sweep(self):
+        idle = self.make_conversation(120)
+        FakeProviders(self, {'p': RuntimeError('down')})
+        self.assertIn('Ended 1 idle conversations and analyzed 0', self.sweep())
+        idle.refresh_from_db()
+        self.assertEqual((idle.status, idle.summary), ('ended', ''))
+
+        # Not retried before --retry-minutes have passed.
+        FakeProviders(self, {'p': analysis('Said hello.')})
+        self.assertIn('analyzed 0', self.sweep())
+        Conversation.objects.filter(pk=idle.pk).update(updated_at=timezone.now() - timedelta(minutes=11))
+        self.assertIn('Ended 0 idle conversations and analyzed 1', self.sweep())
+        idle.refresh_from_db()
+        self.assertEqual(idle.summary, 'Said hello.')
+
+    def test_interrupted_sweep_is_picked_up(self):
+        # Ended by a sweeper that died before saving the analysis.
+        stale = timezone.now() - timedelta(minutes=30)
+        crashed = self.make_conversation(120, status='ended', end_timestamp=stale)
+        Conversation.objects.filter(pk=crashed.pk).update(updated_at=stale)
+        FakeProviders(self, {'p': analysis('Recovered.')})
+
+        self.sweep()
+        crashed.refresh_from_db()
+        self.assertEqual(crashed.summary, 'Recovered.')
+
+    def test_archived_conversations_are_analyzed(self):
+        stale = timezone.now() - timedelta(minutes=30)
+        archived = self.make_conversation(120, status='ended', end_timestamp=stale)
+        archive_conversation(archived)
+        Conversation.objects.filter(pk=archived.pk).update(updated_at=stale)
+        FakeProviders(self, {'p': analysis('Archived hello.')})
+
+        self.assertIn('analyzed 1', self.sweep())
+        archived.refresh_from_db()
+        self.assertEqual(archived.summary, 'Archived hello.')
+
+    def test_empty_ended_conversations_are_not_retried(self):
+        stale = timezone.now() - timedelta(minutes=30)
+        empty = Conversation.objects.create(status='ended')
+        Conversation.objects.filter(pk=empty.pk).update(updated_at=stale)
+        FakeProviders(self, {'p': analysis('Nothing.')})
+        self.assertIn('analyzed 0', self.sweep())
@@ -0,0 +1,66 @@
+"""
+Titles of new conversations.
+
+The title is generated within the request that sends the first message
+unless the request's deadline has less than AI_TITLE_MIN_BUDGET seconds
+left; then it is generated on a background thread after the response, so the
+chat answer isn't delayed or lost for the sake of the title.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from ai_integration.exceptions import DeadlineExceeded
+from chatportal import metrics
+from ai_integration.services import AIService
+from .models import Conversation
+from .snapshots import refresh_snapshots
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def title_conversation(conversation: Conversation, first_message: str, ai_service: AIService):
+    """Title ``conversation`` from its first message now, or in the background."""
+    deadline = ai_service.deadline
+    if deadline is None or deadline.remaining() >= settings.AI_TITLE_MIN_BUDGET:
+        try:
+            conversation.title = ai_service.generate_title(first_message)[:255]
+            conversation.save()
+            return
+        except DeadlineExceeded:
+            pass
+    schedule_title(conversation.pk, first_message)
+
+
+def _generate_title(conversation_id: int, first_message: str):
+    try:
+        title = AIService().generate_title(first_message)[:255]
+        # Keep a title the user set in the meantime.
+        updated = Conversation.objects.filter(Q(title__isnull=True) | Q(title=''), pk=conversation_id).update(
+            title=title, updated_at=timezone.now()
+        )
+        if updated:
+            refresh_snapshots([conversation_id])
+    except Exception:
+        logger.exception("Generating the title of conversation %s failed", conversation_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_title(conversation_id: int, first_message: str):
+    """Generate a conversation's title on the background title thread."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = metrics.track_queue(
+                'title', ThreadPoolExecutor(max_workers=2, thread_name_prefix='conversation-title')
+            )
+    _executor.submit(_generate_title, conversation_id, first_message)
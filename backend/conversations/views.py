@@ -3,16 +3,37 @@ API views for conversations and messages.
 """
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.utils import timezone
-from django.http import HttpResponse, JsonResponse
-from django.db.models import Count, Q
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, Q, Value, When
 from django.db.models.functions import TruncDate
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
 import secrets
 import json
 from datetime import datetime, timedelta
+from .archive import restore_conversation
+from .batch_chat import run_batch_chat
+from .context_cache import append_messages, get_context, invalidate
+from .conditional import (
+    ConditionalGetMixin,
+    conversation_detail_validator,
+    conversation_list_validator,
+    message_detail_validator,
+    message_list_validator,
+)
+from .fastpath import FastListMixin, count_subquery
+from .idempotency import idempotent
 from .models import Conversation, Message
+from .purge import mark_deleted
+from .snapshots import delete_snapshot, load_snapshot, refresh_snapshots, render_snapshot, snapshot_path
+from .titles import title_conversation
 from .serializers import (
     ConversationSerializer,
     ConversationDetailSerializer,
@@ -21,23 +42,73 @@ from .serializers import (
     SendMessageSerializer,
     QuerySerializer,
     ReactionSerializer,
-    BranchConversationSerializer
+    BranchConversationSerializer,
+    BulkMessageSerializer,
+    BatchChatSerializer
 )
+from ai_integration.deadline import request_deadline
+from ai_integration.exceptions import DeadlineExceeded
 from ai_integration.services import AIService
 
 
-class ConversationViewSet(viewsets.ModelViewSet):
+def deadline_exceeded_response() -> Response:
+    """Response for a request whose AI_REQUEST_DEADLINE ran out."""
+    return Response(
+        {'error': 'The AI service did not answer in time. Please try again.'},
+        status=status.HTTP_504_GATEWAY_TIMEOUT
+    )
+
+
+class ConversationViewSet(ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing conversations.
     """
     queryset = Conversation.objects.all()
     serializer_class = ConversationSerializer
+    list_validator = staticmethod(conversation_list_validator)
+    detail_validator = staticmethod(conversation_detail_validator)
+    fast_list_fields = ConversationSerializer.Meta.fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+        params = self.request.query_params
+        if params.get('ordering') == 'activity':
+            # Served by conversation_activity_idx.
+            queryset = queryset.order_by(F('last_message_at').desc(nulls_last=True), F('id').desc())
+        if params.get('active_since'):
+            active_since = parse_datetime(params['active_since'])
+            if active_since is None:
+                raise ValidationError({'active_since': 'Expected an ISO 8601 datetime.'})
+            queryset = queryset.filter(last_message_at__gte=active_since)
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return ConversationDetailSerializer
         return ConversationSerializer
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+            if serializer.instance.parent_conversation_id:
+                Conversation.objects.filter(pk=serializer.instance.parent_conversation_id).add_branches(1)
+
+    def perform_update(self, serializer):
+        previous_parent = serializer.instance.parent_conversation_id
+        with transaction.atomic():
+            super().perform_update(serializer)
+            parent = serializer.instance.parent_conversation_id
+            if parent != previous_parent:
+                Conversation.objects.filter(pk=previous_parent).add_branches(-1)
+                Conversation.objects.filter(pk=parent).add_branches(1)
+        refresh_snapshots([serializer.instance.id])
+
+    def perform_destroy(self, instance):
+        # Constant time: messages are purged in the background.
+        mark_deleted(instance)
+
     @action(detail=False, methods=['post'])
     def create_conversation(self, request):
         """
@@ -55,11 +126,13 @@ class ConversationViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def send_message(self, request, pk=None):
         """
         Send a message in a conversation.
         POST /api/conversations/{id}/send_message/
         """
+        deadline = request_deadline()
         conversation = self.get_object()
         serializer = SendMessageSerializer(data=request.data)
         
@@ -68,44 +141,79 @@ class ConversationViewSet(viewsets.ModelViewSet):
         
         content = serializer.validated_data['content']
         
+        if conversation.is_archived:
+            restore_conversation(conversation)
+        history = get_context(conversation)
+        
         # Save user message
-        user_message = Message.objects.create(
+        user_message = Message.objects.create_and_count(
             conversation=conversation,
             content=content,
             sender='user'
         )
         
         # Get AI response
-        ai_service = AIService()
-        ai_response = ai_service.chat(
-            conversation_id=conversation.id,
-            user_message=content
-        )
+        ai_service = AIService(deadline=deadline)
+        try:
+            ai_response = ai_service.chat(
+                conversation_id=conversation.id,
+                user_message=content,
+                history=history
+            )
+        except DeadlineExceeded:
+            Message.objects.filter(pk=user_message.pk).delete_and_count()
+            return deadline_exceeded_response()
         
         # Save AI message
-        ai_message = Message.objects.create(
+        ai_message = Message.objects.create_and_count(
             conversation=conversation,
             content=ai_response,
             sender='ai'
         )
+        append_messages(conversation, [user_message, ai_message])
         
         # Update conversation title if it's the first message
-        if not conversation.title and conversation.messages.count() == 2:
-            title = ai_service.generate_title(content)
-            conversation.title = title[:255]
-            conversation.save()
+        if not conversation.title and conversation.message_count == 0:
+            title_conversation(conversation, content, ai_service)
+        
+        refresh_snapshots([conversation.id])
         
         return Response({
             'user_message': MessageSerializer(user_message).data,
             'ai_message': MessageSerializer(ai_message).data,
         }, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['post'])
+    def batch_chat(self, request):
+        """
+        Send many messages, to one or more conversations, in one request.
+        POST /api/conversations/batch_chat/
+        """
+        serializer = BatchChatSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = run_batch_chat(serializer.validated_data['items'], workers=settings.BATCH_CHAT_WORKERS)
+        
+        if serializer.validated_data['stream']:
+            # One JSON result per line, in completion order.
+            return StreamingHttpResponse(
+                (json.dumps(result) + '\n' for result in results),
+                content_type='application/x-ndjson'
+            )
+        
+        return Response({
+            'results': sorted(results, key=lambda result: result['index'])
+        }, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'])
+    @idempotent
     def end_conversation(self, request, pk=None):
         """
         End a conversation and generate summary.
         POST /api/conversations/{id}/end_conversation/
         """
+        deadline = request_deadline()
         conversation = self.get_object()
         
         if conversation.status == 'ended':
@@ -115,14 +223,17 @@ class ConversationViewSet(viewsets.ModelViewSet):
             )
         
         # Generate summary and analysis
-        ai_service = AIService()
-        messages = conversation.messages.all()
+        ai_service = AIService(deadline=deadline)
+        messages = Message.objects.of_conversation(conversation)
         messages_data = [
             {'sender': msg.sender, 'content': msg.content}
             for msg in messages
         ]
         
-        analysis = ai_service.analyze_conversation(messages_data)
+        try:
+            analysis = ai_service.analyze_conversation(messages_data)
+        except DeadlineExceeded:
+            return deadline_exceeded_response()
         
         # Update conversation with analysis
         conversation.summary = analysis.get('summary', '')
@@ -130,6 +241,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
         conversation.sentiment = analysis.get('sentiment', '')
         conversation.action_items = analysis.get('action_items', [])
         conversation.end_conversation()
+        refresh_snapshots([conversation.id])
         
         return Response(
             ConversationDetailSerializer(conversation).data,
@@ -144,6 +256,8 @@ class ConversationViewSet(viewsets.ModelViewSet):
             conversation.share_token = secrets.token_urlsafe(32)
             conversation.is_shared = True
             conversation.save()
+        # Public hits are served from this pre-rendered snapshot.
+        render_snapshot(conversation)
         share_url = f"{request.scheme}://{request.get_host()}/shared/{conversation.share_token}"
         return Response({
             'share_token': conversation.share_token,
@@ -154,9 +268,11 @@ class ConversationViewSet(viewsets.ModelViewSet):
     def unshare(self, request, pk=None):
         """Remove share token from conversation."""
         conversation = self.get_object()
+        token = conversation.share_token
         conversation.share_token = None
         conversation.is_shared = False
         conversation.save()
+        delete_snapshot(token)
         return Response({'message': 'Conversation unshared'}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'])
@@ -170,26 +286,37 @@ class ConversationViewSet(viewsets.ModelViewSet):
         message_id = serializer.validated_data['message_id']
         title = serializer.validated_data.get('title', '')
         
+        if conversation.is_archived:
+            restore_conversation(conversation)
+        invalidate([conversation.id])
+        
         try:
-            parent_message = Message.objects.get(id=message_id, conversation=conversation)
+            parent_message = Message.objects.of_conversation(conversation).get(id=message_id)
         except Message.DoesNotExist:
             return Response({'error': 'Message not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        # Create new conversation branch
-        branch = Conversation.objects.create(
-            title=title or f"Branch: {conversation.title or 'Untitled'}",
-            parent_conversation=conversation
-        )
-        
-        # Copy messages up to the branch point
-        messages_to_copy = conversation.messages.filter(timestamp__lte=parent_message.timestamp)
-        for msg in messages_to_copy:
-            Message.objects.create(
-                conversation=branch,
-                content=msg.content,
-                sender=msg.sender,
-                timestamp=msg.timestamp
+        with transaction.atomic():
+            # Create new conversation branch
+            branch = Conversation.objects.create(
+                title=title or f"Branch: {conversation.title or 'Untitled'}",
+                parent_conversation=conversation
             )
+            Conversation.objects.filter(pk=conversation.pk).add_branches(1)
+            
+            # Copy messages up to the branch point
+            messages_to_copy = Message.objects.of_conversation(conversation).filter(
+                timestamp__lte=parent_message.timestamp
+            )
+            Message.objects.bulk_create_and_count([
+                Message(
+                    conversation=branch,
+                    content=msg.content,
+                    sender=msg.sender,
+                    timestamp=msg.timestamp
+                )
+                for msg in messages_to_copy
+            ])
+        branch.refresh_from_db()
         
         return Response(
             ConversationSerializer(branch).data,
@@ -226,7 +353,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
                 md_content += "\n"
             
             md_content += "## Messages\n\n"
-            for msg in conversation.messages.all():
+            for msg in conversation.message_history:
                 sender_label = "**You:**" if msg.sender == 'user' else "**AI:**"
                 md_content += f"{sender_label} {msg.content}\n\n"
             
@@ -245,11 +372,12 @@ class ConversationViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def suggestions(self, request, pk=None):
         """Get conversation suggestions based on context."""
+        deadline = request_deadline()
         conversation = self.get_object()
-        ai_service = AIService()
+        ai_service = AIService(deadline=deadline)
         
         # Get recent messages for context
-        recent_messages = conversation.messages.all()[:5]
+        recent_messages = conversation.message_history[:5]
         context = "\n".join([f"{msg.sender}: {msg.content[:100]}" for msg in recent_messages])
         
         prompt = f"""Based on this conversation context, suggest 3-5 relevant follow-up questions or topics:
@@ -260,7 +388,12 @@ Return only a JSON array of suggestions, no other text:
 ["suggestion1", "suggestion2", "suggestion3"]"""
         
         messages_list = [{'role': 'user', 'content': prompt}]
-        response = ai_service._call_llm(messages_list, "You are a helpful assistant that suggests conversation topics.")
+        try:
+            response = ai_service._call_llm(
+                messages_list, "You are a helpful assistant that suggests conversation topics.", task='suggestions'
+            )
+        except DeadlineExceeded:
+            return deadline_exceeded_response()
         
         try:
             suggestions = json.loads(response)
@@ -281,7 +414,11 @@ class QueryView(APIView):
     API view for querying past conversations.
     POST /api/query/
     """
+    # Read-only despite being a POST.
+    read_replica = True
+    
     def post(self, request):
+        deadline = request_deadline()
         serializer = QuerySerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -302,19 +439,53 @@ class QueryView(APIView):
             conversations = conversations.filter(id__in=conversation_ids)
         
         # Get AI response about past conversations
-        ai_service = AIService()
-        response = ai_service.query_past_conversations(
-            query=query,
-            conversations=list(conversations)
-        )
+        ai_service = AIService(deadline=deadline)
+        try:
+            response = ai_service.query_past_conversations(
+                query=query,
+                conversations=list(conversations.select_related('archive').prefetch_related('messages'))
+            )
+        except DeadlineExceeded:
+            return deadline_exceeded_response()
         
         return Response(response, status=status.HTTP_200_OK)
 
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     """ViewSet for managing messages."""
-    queryset = Message.objects.all()
+    queryset = Message.objects.filter(conversation__deleted_at__isnull=True)
     serializer_class = MessageSerializer
+    list_validator = staticmethod(message_list_validator)
+    detail_validator = staticmethod(message_detail_validator)
+    fast_list_fields = MessageSerializer.Meta.fields
+
+    def annotate_fast_list(self, queryset):
+        return queryset.annotate(
+            replies_count=count_subquery(Message.objects.all(), 'parent_message'),
+        )
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+            Conversation.objects.filter(pk=serializer.instance.conversation_id).add_messages(
+                1, serializer.instance.timestamp
+            )
+        invalidate([serializer.instance.conversation_id])
+        refresh_snapshots([serializer.instance.conversation_id])
+
+    def perform_update(self, serializer):
+        previous_conversation = serializer.instance.conversation_id
+        with transaction.atomic():
+            super().perform_update(serializer)
+            Message.objects.count_move(serializer.instance, previous_conversation)
+            Conversation.objects.filter(pk__in=[previous_conversation, serializer.instance.conversation_id]).touch()
+        invalidate([previous_conversation, serializer.instance.conversation_id])
+        refresh_snapshots([serializer.instance.conversation_id])
+
+    def perform_destroy(self, instance):
+        Message.objects.filter(pk=instance.pk).delete_and_count()
+        invalidate([instance.conversation_id])
+        refresh_snapshots([instance.conversation_id])
 
     @action(detail=True, methods=['post'])
     def react(self, request, pk=None):
@@ -325,10 +496,9 @@ class MessageViewSet(viewsets.ModelViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         emoji = serializer.validated_data['emoji']
-        reactions = message.reactions or {}
-        reactions[emoji] = reactions.get(emoji, 0) + 1
-        message.reactions = reactions
-        message.save()
+        Message.objects.filter(pk=message.pk).add_reaction(emoji)
+        message.refresh_from_db(fields=['reactions'])
+        refresh_snapshots([message.conversation_id])
         
         return Response(MessageSerializer(message).data, status=status.HTTP_200_OK)
 
@@ -337,12 +507,82 @@ class MessageViewSet(viewsets.ModelViewSet):
         """Toggle bookmark on a message."""
         message = self.get_object()
         message.is_bookmarked = not message.is_bookmarked
-        message.save()
+        message.save(update_fields=['is_bookmarked', 'updated_at'])
+        refresh_snapshots([message.conversation_id])
         return Response(MessageSerializer(message).data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Apply bookmark/react/delete operations to many messages at once.
+        POST /api/messages/bulk/
+        
+        Each operation is a single set-based UPDATE or DELETE and all of them
+        run in one transaction. Returns one result per (operation, message id).
+        """
+        serializer = BulkMessageSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        operations = serializer.validated_data['operations']
+        requested_ids = {msg_id for operation in operations for msg_id in operation['ids']}
+        
+        with transaction.atomic():
+            conversations = dict(
+                Message.objects.filter(id__in=requested_ids).values_list('id', 'conversation_id')
+            )
+            existing = set(conversations)
+            applied = []
+            for operation in operations:
+                ids = [msg_id for msg_id in dict.fromkeys(operation['ids']) if msg_id in existing]
+                messages = Message.objects.filter(id__in=ids)
+                if operation['op'] == 'bookmark':
+                    if operation['value'] is None:
+                        messages.update(
+                            is_bookmarked=Case(
+                                When(is_bookmarked=True, then=Value(False)),
+                                default=Value(True)
+                            ),
+                            updated_at=timezone.now()
+                        )
+                    else:
+                        messages.update(is_bookmarked=operation['value'], updated_at=timezone.now())
+                elif operation['op'] == 'react':
+                    messages.add_reaction(operation['emoji'])
+                elif operation['op'] == 'delete':
+                    messages.delete_and_count()
+                    invalidate(conversations[msg_id] for msg_id in ids)
+                    existing.difference_update(ids)
+                applied.append((operation, set(ids)))
+            
+            state = {
+                row['id']: row
+                for row in Message.objects.filter(id__in=existing).values('id', 'is_bookmarked', 'reactions')
+            }
+            refresh_snapshots(conversations.values())
+        
+        results = []
+        for operation, ids in applied:
+            for msg_id in operation['ids']:
+                result = {'op': operation['op'], 'id': msg_id}
+                if msg_id not in ids:
+                    result['status'] = 'not_found'
+                elif operation['op'] == 'delete':
+                    result['status'] = 'deleted'
+                else:
+                    result['status'] = 'ok'
+                    if msg_id in state:
+                        field = 'is_bookmarked' if operation['op'] == 'bookmark' else 'reactions'
+                        result[field] = state[msg_id][field]
+                results.append(result)
+        
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'])
+    @idempotent
     def reply(self, request, pk=None):
         """Reply to a message (create threaded conversation)."""
+        deadline = request_deadline()
         parent_message = self.get_object()
         serializer = SendMessageSerializer(data=request.data)
         if not serializer.is_valid():
@@ -350,9 +590,10 @@ class MessageViewSet(viewsets.ModelViewSet):
         
         content = serializer.validated_data['content']
         conversation = parent_message.conversation
+        history = get_context(conversation)
         
         # Create user message as reply
-        user_message = Message.objects.create(
+        user_message = Message.objects.create_and_count(
             conversation=conversation,
             content=content,
             sender='user',
@@ -360,19 +601,26 @@ class MessageViewSet(viewsets.ModelViewSet):
         )
         
         # Get AI response
-        ai_service = AIService()
-        ai_response = ai_service.chat(
-            conversation_id=conversation.id,
-            user_message=content
-        )
+        ai_service = AIService(deadline=deadline)
+        try:
+            ai_response = ai_service.chat(
+                conversation_id=conversation.id,
+                user_message=content,
+                history=history
+            )
+        except DeadlineExceeded:
+            Message.objects.filter(pk=user_message.pk).delete_and_count()
+            return deadline_exceeded_response()
         
         # Create AI reply
-        ai_message = Message.objects.create(
+        ai_message = Message.objects.create_and_count(
             conversation=conversation,
             content=ai_response,
             sender='ai',
             parent_message=parent_message
         )
+        append_messages(conversation, [user_message, ai_message])
+        refresh_snapshots([conversation.id])
         
         return Response({
             'user_message': MessageSerializer(user_message).data,
@@ -432,11 +680,7 @@ class AnalyticsView(APIView):
         )
         
         # Average conversation length
-        avg_length = Conversation.objects.annotate(
-            msg_count=Count('messages')
-        ).aggregate(
-            avg=Count('messages', distinct=True)
-        )['avg'] or 0
+        avg_length = round(Conversation.objects.aggregate(avg=Avg('message_count'))['avg'] or 0, 1)
         
         return Response({
             'summary': {
@@ -453,19 +697,68 @@ class AnalyticsView(APIView):
 
 
 class SharedConversationView(APIView):
-    """API view for accessing shared conversations."""
+    """
+    API view for accessing shared conversations.
+    
+    Serves the snapshot pre-rendered when the conversation was shared, in the
+    best compression the client accepts, without querying the database.
+    """
+    
+    @staticmethod
+    def _accepted_encodings(request):
+        accepted = set()
+        for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+            coding, _, params = part.partition(';')
+            name, _, value = params.strip().partition('=')
+            try:
+                if name.strip() == 'q' and float(value) == 0:
+                    continue
+            except ValueError:
+                continue
+            accepted.add(coding.strip().lower())
+        return accepted
     
     def get(self, request, token):
         """Get shared conversation by token."""
-        try:
-            conversation = Conversation.objects.get(share_token=token, is_shared=True)
-            return Response(
-                ConversationDetailSerializer(conversation).data,
-                status=status.HTTP_200_OK
-            )
-        except Conversation.DoesNotExist:
-            return Response(
-                {'error': 'Shared conversation not found'},
-                status=status.HTTP_404_NOT_FOUND
+        snapshot = load_snapshot(token)
+        if snapshot is None:
+            # Conversations shared before snapshots existed are rendered on first hit.
+            try:
+                conversation = Conversation.objects.get(share_token=token, is_shared=True)
+            except Conversation.DoesNotExist:
+                return Response(
+                    {'error': 'Shared conversation not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            snapshot = render_snapshot(conversation)
+            if snapshot is None:
+                return Response(
+                    {'error': 'Shared conversation not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+        
+        if snapshot['etag'] in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            accepted = self._accepted_encodings(request)
+            encoding = next(
+                (enc for enc in snapshot['encodings'] if enc == 'identity' or enc in accepted),
+                'identity'
             )
-
+            try:
+                with open(snapshot_path(token, encoding), 'rb') as fh:
+                    body = fh.read()
+            except FileNotFoundError:
+                # Unshared between reading the metadata and the body.
+                return Response(
+                    {'error': 'Shared conversation not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            response = HttpResponse(body, content_type='application/json')
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+        
+        response['ETag'] = snapshot['etag']
+        patch_vary_headers(response, ['Accept-Encoding'])
+        patch_cache_control(response, public=True, max_age=settings.SHARED_SNAPSHOT_MAX_AGE)
+        return response
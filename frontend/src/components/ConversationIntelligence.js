@@ -3,6 +3,24 @@ import { queryAPI } from '../services/api';
 import { useTheme } from '../contexts/ThemeContext';
 import AIBrainIcon from './AIBrainIcon';
 
+// Split an excerpt into plain and highlighted segments using the
+// [start, end] character spans returned by the backend.
+function highlightExcerpt(text, highlights = []) {
+  const segments = [];
+  let position = 0;
+  highlights.forEach(([start, end]) => {
+    if (start > position) segments.push(text.slice(position, start));
+    segments.push(
+      <mark key={start} className="bg-emerald-400/30 text-emerald-100 rounded px-0.5">
+        {text.slice(start, end)}
+      </mark>
+    );
+    position = end;
+  });
+  if (position < text.length) segments.push(text.slice(position));
+  return segments;
+}
+
 function ConversationIntelligence() {
   const [query, setQuery] = useState('');
   const [response, setResponse] = useState(null);
@@ -187,7 +205,7 @@ function ConversationIntelligence() {
                           Log #{excerpt.conversation_id}
                         </span>
                       </div>
-                      <p className="text-indigo-200/90 leading-relaxed font-light">{excerpt.excerpt}</p>
+                      <p className="text-indigo-200/90 leading-relaxed font-light">{highlightExcerpt(excerpt.excerpt, excerpt.highlights)}</p>
                     </div>
                   ))}
                 </div>
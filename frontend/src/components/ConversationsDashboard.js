@@ -18,7 +18,8 @@ function ConversationsDashboard() {
   const fetchConversations = async () => {
     try {
       setLoading(true);
-      const response = await conversationsAPI.getAll();
+      // Most recently active first.
+      const response = await conversationsAPI.getAll({ ordering: 'activity' });
       setConversations(response.data.results || response.data);
     } catch (error) {
       console.error('Error fetching conversations:', error);
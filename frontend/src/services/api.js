@@ -4,6 +4,8 @@ const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api
 
 const api = axios.create({
   baseURL: API_BASE_URL,
+  // Carries the backend's read-your-writes cookie when a read replica is used.
+  withCredentials: true,
   headers: {
     'Content-Type': 'application/json',
   },
@@ -11,7 +13,7 @@ const api = axios.create({
 
 export const conversationsAPI = {
   // Get all conversations
-  getAll: () => api.get('/conversations/'),
+  getAll: (params) => api.get('/conversations/', { params }),
   
   // Get conversation by ID
   getById: (id) => api.get(`/conversations/${id}/`),